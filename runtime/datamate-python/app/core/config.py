@@ -37,6 +37,30 @@ class Settings(BaseSettings):
     log_rotation_backup_count: int = 30
     rag_storage_dir: str = "/data/rag_storage"
 
+    # RAG 向量化入库：单批次估算 token 上限与分块数上限、并发嵌入请求数、等待写入的批次上限
+    rag_embedding_batch_max_tokens: int = 8000
+    rag_embedding_batch_max_size: int = 64
+    rag_embedding_concurrency: int = 4
+    rag_insert_queue_size: int = 8
+
+    # RAG 嵌入向量缓存（SQLite，float32 存储），超过条目上限按最近访问时间淘汰
+    rag_embedding_cache_enabled: bool = True
+    rag_embedding_cache_path: str = "/data/rag_storage/embedding_cache.db"
+    rag_embedding_cache_max_entries: int = 2_000_000
+
+    # RAG 检索缓存（进程内）：查询向量缓存条目上限；检索结果缓存 TTL（0 关闭）与条目上限
+    rag_query_embedding_cache_max_entries: int = 10_000
+    rag_retrieval_cache_ttl_seconds: int = 60
+    rag_retrieval_cache_max_entries: int = 1000
+
+    # RAG 知识图谱（LightRAG）：单次 ainsert 的文档数、并行处理的文档数、实体抽取并发 LLM 请求数；
+    # 进程内缓存的知识库实例上限与空闲淘汰时间（秒），淘汰时先落盘存储
+    rag_graph_insert_batch_size: int = 8
+    rag_graph_max_parallel_insert: int = 4
+    rag_graph_llm_max_async: int = 8
+    rag_graph_instance_cache_size: int = 8
+    rag_graph_instance_idle_seconds: int = 1800
+
     # Database
     pgsql_host: str = "datamate-database"
     pgsql_port: int = 5432
@@ -79,6 +103,8 @@ class Settings(BaseSettings):
     label_studio_file_path_prefix: str = "/data/local-files/?d="  # Label Studio local file serving URL prefix
 
     ls_task_page_size: int = 1000
+    # 标注同步（LS -> DM）：项目导出接口不可用时并发拉取任务标注的请求数
+    ls_annotation_sync_concurrency: int = 8
 
     # DataMate
     dm_file_path_prefix: str = "/dataset"  # DM存储文件夹前缀
@@ -116,5 +142,46 @@ class Settings(BaseSettings):
     # 固定并发数（当 dynamic_concurrent=False 时使用）
     ratio_copy_fixed_concurrent: int = 10
 
+    # ==================== LLM 调用配置 ====================
+    # 每个 base_url 的 HTTP 连接池上限
+    llm_http_max_connections: int = 100
+
+    # 每个 base_url 保持的 keep-alive 连接数
+    llm_http_max_keepalive_connections: int = 20
+
+    # 单次 LLM 请求超时（秒）
+    llm_http_timeout_seconds: float = 300.0
+
+    # 嵌入请求每批文本数与并发请求数
+    llm_embedding_batch_size: int = 64
+    llm_embedding_concurrency: int = 4
+
+    # LLM 响应缓存（SQLite），条目超过 TTL 失效，超过上限按最近访问时间淘汰
+    llm_response_cache_enabled: bool = True
+    llm_response_cache_path: str = "/data/llm_cache/responses.db"
+    llm_response_cache_ttl_seconds: int = 7 * 24 * 3600
+    llm_response_cache_max_entries: int = 1_000_000
+
+    # ==================== 数据合成流水线配置 ====================
+    # 同时在途的切片数（跨文件），决定问题/答案生成阶段的并行度
+    synthesis_chunks_in_flight: int = 32
+
+    # 每个模型的LLM最大并发调用数
+    synthesis_model_concurrency: int = 10
+
+    # 合成结果批量写入条数
+    synthesis_write_batch_size: int = 200
+
+    # 合成结果与进度的刷新间隔（秒）
+    synthesis_flush_interval_seconds: float = 2.0
+
+    # 切片批量写入与按页读取的条数
+    synthesis_chunk_insert_batch_size: int = 1000
+    synthesis_chunk_read_batch_size: int = 200
+
+    # 合成数据导出时每批流式读取/写入的条数与并发导出的文件数
+    synthesis_export_batch_size: int = 1000
+    synthesis_export_concurrency: int = 4
+
 # 全局设置实例
 settings = Settings()
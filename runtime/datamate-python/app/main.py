@@ -26,6 +26,7 @@ from app.module.collection.schedule import (
 )
 from app.module.shared.schedule import Scheduler
 from app.module.generation.service.task_executor import init_executor, shutdown_executor
+from app.module.shared.llm import LLMFactory
 from app.module.system.service.log_pvc_monitor import schedule_log_pvc_monitor
 
 setup_logging()
@@ -86,6 +87,7 @@ async def lifespan(app: FastAPI):
     # @shutdown
     collection_scheduler.shutdown()
     shutdown_executor()
+    await LLMFactory.aclose()
     logger.info("DataMate Python Backend shutting down ...\n\n")
 
 
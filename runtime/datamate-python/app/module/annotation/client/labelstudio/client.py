@@ -1,6 +1,8 @@
+import codecs
 import httpx
+import json
 import re
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator
 
 from app.core.config import settings
 from app.core.logging import get_logger
@@ -13,6 +15,40 @@ from .schema import (
 
 logger = get_logger(__name__)
 
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """增量解析字节流形式的 JSON 数组，逐个返回数组元素，无需将整个响应读入内存"""
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = False
+    async for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buffer) and (buffer[pos].isspace() or (started and buffer[pos] == ",")):
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # 当前元素尚未接收完整，等待后续数据
+                break
+            yield item
+        buffer = buffer[pos:]
+    if buffer.strip():
+        raise ValueError("Unexpected end of JSON array")
+
+
 class Client:
     """Label Studio服务客户端
 
@@ -484,6 +520,27 @@ class Client:
             logger.error("Error while exporting project %s: %s", project_id, e)
             return None
 
+    async def iter_export_tasks(
+        self,
+        project_id: int,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """以流式方式导出项目中已标注的任务（exportType=JSON），逐个返回任务。
+
+        每个任务包含 id、data、annotations 等字段。与其他接口不同，请求失败时直接抛出异常，
+        由调用方决定是否回退为逐任务获取标注。
+        """
+        logger.debug("Streaming export of Label Studio project %s", project_id)
+        async with self.client.stream(
+            "GET",
+            f"/api/projects/{project_id}/export",
+            params={"exportType": "JSON"},
+            # 大项目导出需要较长的准备时间，读超时不做限制
+            timeout=httpx.Timeout(self.timeout, read=None),
+        ) as response:
+            response.raise_for_status()
+            async for task in iter_json_array(response.aiter_bytes()):
+                yield task
+
     async def get_task_annotations(
         self,
         task_id: int
@@ -1,10 +1,12 @@
-from typing import Optional, List, Dict, Any, Tuple, Set
+from typing import Optional, List, Dict, Any, Tuple, Set, AsyncIterator
+from datetime import datetime
+import asyncio
 import json
 import os
 
 from app.module.dataset import DatasetManagementService
-from sqlalchemy import update, select
-from app.db.models import DatasetFiles
+from sqlalchemy import update, select, values, column, String, JSON, TIMESTAMP
+from app.db.models import DatasetFiles, LabelingProject
 
 from app.core.logging import get_logger
 from app.core.config import settings
@@ -653,6 +655,151 @@ class SyncService:
         # 如果DataMate的标注更新，允许覆盖
         return self._compare_timestamps(dm_tags_updated_at, ls_updated_at) > 0
     
+    async def _iter_ls_annotated_tasks(self, project_id: str, batch_size: int) -> AsyncIterator[Dict[str, Any]]:
+        """逐个返回带 annotations 的 Label Studio 任务
+
+        优先通过项目导出接口流式拉取全部已标注任务；导出接口不可用时，
+        回退为获取任务列表后以有限并发逐任务获取标注。
+        """
+        yielded = False
+        try:
+            async for task in self.ls_client.iter_export_tasks(int(project_id)):
+                yielded = True
+                yield task
+            return
+        except Exception as e:
+            if yielded:
+                raise
+            logger.warning(f"Export API unavailable for project {project_id}, falling back to per-task fetch: {e}")
+
+        ls_tasks_result = await self.ls_client.get_project_tasks(project_id, page=None)
+        if not ls_tasks_result:
+            token_display = settings.label_studio_user_token[:10] + "..." if settings.label_studio_user_token else "None"
+            raise ConnectionError(
+                f"Failed to fetch tasks from Label Studio project {project_id}. Please check:\n"
+                f"1. Label Studio is running at {settings.label_studio_base_url}\n"
+                f"2. Project ID {project_id} exists\n"
+                f"3. API token is valid: {token_display}"
+            )
+
+        all_tasks = ls_tasks_result.get("tasks", [])
+        logger.info(f"Found {len(all_tasks)} tasks in Label Studio project")
+        semaphore = asyncio.Semaphore(settings.ls_annotation_sync_concurrency)
+
+        async def with_annotations(task: Dict[str, Any]) -> Dict[str, Any]:
+            if (task.get("data") or {}).get("file_id"):
+                async with semaphore:
+                    task["annotations"] = await self.ls_client.get_task_annotations(task.get("id")) or []
+            return task
+
+        for i in range(0, len(all_tasks), batch_size):
+            for task in await asyncio.gather(*(with_annotations(t) for t in all_tasks[i:i + batch_size])):
+                yield task
+
+    async def _apply_ls_annotations_batch(
+        self,
+        dataset_id: str,
+        pending: Dict[str, Tuple[List[Dict[str, Any]], str]],
+        overwrite: bool,
+        stats: Dict[str, int],
+    ) -> None:
+        """将一批 LS 标注写入 DatasetFiles：一次查询现有标注时间戳，一次批量更新，一次提交"""
+        db = self.dm_client.db
+        result = await db.execute(
+            select(DatasetFiles.id, DatasetFiles.tags, DatasetFiles.tags_updated_at).where(
+                DatasetFiles.dataset_id == dataset_id,
+                DatasetFiles.id.in_(list(pending)),
+            )
+        )
+        existing = {row.id: row for row in result}
+
+        updates: List[Dict[str, Any]] = []
+        for file_id, (simplified_annotations, ls_updated_at) in pending.items():
+            file_record = existing.get(file_id)
+            if file_record is None:
+                # 文件已从数据集删除时无法写入，计为跳过，避免水位永远无法推进
+                logger.warning(f"File {file_id} not found in dataset {dataset_id}, skipping")
+                stats["skipped"] += 1
+                continue
+
+            dm_tags_updated_at = file_record.tags_updated_at.isoformat() if file_record.tags_updated_at else None
+            if not self._should_overwrite_dm(ls_updated_at, dm_tags_updated_at, overwrite):
+                logger.debug(
+                    "File %s: DataMate has newer or equal annotations, skipping (overwrite=%s, ls_updated_at=%s, dm_tags_updated_at=%s)",
+                    file_id,
+                    overwrite,
+                    ls_updated_at,
+                    dm_tags_updated_at,
+                )
+                stats["skipped"] += 1
+                continue
+
+            try:
+                tags_updated_datetime = datetime.fromisoformat(ls_updated_at.replace('Z', '+00:00'))
+            except (AttributeError, ValueError) as e:
+                logger.error(f"Failed to update annotations for file {file_id}: {e}")
+                stats["failed"] += 1
+                continue
+
+            # 如果存在冲突（两边都有标注且时间戳不同），记录为冲突解决
+            if file_record.tags and ls_updated_at:
+                stats["conflicts"] += 1
+            updates.append({
+                "id": file_id,
+                "tags": simplified_annotations,
+                "tags_updated_at": tags_updated_datetime.replace(tzinfo=None),
+            })
+
+        if not updates:
+            return
+        try:
+            await self._bulk_update_file_tags(updates)
+            await db.commit()
+            stats["synced"] += len(updates)
+            logger.debug(f"Synced annotations for {len(updates)} files")
+        except Exception as e:
+            logger.error(f"Failed to update annotations for {len(updates)} files: {e}")
+            stats["failed"] += len(updates)
+            await db.rollback()
+
+    async def _bulk_update_file_tags(self, updates: List[Dict[str, Any]]) -> None:
+        """批量更新文件标签：PostgreSQL 使用单条 UPDATE ... FROM (VALUES ...)，其他数据库按主键批量更新"""
+        db = self.dm_client.db
+        if db.bind.dialect.name == "postgresql":
+            source = values(
+                column("id", String),
+                column("tags", JSON),
+                column("tags_updated_at", TIMESTAMP),
+                name="source",
+            ).data([(u["id"], u["tags"], u["tags_updated_at"]) for u in updates])
+            await db.execute(
+                update(DatasetFiles)
+                .where(DatasetFiles.id == source.c.id)
+                .values(tags=source.c.tags, tags_updated_at=source.c.tags_updated_at)
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            await db.execute(update(DatasetFiles), updates)
+
+    async def _get_ls_sync_watermark(self, mapping_id: str) -> Optional[str]:
+        """读取 LS -> DM 标注同步水位（上次同步到的 LS 标注最大更新时间）"""
+        progress = (await self.dm_client.db.execute(
+            select(LabelingProject.progress).where(LabelingProject.id == mapping_id)
+        )).scalar_one_or_none()
+        return (progress or {}).get("lsSyncWatermark")
+
+    async def _save_ls_sync_watermark(self, mapping_id: str, watermark: str) -> None:
+        db = self.dm_client.db
+        progress = (await db.execute(
+            select(LabelingProject.progress).where(LabelingProject.id == mapping_id)
+        )).scalar_one_or_none()
+        await db.execute(
+            update(LabelingProject)
+            .where(LabelingProject.id == mapping_id)
+            .values(progress={**(progress or {}), "lsSyncWatermark": watermark})
+        )
+        await db.commit()
+
     async def sync_annotations_from_ls_to_dm(
         self,
         mapping: DatasetMappingResponse,
@@ -689,35 +836,60 @@ class SyncService:
                     file_sync_result.get("total", 0),
                 )
 
-            # 获取Label Studio中的所有任务
-            ls_tasks_result = await self.ls_client.get_project_tasks(
-                mapping.labeling_project_id,
-                page=None
-            )
-            
-            if not ls_tasks_result:
-                token_display = settings.label_studio_user_token[:10] + "..." if settings.label_studio_user_token else "None"
-                error_msg = f"Failed to fetch tasks from Label Studio project {mapping.labeling_project_id}. Please check:\n" \
-                           f"1. Label Studio is running at {settings.label_studio_base_url}\n" \
-                           f"2. Project ID {mapping.labeling_project_id} exists\n" \
-                           f"3. API token is valid: {token_display}"
-                logger.error(error_msg)
-                return SyncAnnotationsResponse(
-                    id=mapping.id,
-                    status="error",
-                    synced_to_dm=0,
-                    synced_to_ls=0,
-                    skipped=0,
-                    failed=0,
-                    conflicts_resolved=0,
-                    message=f"Failed to connect to Label Studio at {settings.label_studio_base_url}"
-                )
-            
-            all_tasks = ls_tasks_result.get("tasks", [])
-            logger.info(f"Found {len(all_tasks)} tasks in Label Studio project")
-            
-            if len(all_tasks) == 0:
-                logger.warning(f"No tasks found in Label Studio project {mapping.labeling_project_id}")
+            # 仅在允许覆盖时使用水位：LS 标注更新时间不晚于上次同步水位的任务直接跳过
+            watermark = await self._get_ls_sync_watermark(mapping.id) if overwrite else None
+            new_watermark = watermark
+            stats = {"synced": 0, "skipped": 0, "failed": 0, "conflicts": 0}
+            pending: Dict[str, Tuple[List[Dict[str, Any]], str]] = {}
+            task_count = 0
+
+            async for task in self._iter_ls_annotated_tasks(mapping.labeling_project_id, batch_size):
+                task_count += 1
+                task_id = task.get("id")
+                file_id = (task.get("data") or {}).get("file_id")
+
+                if not file_id:
+                    logger.warning(f"Task {task_id} has no file_id, skipping")
+                    stats["skipped"] += 1
+                    continue
+
+                annotations = task.get("annotations") or []
+                if not annotations:
+                    logger.debug(f"No annotations for task {task_id}, skipping")
+                    stats["skipped"] += 1
+                    continue
+
+                # 简化标注结果（取最新的标注）
+                latest_annotation = max(annotations, key=lambda a: a.get("updated_at") or a.get("created_at", ""))
+                simplified_annotations, ls_updated_at = self._simplify_annotation_result(latest_annotation)
+
+                if ls_updated_at and (not new_watermark or self._compare_timestamps(ls_updated_at, new_watermark) > 0):
+                    new_watermark = ls_updated_at
+
+                if not simplified_annotations:
+                    logger.debug(f"Task {task_id} has no valid annotation results")
+                    stats["skipped"] += 1
+                    continue
+
+                if watermark and ls_updated_at and self._compare_timestamps(ls_updated_at, watermark) <= 0:
+                    stats["skipped"] += 1
+                    continue
+
+                pending[file_id] = (simplified_annotations, ls_updated_at)
+                if len(pending) >= batch_size:
+                    await self._apply_ls_annotations_batch(mapping.dataset_id, pending, overwrite, stats)
+                    pending = {}
+
+            if pending:
+                await self._apply_ls_annotations_batch(mapping.dataset_id, pending, overwrite, stats)
+
+            synced_count = stats["synced"]
+            skipped_count = stats["skipped"]
+            failed_count = stats["failed"]
+            conflicts_resolved = stats["conflicts"]
+
+            if task_count == 0:
+                logger.warning(f"No annotated tasks found in Label Studio project {mapping.labeling_project_id}")
                 return SyncAnnotationsResponse(
                     id=mapping.id,
                     status="success",
@@ -728,97 +900,11 @@ class SyncService:
                     conflicts_resolved=0,
                     message="No tasks found in Label Studio project"
                 )
-            
-            # 批量处理任务
-            for i in range(0, len(all_tasks), batch_size):
-                batch_tasks = all_tasks[i:i + batch_size]
-                logger.info(f"Processing batch {i // batch_size + 1}, {len(batch_tasks)} tasks")
-                
-                for task in batch_tasks:
-                    task_id = task.get("id")
-                    file_id = task.get("data", {}).get("file_id")
-                    
-                    if not file_id:
-                        logger.warning(f"Task {task_id} has no file_id, skipping")
-                        skipped_count += 1
-                        continue
-                    
-                    # 获取任务的标注结果
-                    annotations = await self.ls_client.get_task_annotations(task_id)
-                    
-                    if not annotations:
-                        logger.debug(f"No annotations for task {task_id}, skipping")
-                        skipped_count += 1
-                        continue
-                    
-                    # 简化标注结果（取最新的标注）
-                    latest_annotation = max(annotations, key=lambda a: a.get("updated_at") or a.get("created_at", ""))
-                    simplified_annotations, ls_updated_at = self._simplify_annotation_result(latest_annotation)
-                    
-                    if not simplified_annotations:
-                        logger.debug(f"Task {task_id} has no valid annotation results")
-                        skipped_count += 1
-                        continue
-                    
-                    # 更新数据库中的tags字段
-                    try:
-                        # 检查文件是否存在以及是否已有标注
-                        result = await self.dm_client.db.execute(
-                            select(DatasetFiles).where(
-                                DatasetFiles.id == file_id,
-                                DatasetFiles.dataset_id == mapping.dataset_id
-                            )
-                        )
-                        file_record = result.scalar_one_or_none()
-                        
-                        if not file_record:
-                            logger.warning(f"File {file_id} not found in dataset {mapping.dataset_id}")
-                            failed_count += 1
-                            continue
-                        
-                        # 检查是否应该覆盖DataMate的标注（使用文件级别的tags_updated_at）
-                        dm_tags_updated_at: Optional[str] = None
-                        if file_record.tags_updated_at:  # type: ignore
-                            dm_tags_updated_at = file_record.tags_updated_at.isoformat()  # type: ignore
-                        
-                        if not self._should_overwrite_dm(ls_updated_at, dm_tags_updated_at, overwrite):
-                            logger.debug(
-                                "File %s: DataMate has newer or equal annotations, skipping (overwrite=%s, ls_updated_at=%s, dm_tags_updated_at=%s)",
-                                file_id,
-                                overwrite,
-                                ls_updated_at,
-                                dm_tags_updated_at,
-                            )
-                            skipped_count += 1
-                            continue
-                        
-                        # 如果存在冲突（两边都有标注且时间戳不同），记录为冲突解决
-                        if file_record.tags and ls_updated_at:  # type: ignore
-                            conflicts_resolved += 1
-                            logger.debug(f"File {file_id}: Resolved conflict, Label Studio annotation is newer")
-                        
-                        # 更新tags字段和tags_updated_at
-                        from datetime import datetime
-                        tags_updated_datetime = datetime.fromisoformat(ls_updated_at.replace('Z', '+00:00'))
-                        
-                        await self.dm_client.db.execute(
-                            update(DatasetFiles)
-                            .where(DatasetFiles.id == file_id)
-                            .values(
-                                tags=simplified_annotations,
-                                tags_updated_at=tags_updated_datetime.replace(tzinfo=None)
-                            )
-                        )
-                        await self.dm_client.db.commit()
-                        
-                        synced_count += 1
-                        logger.debug(f"Synced annotations for file {file_id}: {len(simplified_annotations)} results")
-                        
-                    except Exception as e:
-                        logger.error(f"Failed to update annotations for file {file_id}: {e}")
-                        failed_count += 1
-                        await self.dm_client.db.rollback()
-            
+
+            # 存在失败时不推进水位，下次同步重新处理
+            if overwrite and failed_count == 0 and new_watermark and new_watermark != watermark:
+                await self._save_ls_sync_watermark(mapping.id, new_watermark)
+
             logger.info(f"Annotation sync completed: synced={synced_count}, skipped={skipped_count}, failed={failed_count}, conflicts_resolved={conflicts_resolved}")
             
             status = "success" if failed_count == 0 else ("partial" if synced_count > 0 else "error")
@@ -834,6 +920,18 @@ class SyncService:
                 message=f"Synced {synced_count} annotations from Label Studio to dataset. Skipped: {skipped_count}, Failed: {failed_count}, Conflicts resolved: {conflicts_resolved}"
             )
             
+        except ConnectionError as e:
+            logger.error(str(e))
+            return SyncAnnotationsResponse(
+                id=mapping.id,
+                status="error",
+                synced_to_dm=0,
+                synced_to_ls=0,
+                skipped=0,
+                failed=0,
+                conflicts_resolved=0,
+                message=f"Failed to connect to Label Studio at {settings.label_studio_base_url}"
+            )
         except Exception as e:
             logger.error(f"Error while syncing annotations from LS to DM: {e}")
             return SyncAnnotationsResponse(
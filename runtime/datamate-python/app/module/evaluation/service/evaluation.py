@@ -13,7 +13,8 @@ from app.db.models.data_synthesis import DataSynthesisFileInstance, SynthesisDat
 from app.db.session import AsyncSessionLocal
 from app.module.evaluation.schema.evaluation import SourceType
 from app.module.shared.schema import TaskStatus
-from app.module.shared.util.model_chat import call_openai_style_model, extract_json_substring
+from app.module.shared.llm import LLMFactory
+from app.module.shared.util.model_chat import extract_json_substring
 from app.module.evaluation.schema.prompt import get_prompt
 from app.module.shared.util.structured_file import StructuredFileHandlerFactory
 from app.module.system.service.common_service import get_model_by_id
@@ -52,26 +53,29 @@ class EvaluationExecutor:
         count_query = select(func.count()).select_from(query.subquery())
         total = (await self.db.execute(count_query)).scalar_one()
         evaluated_count = 0
-        for file in files:
-            items = (await self.db.execute(query.where(EvaluationItem.file_id == file.file_id))).scalars().all()
-            tasks = [
-                self.evaluate_item(models, item, semaphore)
-                for item in items
-            ]
-            await asyncio.gather(*tasks, return_exceptions=True)
-            file.evaluated_count = len(items)
-            evaluated_count += file.evaluated_count
-            self.task.eval_process = evaluated_count / total
-            await self.db.commit()
+        with LLMFactory.cache_scope(f"evaluation:{self.task.id}"):
+            for file in files:
+                items = (await self.db.execute(query.where(EvaluationItem.file_id == file.file_id))).scalars().all()
+                tasks = [
+                    self.evaluate_item(models, item, semaphore)
+                    for item in items
+                ]
+                await asyncio.gather(*tasks, return_exceptions=True)
+                file.evaluated_count = len(items)
+                evaluated_count += file.evaluated_count
+                self.task.eval_process = evaluated_count / total
+                await self.db.commit()
 
     async def evaluate_item(self, models, item: EvaluationItem, semaphore: asyncio.Semaphore):
         async with semaphore:
             max_try = 3
             while max_try > 0:
                 prompt_text = self.get_eval_prompt(item)
-                resp_text = await asyncio.to_thread(
-                    call_openai_style_model, models.base_url, models.api_key, models.model_name,
+                resp_text = await LLMFactory.ainvoke(
+                    LLMFactory.create_chat(models.model_name, models.base_url, models.api_key),
                     prompt_text,
+                    # 缓存的结果无法解析时，重试需要重新调用模型
+                    use_cache=max_try == 3,
                 )
                 resp_text = extract_json_substring(resp_text)
                 try:
@@ -314,6 +314,7 @@ async def export_synthesis_task_to_dataset(
     task_id: str,
     dataset_id: str,
     format: str = "alpaca",
+    file_type: str = "jsonl",
     db: AsyncSession = Depends(get_db),
 ):
     """
@@ -323,12 +324,13 @@ async def export_synthesis_task_to_dataset(
         task_id: 任务 ID
         dataset_id: 目标数据集 ID
         format: 导出格式
+        file_type: 导出文件类型
         db: 数据库会话
 
     Returns:
         数据集 ID
     """
-    exporter = SynthesisDatasetExporter(db, format=format)
+    exporter = SynthesisDatasetExporter(db, format=format, file_type=file_type)
     generation = GenerationService(db)
     try:
         dataset = await exporter.export_task_to_dataset(task_id, dataset_id)
@@ -352,7 +354,7 @@ async def export_synthesis_data(
     db: AsyncSession = Depends(get_db),
 ):
     """
-    将合成数据导出为指定格式的 JSONL 文件
+    将合成数据导出为指定格式的 JSONL（可压缩）或 Parquet 文件
 
     Args:
         request: 导出请求
@@ -365,6 +367,7 @@ async def export_synthesis_data(
         db,
         format=request.format.value,
         output_path=request.output_path,
+        file_type=request.file_type.value,
     )
     result = await exporter.export_data(
         task_id=request.task_id,
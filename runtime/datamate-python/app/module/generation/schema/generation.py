@@ -229,11 +229,20 @@ class ExportFormat(str, Enum):
     RAW = "raw"
 
 
+class ExportFileType(str, Enum):
+    """导出文件类型枚举"""
+    JSONL = "jsonl"
+    JSONL_GZIP = "jsonl.gz"
+    JSONL_ZSTD = "jsonl.zst"
+    PARQUET = "parquet"
+
+
 class ExportSynthesisDataRequest(BaseModel):
     """导出合成数据请求"""
     task_id: str = Field(..., description="合成任务ID")
     file_instance_ids: Optional[List[str]] = Field(None, description="文件实例ID列表，为空则导出全部")
     format: ExportFormat = Field(ExportFormat.ALPACA, description="导出格式")
+    file_type: ExportFileType = Field(ExportFileType.JSONL, description="导出文件类型（JSONL/压缩JSONL/Parquet）")
     output_path: Optional[str] = Field(None, description="输出路径，为空则使用默认路径")
 
 
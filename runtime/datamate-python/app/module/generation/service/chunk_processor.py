@@ -1,9 +1,13 @@
 """切片处理器模块 - 负责文本切片和持久化操作"""
+import json
 import uuid
-from typing import Any
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
 
+from sqlalchemy import func, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.db.models.data_synthesis import (
     DataSynthInstance,
     DataSynthesisFileInstance,
@@ -12,6 +16,15 @@ from app.db.models.data_synthesis import (
 from app.db.session import logger
 
 
+@dataclass(frozen=True)
+class ChunkRow:
+    """流式读取的切片，只包含合成需要的列，不进入会话的 identity map"""
+
+    id: str
+    chunk_index: int
+    chunk_content: str
+
+
 class ChunkProcessor:
     """切片处理器"""
 
@@ -25,7 +38,9 @@ class ChunkProcessor:
         file_id: str,
         chunks: list[Any],
     ) -> int:
-        """将切片结果保存到数据库。
+        """将切片结果批量保存到数据库。
+
+        切片不经过 ORM 的 unit-of-work，PostgreSQL 使用 COPY 写入，其他数据库按批执行多行 INSERT。
 
         Args:
             synthesis_task: 合成任务实例
@@ -36,59 +51,110 @@ class ChunkProcessor:
         Returns:
             保存的切片数量
         """
+        rows = []
         for idx, doc in enumerate(chunks, start=1):
             base_metadata = dict(getattr(doc, "metadata", {}) or {})
             base_metadata.update({
                 "task_id": str(synthesis_task.id),
                 "file_id": file_id
             })
-
-            chunk_record = DataSynthesisChunkInstance(
-                id=str(uuid.uuid4()),
-                synthesis_file_instance_id=file_task.id,
-                chunk_index=idx,
-                chunk_content=doc.page_content,
-                chunk_metadata=base_metadata,
-            )
-            self.db.add(chunk_record)
+            rows.append({
+                "id": str(uuid.uuid4()),
+                "synthesis_file_instance_id": file_task.id,
+                "chunk_index": idx,
+                "chunk_content": doc.page_content,
+                "metadata": base_metadata,
+            })
 
         file_task.total_chunks = len(chunks)
         file_task.status = "processing"
+        # 先刷新文件任务的更新，使切片写入与其处于同一事务中
+        await self.db.flush()
+
+        if rows:
+            if self.db.bind.dialect.name == "postgresql":
+                await self._copy_chunks(rows)
+            else:
+                await self._insert_chunks(rows)
 
         await self.db.commit()
-        await self.db.refresh(file_task)
 
-        logger.info(f"Persisted {len(chunks)} chunks for file_task={file_task.id}")
-        return len(chunks)
+        logger.info(f"Persisted {len(rows)} chunks for file_task={file_task.id}")
+        return len(rows)
+
+    async def _insert_chunks(self, rows: list[dict[str, Any]]) -> None:
+        """按批执行多行 INSERT ... VALUES"""
+        table = DataSynthesisChunkInstance.__table__
+        batch_size = settings.synthesis_chunk_insert_batch_size
+        for start in range(0, len(rows), batch_size):
+            await self.db.execute(insert(table).values(rows[start:start + batch_size]))
+
+    async def _copy_chunks(self, rows: list[dict[str, Any]]) -> None:
+        """通过 asyncpg 的 COPY 协议写入切片，复用会话当前事务的连接"""
+        table = DataSynthesisChunkInstance.__table__
+        columns = ["id", "synthesis_file_instance_id", "chunk_index", "chunk_content", "metadata"]
+        connection = await self.db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            table.name,
+            records=[
+                (
+                    row["id"],
+                    row["synthesis_file_instance_id"],
+                    row["chunk_index"],
+                    row["chunk_content"],
+                    json.dumps(row["metadata"], ensure_ascii=False),
+                )
+                for row in rows
+            ],
+            columns=columns,
+            schema_name=table.schema,
+        )
 
-    async def load_chunk_batch(
+    async def iter_chunks(
         self,
         file_task_id: str,
-        start_index: int,
-        end_index: int,
-    ) -> list[DataSynthesisChunkInstance]:
-        """按索引范围加载指定文件任务下的一批切片记录。
+        batch_size: int | None = None,
+    ) -> AsyncIterator[ChunkRow]:
+        """按 chunk_index 顺序流式读取文件任务下的切片。
+
+        使用 chunk_index 做 keyset 分页，每页以 yield_per 流式获取，只查询需要的列，
+        调用方阻塞时不会在内存中堆积整个文件的切片。
 
         Args:
             file_task_id: 文件任务ID
-            start_index: 起始索引（包含）
-            end_index: 结束索引（包含）
+            batch_size: 每页读取的切片数
 
-        Returns:
-            切片实例列表
+        Yields:
+            切片数据
         """
-        from sqlalchemy import select
-
-        result = await self.db.execute(
-            select(DataSynthesisChunkInstance)
-            .where(
-                DataSynthesisChunkInstance.synthesis_file_instance_id == file_task_id,
-                DataSynthesisChunkInstance.chunk_index >= start_index,
-                DataSynthesisChunkInstance.chunk_index <= end_index,
+        batch_size = batch_size or settings.synthesis_chunk_read_batch_size
+        last_index = 0
+        while True:
+            stmt = (
+                select(
+                    DataSynthesisChunkInstance.id,
+                    DataSynthesisChunkInstance.chunk_index,
+                    DataSynthesisChunkInstance.chunk_content,
+                )
+                .where(
+                    DataSynthesisChunkInstance.synthesis_file_instance_id == file_task_id,
+                    DataSynthesisChunkInstance.chunk_index > last_index,
+                )
+                .order_by(DataSynthesisChunkInstance.chunk_index.asc())
+                .limit(batch_size)
+                .execution_options(yield_per=batch_size)
             )
-            .order_by(DataSynthesisChunkInstance.chunk_index.asc())
-        )
-        return list(result.scalars().all())
+            # 先取完一页再交给调用方，避免调用方阻塞期间长时间占用服务端游标
+            rows = [
+                ChunkRow(str(row.id), row.chunk_index, row.chunk_content or "")
+                async for row in await self.db.stream(stmt)
+            ]
+            for row in rows:
+                yield row
+            if len(rows) < batch_size:
+                return
+            last_index = rows[-1].chunk_index
 
     async def count_chunks_for_file(self, synth_file_instance_id: str) -> int:
         """统计指定任务与文件下的切片总数。
@@ -99,8 +165,6 @@ class ChunkProcessor:
         Returns:
             切片总数
         """
-        from sqlalchemy import func, select
-
         result = await self.db.execute(
             select(func.count(DataSynthesisChunkInstance.id)).where(
                 DataSynthesisChunkInstance.synthesis_file_instance_id == synth_file_instance_id
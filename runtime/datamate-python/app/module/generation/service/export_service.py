@@ -1,14 +1,19 @@
 """
 数据导出服务 - 负责将合成数据导出为各种格式
 """
+import asyncio
+import contextlib
 import datetime
+import gzip
+import io
 import json
 import os
-from typing import Iterable, List, Optional, Sequence
+from typing import Any, Callable, List, Optional, Sequence
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.core.logging import get_logger
 from app.db.models.data_synthesis import (
     DataSynthInstance,
@@ -16,35 +21,144 @@ from app.db.models.data_synthesis import (
     SynthesisData,
 )
 from app.db.models.dataset_management import Dataset, DatasetFiles
+from app.db.session import AsyncSessionLocal
 from app.module.generation.schema.generation import (
     ExportSynthesisDataResponse,
 )
 
 logger = get_logger(__name__)
 
+# zstd 压缩与 Parquet 输出为可选依赖
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
 
 class SynthesisExportError(Exception):
     """导出失败时抛出的异常"""
 
 
+def _parquet_schema(format: str) -> "pa.Schema":
+    """各导出格式固定的 Parquet schema，不依赖首批数据推断，字段缺失时为空值"""
+    if format == "alpaca":
+        return pa.schema([("instruction", pa.string()), ("output", pa.string())])
+    if format == "sharegpt":
+        message = pa.struct([("from", pa.string()), ("value", pa.string())])
+        return pa.schema([("conversations", pa.list_(message)), ("context", pa.string())])
+    # raw 记录的字段不固定，整条记录序列化为 JSON 字符串
+    return pa.schema([("data", pa.string())])
+
+
+def _to_text(value: Any) -> Optional[str]:
+    """将字段值转换为字符串列的值，非字符串值序列化为 JSON"""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _to_parquet_row(record: dict, format: str) -> dict:
+    """将格式化后的记录转换为符合 _parquet_schema 的行"""
+    if format == "alpaca":
+        return {"instruction": _to_text(record.get("instruction")), "output": _to_text(record.get("output"))}
+    if format == "sharegpt":
+        return {
+            "conversations": [
+                {"from": _to_text(message.get("from")), "value": _to_text(message.get("value"))}
+                for message in record.get("conversations") or []
+            ],
+            "context": _to_text(record.get("context")),
+        }
+    return {"data": json.dumps(record, ensure_ascii=False)}
+
+
+class _RecordFileWriter:
+    """按批写入导出文件，支持 JSONL、gzip/zstd 压缩的 JSONL 与 Parquet"""
+
+    def __init__(self, path: str, file_type: str, format: str):
+        self.path = path
+        self.file_type = file_type
+        self.format = format
+        self._file: Any = None
+        self._raw: Any = None
+        self._parquet_writer: Any = None
+
+    def open(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if self.file_type == "jsonl.gz":
+            self._file = gzip.open(self.path, "wt", encoding="utf-8")
+        elif self.file_type == "jsonl.zst":
+            self._raw = open(self.path, "wb")
+            stream = zstandard.ZstdCompressor().stream_writer(self._raw)
+            self._file = io.TextIOWrapper(stream, encoding="utf-8")
+        elif self.file_type != "parquet":
+            self._file = open(self.path, "w", encoding="utf-8")
+
+    def write_batch(self, records: list[dict]) -> None:
+        if self.file_type == "parquet":
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, _parquet_schema(self.format))
+            table = pa.Table.from_pylist(
+                [_to_parquet_row(record, self.format) for record in records],
+                schema=self._parquet_writer.schema,
+            )
+            self._parquet_writer.write_table(table)
+            return
+        self._file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+
+    def close(self) -> None:
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if self._file is not None:
+            self._file.close()
+        if self._raw is not None and not self._raw.closed:
+            self._raw.close()
+
+
 class SynthesisDatasetExporter:
     """
     数据导出器 - 将合成数据导出为各种格式
 
     导出规则：
     - 维度：原始文件 (DatasetFiles)
-    - 每个原始文件生成一个 JSONL 文件
-    - JSONL 文件名称与原始文件名称一致
+    - 每个原始文件生成一个 JSONL（可 gzip/zstd 压缩）或 Parquet 文件，Parquet 按格式使用固定 schema，
+      raw 格式的记录存为 JSON 字符串列 data
+    - 导出文件名称与原始文件名称一致
     - 支持格式转换：alpaca、sharegpt、raw
+    - 合成数据按批流式读取并增量写入，多个文件实例并发导出，内存占用与数据量无关
     """
 
     SUPPORTED_FORMATS = ["alpaca", "sharegpt", "raw"]
     DEFAULT_FORMAT = "alpaca"
+    SUPPORTED_FILE_TYPES = ["jsonl", "jsonl.gz", "jsonl.zst", "parquet"]
+    DEFAULT_FILE_TYPE = "jsonl"
 
-    def __init__(self, db: AsyncSession, format: str = "alpaca", output_path: Optional[str] = None):
+    def __init__(
+        self,
+        db: AsyncSession,
+        format: str = "alpaca",
+        output_path: Optional[str] = None,
+        file_type: str = "jsonl",
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
+        concurrency: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ):
         self._db = db
         self._format = format if format in self.SUPPORTED_FORMATS else self.DEFAULT_FORMAT
         self._output_path = output_path
+        self._file_type = file_type if file_type in self.SUPPORTED_FILE_TYPES else self.DEFAULT_FILE_TYPE
+        # 每个文件实例使用独立会话流式读取，便于并发导出
+        self._session_factory = session_factory or AsyncSessionLocal
+        self._concurrency = concurrency or settings.synthesis_export_concurrency
+        self._batch_size = batch_size or settings.synthesis_export_batch_size
 
     async def export_task_to_dataset(
         self,
@@ -78,19 +192,10 @@ class SynthesisDatasetExporter:
         created_files: list[DatasetFiles] = []
         total_size = 0
 
-        for file_instance in file_instances:
-            records = await self._load_synthesis_data_for_file(file_instance.id)
-            if not records:
+        for file_path, record_count in await self._export_file_instances(file_instances, base_path):
+            if not record_count:
                 continue
 
-            original_name = file_instance.file_name or "unknown"
-            base_name, _ = os.path.splitext(original_name)
-            archived_file_name = f"{base_name}.jsonl"
-
-            file_path = os.path.join(base_path, archived_file_name)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            self._write_jsonl(file_path, records, self._format)
-
             try:
                 file_size = os.path.getsize(file_path)
             except OSError:
@@ -98,9 +203,9 @@ class SynthesisDatasetExporter:
 
             df = DatasetFiles(
                 dataset_id=dataset.id,
-                file_name=archived_file_name,
+                file_name=os.path.basename(file_path),
                 file_path=file_path,
-                file_type="jsonl",
+                file_type=self._file_type,
                 file_size=file_size,
                 last_access_time=datetime.datetime.now(),
             )
@@ -131,7 +236,7 @@ class SynthesisDatasetExporter:
         file_instance_ids: Optional[List[str]] = None,
     ) -> ExportSynthesisDataResponse:
         """
-        将合成数据导出为指定格式的 JSONL 文件
+        将合成数据导出为指定格式的 JSONL（可压缩）或 Parquet 文件
 
         Args:
             task_id: 任务 ID
@@ -154,20 +259,11 @@ class SynthesisDatasetExporter:
         file_paths: List[str] = []
         total_records = 0
 
-        for file_instance in file_instances:
-            records = await self._load_synthesis_data_for_file(file_instance.id)
-            if not records:
+        for file_path, record_count in await self._export_file_instances(file_instances, output_dir):
+            if not record_count:
                 continue
-
-            original_name = file_instance.file_name or "unknown"
-            base_name, _ = os.path.splitext(original_name)
-            output_file_name = f"{base_name}.jsonl"
-
-            file_path = os.path.join(output_dir, output_file_name)
-            self._write_jsonl(file_path, records, self._format)
-
             file_paths.append(file_path)
-            total_records += len(records)
+            total_records += record_count
 
         return ExportSynthesisDataResponse(
             file_paths=file_paths,
@@ -175,6 +271,74 @@ class SynthesisDatasetExporter:
             format=self._format,
         )
 
+    async def _export_file_instances(
+        self,
+        file_instances: Sequence[DataSynthesisFileInstance],
+        output_dir: str,
+    ) -> list[tuple[str, int]]:
+        """并发导出多个文件实例，返回与 file_instances 顺序一致的 (文件路径, 记录数) 列表"""
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def export_one(file_instance: DataSynthesisFileInstance, file_path: str) -> tuple[str, int]:
+            async with semaphore:
+                record_count = await self._export_file_instance(file_instance.id, file_path)
+            return file_path, record_count
+
+        file_paths = self._build_output_paths(file_instances, output_dir)
+        return list(await asyncio.gather(*(
+            export_one(file_instance, file_path)
+            for file_instance, file_path in zip(file_instances, file_paths)
+        )))
+
+    def _build_output_paths(
+        self,
+        file_instances: Sequence[DataSynthesisFileInstance],
+        output_dir: str,
+    ) -> list[str]:
+        """为每个文件实例分配导出路径，同名文件追加序号后缀，避免并发写入同一文件"""
+        used_names: set[str] = set()
+        file_paths: list[str] = []
+        for file_instance in file_instances:
+            base_name, _ = os.path.splitext(file_instance.file_name or "unknown")
+            file_name = f"{base_name}.{self._file_type}"
+            index = 1
+            while file_name in used_names:
+                file_name = f"{base_name}_{index}.{self._file_type}"
+                index += 1
+            used_names.add(file_name)
+            file_paths.append(os.path.join(output_dir, file_name))
+        return file_paths
+
+    async def _export_file_instance(self, file_instance_id: str, file_path: str) -> int:
+        """流式读取单个文件实例的合成数据并增量写入导出文件，没有数据时不生成文件"""
+        writer: Optional[_RecordFileWriter] = None
+        record_count = 0
+        completed = False
+        try:
+            async for batch in self._iter_synthesis_data_for_file(file_instance_id):
+                formatted = [self._format_record(record, self._format) for record in batch]
+                if writer is None:
+                    if self._file_type == "jsonl.zst" and not HAS_ZSTD:
+                        raise SynthesisExportError("zstandard is required for jsonl.zst export")
+                    if self._file_type == "parquet" and not HAS_PYARROW:
+                        raise SynthesisExportError("pyarrow is required for parquet export")
+                    writer = _RecordFileWriter(file_path, self._file_type, self._format)
+                    await asyncio.to_thread(writer.open)
+                # 文件写入与压缩放到线程中执行，不阻塞事件循环
+                await asyncio.to_thread(writer.write_batch, formatted)
+                record_count += len(formatted)
+            completed = True
+        finally:
+            if writer is not None:
+                try:
+                    await asyncio.to_thread(writer.close)
+                finally:
+                    if not completed:
+                        # 导出中途失败时删除写了一半的文件
+                        with contextlib.suppress(OSError):
+                            os.remove(file_path)
+        return record_count
+
     async def _load_file_instances(self, task_id: str) -> Sequence[DataSynthesisFileInstance]:
         """加载任务下的所有文件实例"""
         result = await self._db.execute(
@@ -195,32 +359,16 @@ class SynthesisDatasetExporter:
         )
         return result.scalars().all()
 
-    async def _load_synthesis_data_for_file(
-        self, file_instance_id: str
-    ) -> List[dict]:
-        """加载单个文件实例的所有合成数据"""
-        result = await self._db.execute(
-            select(SynthesisData).where(
-                SynthesisData.synthesis_file_instance_id == file_instance_id
+    async def _iter_synthesis_data_for_file(self, file_instance_id: str):
+        """使用服务端游标按批流式读取单个文件实例的合成数据，只查询 data 列"""
+        async with self._session_factory() as session:
+            result = await session.stream_scalars(
+                select(SynthesisData.data)
+                .where(SynthesisData.synthesis_file_instance_id == file_instance_id)
+                .execution_options(yield_per=self._batch_size)
             )
-        )
-        rows: Sequence[SynthesisData] = result.scalars().all()
-
-        records: List[dict] = []
-        for row in rows:
-            payload = row.data or {}
-            records.append(payload)
-        return records
-
-    def _write_jsonl(self, path: str, records: Iterable[dict], format: Optional[str] = None) -> None:
-        """写入 JSONL 文件"""
-        fmt = format or self._format
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w", encoding="utf-8") as f:
-            for record in records:
-                formatted = self._format_record(record, fmt)
-                f.write(json.dumps(formatted, ensure_ascii=False))
-                f.write("\n")
+            async for rows in result.partitions():
+                yield [row or {} for row in rows]
 
     def _format_record(self, record: dict, format: str) -> dict:
         """根据格式转换记录"""
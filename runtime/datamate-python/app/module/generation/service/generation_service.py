@@ -1,5 +1,4 @@
 """数据合成服务 - 核心业务逻辑层"""
-import asyncio
 from contextlib import asynccontextmanager
 
 from sqlalchemy import select
@@ -9,7 +8,6 @@ from app.db.models.base_entity import LineageNode, LineageEdge
 from app.db.models.data_synthesis import (
     DataSynthInstance,
     DataSynthesisFileInstance,
-    DataSynthesisChunkInstance,
     SynthesisData,
 )
 from app.db.models.dataset_management import DatasetFiles, Dataset
@@ -18,6 +16,7 @@ from app.module.generation.schema.generation import Config, SyntheConfig
 from app.module.generation.service.chunk_processor import ChunkProcessor
 from app.module.generation.service.qa_generator import QAGenerator
 from app.module.generation.service.qa_generator import _filter_docs_by_size
+from app.module.generation.service.synthesis_pipeline import FileContext, SynthesisPipeline
 from app.module.generation.service.task_executor import run_in_thread
 from app.module.shared.common.document_loaders import load_documents
 from app.module.shared.common.text_split import DocumentSplitter
@@ -100,48 +99,51 @@ class GenerationService:
                 await self._mark_task_failed(session, task_id, "no_files_associated")
                 return
 
-            # 逐个文件处理
-            processed_count = 0
-            total_task_chunks = 0
-            processed_task_chunks = 0
-            for file_id in file_ids:
+            # 文件逐个切片入库，切片提交到流水线后跨文件并发生成问答
+            existing_qa_pairs = (
+                await QAGenerator(session).count_qa_pairs(task_id) if max_qa_pairs else 0
+            )
+            pipeline = SynthesisPipeline(
+                synth_task_id=str(synth_task.id),
+                session_factory=AsyncSessionLocal,
+                max_qa_pairs=max_qa_pairs,
+                existing_qa_pairs=existing_qa_pairs,
+            )
+            # 同一任务内的LLM调用统计响应缓存命中率，重试任务时已生成过的提示词直接命中缓存
+            with LLMFactory.cache_scope(f"synthesis:{task_id}"):
+                pipeline.start()
+                prepared_count = 0
                 try:
-                    file_task = await self._get_or_create_file_instance(
-                        session, str(synth_task.id), file_id
-                    )
-                    success = await self._process_single_file(
-                        session, synth_task, file_id, max_qa_pairs=max_qa_pairs
-                    )
-                    # 累加任务级别的切片统计
-                    if file_task:
-                        total_task_chunks += file_task.total_chunks or 0
-                        processed_task_chunks += file_task.processed_chunks or 0
-                except Exception as e:
-                    logger.exception(
-                        f"Unexpected error when processing file {file_id} for task {task_id}: {e}"
-                    )
-                    await self._mark_file_failed(
-                        session, str(synth_task.id), file_id, str(e)
-                    )
-                    success = False
-
-                if success:
-                    processed_count += 1
-                    synth_task.processed_files = processed_count
-                    # 更新任务级别的切片统计
-                    synth_task.total_chunks = total_task_chunks
-                    synth_task.processed_chunks = processed_task_chunks
-                    await session.commit()
+                    for file_id in file_ids:
+                        try:
+                            success = await self._process_single_file(
+                                session, synth_task, file_id, pipeline
+                            )
+                        except Exception as e:
+                            logger.exception(
+                                f"Unexpected error when processing file {file_id} for task {task_id}: {e}"
+                            )
+                            await self._mark_file_failed(
+                                session, str(synth_task.id), file_id, str(e)
+                            )
+                            success = False
+                        if success:
+                            prepared_count += 1
+                    await pipeline.close()
+                except BaseException:
+                    await pipeline.abort()
+                    raise
 
             # 更新最终任务状态
-            if processed_count == len(file_ids):
+            processed_count = len(pipeline.completed_files)
+            if prepared_count == len(file_ids) and processed_count == prepared_count:
                 synth_task.status = "completed"
             else:
                 synth_task.status = "partially_completed"
             # 确保任务完成时切片统计准确
-            if synth_task.status in ("completed", "partially_completed"):
-                synth_task.total_chunks = total_task_chunks
-                synth_task.processed_chunks = processed_task_chunks
+            synth_task.processed_files = processed_count
+            synth_task.total_chunks = pipeline.total_chunks
+            synth_task.processed_chunks = pipeline.processed_chunks
             await session.commit()
 
             logger.info(f"Finished processing synthesis task {synth_task.id}")
@@ -164,19 +166,19 @@ class GenerationService:
         session: AsyncSession,
         synth_task: DataSynthInstance,
         file_id: str,
-        max_qa_pairs: int | None = None,
+        pipeline: SynthesisPipeline,
     ) -> bool:
         """
-        处理单个源文件 - 使用线程池执行阻塞操作
+        处理单个源文件 - 使用线程池执行阻塞操作，切片入库后提交到合成流水线
 
         Args:
             session: 数据库会话
             synth_task: 合成任务实例
             file_id: 源文件ID
-            max_qa_pairs: 最大QA对数量限制
+            pipeline: 合成流水线
 
         Returns:
-            处理是否成功
+            文件是否成功提交到流水线
         """
         # 解析文件路径
         file_path = await self._resolve_file_path(session, file_id)
@@ -269,160 +271,53 @@ class GenerationService:
         answer_chat = LLMFactory.create_chat(
             answer_model.model_name, answer_model.base_url, answer_model.api_key
         )
-
-        # 5. 分批次处理切片
-        await self._process_chunks_in_batches(
-            session=session,
+        file_ctx = pipeline.create_file_context(
             file_task=file_task,
             total_chunks=total_chunks,
             question_cfg=question_cfg,
             answer_cfg=answer_cfg,
             question_chat=question_chat,
             answer_chat=answer_chat,
-            synth_task_id=str(synth_task.id),
-            max_qa_pairs=max_qa_pairs,
         )
 
-        # 6. 标记文件任务完成
-        file_task.status = "completed"
-        await session.commit()
-        await session.refresh(file_task)
+        # 5. 分批次加载切片并提交到流水线，流水线满时在此处阻塞
+        await self._submit_chunks_in_batches(session, file_ctx, pipeline)
         return True
 
-    async def _process_chunks_in_batches(
+    async def _submit_chunks_in_batches(
         self,
         session: AsyncSession,
-        file_task: DataSynthesisFileInstance,
-        total_chunks: int,
-        question_cfg: SyntheConfig,
-        answer_cfg: SyntheConfig,
-        question_chat,
-        answer_chat,
-        synth_task_id: str,
-        max_qa_pairs: int | None,
+        file_ctx: FileContext,
+        pipeline: SynthesisPipeline,
     ) -> None:
-        """分批次处理切片
+        """流式读取切片并提交到流水线
 
         Args:
             session: 数据库会话
-            file_task: 文件任务实例
-            total_chunks: 总切片数
-            question_cfg: 问题生成配置
-            answer_cfg: 答案生成配置
-            question_chat: 问题生成模型
-            answer_chat: 答案生成模型
-            synth_task_id: 合成任务ID
-            max_qa_pairs: 最大QA对数量限制
+            file_ctx: 流水线中的文件上下文
+            pipeline: 合成流水线
         """
-        batch_size = 50  # 减小批次大小，降低内存占用
-        current_index = 1
-
+        submitted = 0
+        pending = None
         chunk_processor = ChunkProcessor(session)
-        qa_generator = QAGenerator(session)
 
-        while current_index <= total_chunks:
-            end_index = min(current_index + batch_size - 1, total_chunks)
-
-            # 使用 ChunkProcessor 加载切片批次
-            chunk_batch = await chunk_processor.load_chunk_batch(
-                file_task_id=file_task.id,
-                start_index=current_index,
-                end_index=end_index,
+        # 最后一个切片延后提交，确保其落库前切片总数已按实际加载数修正
+        async for chunk in chunk_processor.iter_chunks(file_ctx.file_task_id):
+            if pending is not None:
+                await pipeline.submit(file_ctx, *pending)
+                submitted += 1
+            pending = (chunk.id, chunk.chunk_index, chunk.chunk_content)
+
+        loaded = submitted + (pending is not None)
+        if loaded != file_ctx.total_chunks:
+            logger.warning(
+                f"Loaded {loaded}/{file_ctx.total_chunks} chunks for file={file_ctx.file_task_id}"
             )
 
-            if not chunk_batch:
-                logger.warning(
-                    f"Empty chunk batch loaded for file={file_task.id}, range=[{current_index}, {end_index}]"
-                )
-                current_index = end_index + 1
-                continue
-
-            # 顺序处理每个切片，避免并发过高
-            for chunk in chunk_batch:
-                try:
-                    success = await self._process_single_chunk(
-                        session=session,
-                        file_task=file_task,
-                        chunk=chunk,
-                        question_cfg=question_cfg,
-                        answer_cfg=answer_cfg,
-                        question_chat=question_chat,
-                        answer_chat=answer_chat,
-                        synth_task_id=synth_task_id,
-                        max_qa_pairs=max_qa_pairs,
-                        qa_generator=qa_generator,
-                    )
-                    if success:
-                        # 更新已处理的切片计数
-                        file_task.processed_chunks = (file_task.processed_chunks or 0) + 1
-                        # 实时刷新进度到数据库
-                        await session.commit()
-                        await session.refresh(file_task)
-                        logger.info(f"File {file_task.id} progress: {file_task.processed_chunks}/{file_task.total_chunks} chunks processed")
-                except Exception as e:
-                    logger.error(f"Error processing chunk {chunk.id}: {e}")
-                    # 即使处理失败，也要更新进度
-                    file_task.processed_chunks = (file_task.processed_chunks or 0) + 1
-                    await session.commit()
-                    await session.refresh(file_task)
-
-                # 短暂释放控制权，让出事件循环，处理其他请求
-                await asyncio.sleep(0)
-
-            current_index = end_index + 1
-
-    async def _process_single_chunk(
-        self,
-        session: AsyncSession,
-        file_task: DataSynthesisFileInstance,
-        chunk: DataSynthesisChunkInstance,
-        question_cfg: SyntheConfig,
-        answer_cfg: SyntheConfig,
-        question_chat,
-        answer_chat,
-        synth_task_id: str,
-        max_qa_pairs: int | None,
-        qa_generator: QAGenerator,
-    ) -> bool:
-        """处理单个切片
-
-        Args:
-            session: 数据库会话
-            file_task: 文件任务实例
-            chunk: 切片实例
-            question_cfg: 问题生成配置
-            answer_cfg: 答案生成配置
-            question_chat: 问题生成模型
-            answer_chat: 答案生成模型
-            synth_task_id: 合成任务ID
-            max_qa_pairs: 最大QA对数量限制
-            qa_generator: QA生成器
-
-        Returns:
-            处理是否成功
-        """
-        # 检查QA对数量上限
-        if max_qa_pairs and max_qa_pairs > 0:
-            if await qa_generator.check_qa_limit(synth_task_id, max_qa_pairs):
-                logger.info(f"max_qa_pairs reached, skipping chunk {chunk.chunk_index}")
-                file_task.status = "completed"
-                if file_task.total_chunks is not None:
-                    file_task.processed_chunks = file_task.total_chunks
-                await session.commit()
-                await session.refresh(file_task)
-                return False
-
-        # 使用 QAGenerator 处理问答生成
-        success_count = await qa_generator.process_chunk_qa(
-            file_task=file_task,
-            chunk=chunk,
-            question_cfg=question_cfg,
-            answer_cfg=answer_cfg,
-            question_chat=question_chat,
-            answer_chat=answer_chat,
-        )
-
-        return success_count > 0
+        # 以实际加载的切片数作为文件完成的判断依据
+        file_ctx.total_chunks = loaded
+        if pending is not None:
+            await pipeline.submit(file_ctx, *pending)
 
     async def _resolve_file_path(self, session: AsyncSession, file_id: str) -> str | None:
         """根据文件ID获取文件路径
@@ -89,16 +89,14 @@ class QuestionGenerator:
 
         # 调用模型
         async with self.semaphore:
-            loop = asyncio.get_running_loop()
-            raw_answer = await loop.run_in_executor(
-                None,
-                LLMFactory.invoke_sync,
-                question_chat,
-                prompt,
-            )
+            raw_answer = await LLMFactory.ainvoke(question_chat, prompt)
+            questions = self._parse_questions(raw_answer)
+            if not questions:
+                # 缓存的结果可能无法解析，重试需要重新调用模型
+                raw_answer = await LLMFactory.ainvoke(question_chat, prompt, use_cache=False)
+                questions = self._parse_questions(raw_answer)
 
-        # 解析问题列表
-        return self._parse_questions(raw_answer)
+        return questions
 
     def _parse_questions(self, raw_answer: str) -> list[str]:
         """从模型返回中解析问题列表
@@ -156,55 +154,86 @@ class AnswerGenerator:
         Returns:
             成功生成的QA对数量
         """
+        records = await self.generate_answer_records(
+            file_task_id=file_task.id,
+            chunk_id=chunk.id,
+            chunk_text=chunk.chunk_content or "",
+            questions=questions,
+            answer_cfg=answer_cfg,
+            answer_chat=answer_chat,
+        )
+        if records:
+            self.db.add_all(records)
+            await self.db.commit()
+
+        return len(records)
+
+    async def generate_answer_records(
+        self,
+        file_task_id: str,
+        chunk_id: str,
+        chunk_text: str,
+        questions: list[str],
+        answer_cfg: SyntheConfig,
+        answer_chat: BaseChatModel,
+    ) -> list[SynthesisData]:
+        """为一个切片的所有问题并发生成答案，返回待写入的合成数据记录（不写库）
+
+        Args:
+            file_task_id: 文件任务ID
+            chunk_id: 切片ID
+            chunk_text: 切片原文
+            questions: 问题列表
+            answer_cfg: 答案生成配置
+            answer_chat: 答案生成模型
+
+        Returns:
+            合成数据记录列表
+        """
         if not questions:
-            return 0
+            return []
 
-        chunk_text = chunk.chunk_content or ""
         template = getattr(answer_cfg, "prompt_template", None)
         template = template if template and template.strip() else ANSWER_GENERATOR_PROMPT
 
-        success_count = 0
-
-        async def process_question(question: str) -> bool:
-            nonlocal success_count
+        async def process_question(question: str) -> SynthesisData | None:
             try:
                 prompt = template.replace("{text}", chunk_text).replace("{question}", question)
 
                 async with self.semaphore:
-                    loop = asyncio.get_running_loop()
-                    answer = await loop.run_in_executor(
-                        None,
-                        LLMFactory.invoke_sync,
-                        answer_chat,
-                        prompt,
-                    )
+                    answer = await LLMFactory.ainvoke(answer_chat, prompt)
+                    if self._parse_answer(answer) is None:
+                        # 缓存的结果可能无法解析，重试需要重新调用模型
+                        answer = await LLMFactory.ainvoke(answer_chat, prompt, use_cache=False)
 
                 # 构建数据对象
                 data_obj = self._build_synthesis_data(chunk_text, question, answer)
 
-                # 保存记录
-                record = SynthesisData(
+                return SynthesisData(
                     id=str(uuid.uuid4()),
                     data=data_obj,
-                    synthesis_file_instance_id=file_task.id,
-                    chunk_instance_id=chunk.id,
+                    synthesis_file_instance_id=file_task_id,
+                    chunk_instance_id=chunk_id,
                 )
-                self.db.add(record)
-                success_count += 1
-                return True
 
             except Exception as e:
                 logger.error(f"Failed to generate answer for question '{question[:50]}...': {e}")
-                return False
+                return None
 
         # 并行处理所有问题
-        tasks = [process_question(q) for q in questions]
-        await asyncio.gather(*tasks, return_exceptions=True)
-
-        if success_count > 0:
-            await self.db.commit()
-
-        return success_count
+        results = await asyncio.gather(*(process_question(q) for q in questions))
+        return [record for record in results if record is not None]
+
+    @staticmethod
+    def _parse_answer(answer: str) -> dict[str, Any] | None:
+        """解析模型返回的JSON对象，无法解析时返回 None"""
+        if not isinstance(answer, str):
+            return None
+        try:
+            parsed = json.loads(extract_json_substring(answer))
+        except Exception:
+            return None
+        return parsed if isinstance(parsed, dict) else None
 
     def _build_synthesis_data(
         self,
@@ -229,15 +258,7 @@ class AnswerGenerator:
         }
 
         # 尝试解析模型返回的JSON
-        parsed_obj: dict[str, Any] | None = None
-        if isinstance(answer, str):
-            cleaned = extract_json_substring(answer)
-            try:
-                parsed = json.loads(cleaned)
-                if isinstance(parsed, dict):
-                    parsed_obj = parsed
-            except Exception:
-                parsed_obj = None
+        parsed_obj = self._parse_answer(answer)
 
         # 合并解析结果
         if parsed_obj is not None:
@@ -335,6 +356,17 @@ class QAGenerator:
         if max_qa_pairs is None or max_qa_pairs <= 0:
             return False
 
+        return await self.count_qa_pairs(synth_task_id) >= max_qa_pairs
+
+    async def count_qa_pairs(self, synth_task_id: str) -> int:
+        """统计合成任务已生成的QA对数量
+
+        Args:
+            synth_task_id: 合成任务ID
+
+        Returns:
+            QA对数量
+        """
         result = await self.db.execute(
             select(func.count(SynthesisData.id)).where(
                 SynthesisData.synthesis_file_instance_id.in_(
@@ -344,6 +376,4 @@ class QAGenerator:
                 )
             )
         )
-        current_count = int(result.scalar() or 0)
-
-        return current_count >= max_qa_pairs
+        return int(result.scalar() or 0)
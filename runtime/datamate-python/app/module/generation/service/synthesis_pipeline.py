@@ -0,0 +1,327 @@
+"""数据合成流水线 - 问题生成 → 答案生成 → 批量写库，跨文件保持多个切片在途"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models.data_synthesis import (
+    DataSynthInstance,
+    DataSynthesisFileInstance,
+    SynthesisData,
+)
+from app.db.session import logger
+from app.module.generation.schema.generation import SyntheConfig
+from app.module.generation.service.qa_generator import AnswerGenerator, QuestionGenerator
+
+# 队列结束标记
+_STOP = object()
+# 批量写库失败时的尝试次数与重试间隔（秒），仍失败时将涉及的文件标记为失败
+_FLUSH_ATTEMPTS = 3
+_FLUSH_RETRY_DELAY = 1.0
+
+
+@dataclass
+class FileContext:
+    """流水线中单个文件的上下文"""
+
+    file_task_id: str
+    total_chunks: int
+    question_cfg: SyntheConfig
+    answer_cfg: SyntheConfig
+    question_chat: Any
+    answer_chat: Any
+    question_generator: QuestionGenerator
+    answer_generator: AnswerGenerator
+    processed_chunks: int = 0
+
+
+@dataclass
+class ChunkItem:
+    """流水线中流转的切片，只携带纯数据，避免跨会话访问ORM对象"""
+
+    file: FileContext
+    chunk_id: str
+    chunk_index: int
+    chunk_text: str
+    questions: list[str] = field(default_factory=list)
+
+
+class SynthesisPipeline:
+    """有界的数据合成流水线
+
+    - 问题生成阶段与答案生成阶段各由一组worker消费有界队列，队列满时阻塞生产者，控制在途切片数
+    - 同一模型的LLM调用共享一个信号量，限制每个模型的并发
+    - 合成结果与进度计数由单独的写入协程按条数或时间间隔批量落库
+    """
+
+    def __init__(
+        self,
+        synth_task_id: str,
+        session_factory: Callable[[], AsyncSession],
+        max_qa_pairs: int | None = None,
+        existing_qa_pairs: int = 0,
+        chunks_in_flight: int | None = None,
+        model_concurrency: int | None = None,
+        write_batch_size: int | None = None,
+        flush_interval: float | None = None,
+    ):
+        self.synth_task_id = synth_task_id
+        self.session_factory = session_factory
+        self.max_qa_pairs = max_qa_pairs if max_qa_pairs and max_qa_pairs > 0 else None
+        self.qa_pairs = existing_qa_pairs
+        self.chunks_in_flight = chunks_in_flight or settings.synthesis_chunks_in_flight
+        self.model_concurrency = model_concurrency or settings.synthesis_model_concurrency
+        self.write_batch_size = write_batch_size or settings.synthesis_write_batch_size
+        self.flush_interval = flush_interval or settings.synthesis_flush_interval_seconds
+
+        self.question_queue: asyncio.Queue = asyncio.Queue(maxsize=self.chunks_in_flight)
+        self.answer_queue: asyncio.Queue = asyncio.Queue(maxsize=self.chunks_in_flight)
+        self.write_queue: asyncio.Queue = asyncio.Queue()
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._workers: list[asyncio.Task] = []
+        self._writer: asyncio.Task | None = None
+
+        self.files: list[FileContext] = []
+        self.completed_files: set[str] = set()
+        self.failed_files: set[str] = set()
+        self.metrics = {"chunks": 0, "skipped_chunks": 0, "qa_pairs": 0, "flushes": 0, "write_failures": 0}
+
+    def model_semaphore(self, model_id: str) -> asyncio.Semaphore:
+        """获取模型对应的并发信号量，问题与答案使用同一模型时共享"""
+        if model_id not in self._semaphores:
+            self._semaphores[model_id] = asyncio.Semaphore(self.model_concurrency)
+        return self._semaphores[model_id]
+
+    def create_file_context(
+        self,
+        file_task: DataSynthesisFileInstance,
+        total_chunks: int,
+        question_cfg: SyntheConfig,
+        answer_cfg: SyntheConfig,
+        question_chat: Any,
+        answer_chat: Any,
+    ) -> FileContext:
+        """为文件创建流水线上下文"""
+        file_ctx = FileContext(
+            file_task_id=str(file_task.id),
+            total_chunks=total_chunks,
+            question_cfg=question_cfg,
+            answer_cfg=answer_cfg,
+            question_chat=question_chat,
+            answer_chat=answer_chat,
+            question_generator=QuestionGenerator(None, self.model_semaphore(question_cfg.model_id)),
+            answer_generator=AnswerGenerator(None, self.model_semaphore(answer_cfg.model_id)),
+        )
+        self.files.append(file_ctx)
+        return file_ctx
+
+    def start(self) -> None:
+        """启动各阶段worker与写入协程"""
+        self._workers = [
+            asyncio.create_task(self._question_worker()) for _ in range(self.chunks_in_flight)
+        ] + [
+            asyncio.create_task(self._answer_worker()) for _ in range(self.chunks_in_flight)
+        ]
+        self._writer = asyncio.create_task(self._write_worker())
+
+    async def submit(self, file_ctx: FileContext, chunk_id: str, chunk_index: int, chunk_text: str) -> None:
+        """提交一个切片，在途切片达到上限时阻塞"""
+        await self.question_queue.put(ChunkItem(file_ctx, chunk_id, chunk_index, chunk_text))
+
+    async def close(self) -> None:
+        """等待所有在途切片处理完成并落库"""
+        question_workers = self._workers[:self.chunks_in_flight]
+        answer_workers = self._workers[self.chunks_in_flight:]
+        for _ in question_workers:
+            await self.question_queue.put(_STOP)
+        await asyncio.gather(*question_workers)
+        for _ in answer_workers:
+            await self.answer_queue.put(_STOP)
+        await asyncio.gather(*answer_workers)
+        await self.write_queue.put(_STOP)
+        await self._writer
+        logger.info(f"Synthesis pipeline finished for task={self.synth_task_id}, metrics={self.metrics}")
+
+    async def abort(self) -> None:
+        """异常时取消所有worker"""
+        tasks = [*self._workers, self._writer] if self._writer else list(self._workers)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @property
+    def total_chunks(self) -> int:
+        return sum(file_ctx.total_chunks for file_ctx in self.files)
+
+    @property
+    def processed_chunks(self) -> int:
+        return sum(file_ctx.processed_chunks for file_ctx in self.files)
+
+    def _qa_limit_reached(self) -> bool:
+        return self.max_qa_pairs is not None and self.qa_pairs >= self.max_qa_pairs
+
+    async def _question_worker(self) -> None:
+        while True:
+            item = await self.question_queue.get()
+            if item is _STOP:
+                return
+            file_ctx = item.file
+            try:
+                if self._qa_limit_reached():
+                    logger.info(f"max_qa_pairs reached, skipping chunk {item.chunk_index}")
+                    self.metrics["skipped_chunks"] += 1
+                elif not item.chunk_text.strip():
+                    logger.warning(f"Empty chunk text for chunk_index={item.chunk_index}")
+                else:
+                    item.questions = await file_ctx.question_generator.generate_questions(
+                        chunk_text=item.chunk_text,
+                        question_cfg=file_ctx.question_cfg,
+                        question_chat=file_ctx.question_chat,
+                    )
+                    if not item.questions:
+                        logger.info(f"No questions generated for chunk_index={item.chunk_index}")
+            except Exception as e:
+                logger.error(f"Generate questions failed for chunk {item.chunk_id}: {e}")
+                item.questions = []
+
+            if item.questions:
+                await self.answer_queue.put(item)
+            else:
+                await self.write_queue.put((item, []))
+
+    async def _answer_worker(self) -> None:
+        while True:
+            item = await self.answer_queue.get()
+            if item is _STOP:
+                return
+            file_ctx = item.file
+            try:
+                records = await file_ctx.answer_generator.generate_answer_records(
+                    file_task_id=file_ctx.file_task_id,
+                    chunk_id=item.chunk_id,
+                    chunk_text=item.chunk_text,
+                    questions=item.questions,
+                    answer_cfg=file_ctx.answer_cfg,
+                    answer_chat=file_ctx.answer_chat,
+                )
+            except Exception as e:
+                logger.error(f"Error processing chunk {item.chunk_id}: {e}")
+                records = []
+            self.qa_pairs += len(records)
+            await self.write_queue.put((item, records))
+
+    async def _write_worker(self) -> None:
+        records: list[SynthesisData] = []
+        done_items: list[ChunkItem] = []
+        last_flush = time.monotonic()
+        stopping = False
+        while not stopping:
+            timeout = max(self.flush_interval - (time.monotonic() - last_flush), 0)
+            try:
+                entry = await asyncio.wait_for(self.write_queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                entry = None
+
+            if entry is _STOP:
+                stopping = True
+            elif entry is not None:
+                item, item_records = entry
+                records.extend(item_records)
+                done_items.append(item)
+
+            if stopping or len(records) >= self.write_batch_size or time.monotonic() - last_flush >= self.flush_interval:
+                if records or done_items:
+                    await self._flush(records, done_items)
+                records, done_items = [], []
+                last_flush = time.monotonic()
+
+    async def _flush(self, records: list[SynthesisData], done_items: list[ChunkItem]) -> None:
+        """批量写入合成结果并刷新文件与任务进度，进度计数在提交成功后才更新"""
+        # 本批完成后各文件的已处理切片数
+        processed: dict[int, tuple[FileContext, int]] = {}
+        for item in done_items:
+            file_ctx, count = processed.get(id(item.file), (item.file, item.file.processed_chunks))
+            processed[id(item.file)] = (file_ctx, count + 1)
+        completed = {
+            file_ctx.file_task_id for file_ctx, count in processed.values()
+            if count >= file_ctx.total_chunks and file_ctx.file_task_id not in self.failed_files
+        }
+
+        for attempt in range(1, _FLUSH_ATTEMPTS + 1):
+            try:
+                await self._write_batch(records, processed, completed, len(done_items))
+                break
+            except Exception as e:
+                if attempt < _FLUSH_ATTEMPTS:
+                    logger.warning(
+                        f"Failed to flush {len(records)} synthesis records for task={self.synth_task_id} "
+                        f"(attempt {attempt}/{_FLUSH_ATTEMPTS}), retrying: {e}"
+                    )
+                    await asyncio.sleep(_FLUSH_RETRY_DELAY * attempt)
+                    continue
+                self.metrics["write_failures"] += len(records)
+                logger.exception(f"Failed to flush {len(records)} synthesis records for task={self.synth_task_id}: {e}")
+                # 这些切片的结果已丢失，文件无法再完成，标记为失败，避免一直停留在处理中
+                await self._mark_files_failed({file_ctx.file_task_id for file_ctx, _ in processed.values()})
+                return
+
+        for file_ctx, count in processed.values():
+            file_ctx.processed_chunks = count
+        self.completed_files |= completed
+
+        self.metrics["chunks"] += len(done_items)
+        self.metrics["qa_pairs"] += len(records)
+        self.metrics["flushes"] += 1
+        logger.info(
+            f"Task {self.synth_task_id} progress: {self.processed_chunks}/{self.total_chunks} chunks processed, "
+            f"{len(self.completed_files)} files completed"
+        )
+
+    async def _write_batch(
+        self,
+        records: list[SynthesisData],
+        processed: dict[int, tuple[FileContext, int]],
+        completed: set[str],
+        done_count: int,
+    ) -> None:
+        """在一个事务中写入合成结果、文件进度与任务进度"""
+        async with self.session_factory() as session:
+            if records:
+                session.add_all(records)
+            for file_ctx, count in processed.values():
+                values: dict[str, Any] = {"processed_chunks": count}
+                if file_ctx.file_task_id in completed:
+                    values["status"] = "completed"
+                await session.execute(
+                    update(DataSynthesisFileInstance)
+                    .where(DataSynthesisFileInstance.id == file_ctx.file_task_id)
+                    .values(**values)
+                )
+            await session.execute(
+                update(DataSynthInstance)
+                .where(DataSynthInstance.id == self.synth_task_id)
+                .values(
+                    processed_files=len(self.completed_files | completed),
+                    total_chunks=self.total_chunks,
+                    processed_chunks=self.processed_chunks + done_count,
+                )
+            )
+            await session.commit()
+
+    async def _mark_files_failed(self, file_task_ids: set[str]) -> None:
+        """将写库失败的文件实例标记为失败"""
+        self.failed_files |= file_task_ids
+        try:
+            async with self.session_factory() as session:
+                await session.execute(
+                    update(DataSynthesisFileInstance)
+                    .where(DataSynthesisFileInstance.id.in_(file_task_ids))
+                    .values(status="failed")
+                )
+                await session.commit()
+        except Exception as e:
+            logger.exception(f"Failed to mark file instances {sorted(file_task_ids)} as failed: {e}")
@@ -60,4 +60,6 @@ class EmbeddingFactory:
         )
 
 
-__all__ = ["EmbeddingFactory", "Embeddings"]
+from app.module.rag.infra.embeddings.cache import CachedEmbeddings, EmbeddingCache
+
+__all__ = ["EmbeddingFactory", "Embeddings", "CachedEmbeddings", "EmbeddingCache"]
@@ -0,0 +1,192 @@
+"""
+嵌入向量缓存
+
+以 (嵌入模型, 分块文本) 的内容哈希为键，将向量以 float32 二进制存入本地 SQLite。
+重新处理文件或编辑分块时，文本未变化的分块直接复用缓存向量，只对变化的分块请求嵌入服务。
+条目数超过上限时按最近访问时间淘汰。
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 单条 SQL 中 IN 查询的键数量上限
+_QUERY_BATCH_SIZE = 500
+
+
+class EmbeddingCache:
+    """基于 SQLite 的嵌入向量存储，进程内共享一个实例"""
+
+    _instance: Optional["EmbeddingCache"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None):
+        self.path = path or settings.rag_embedding_cache_path
+        self.max_entries = max_entries if max_entries is not None else settings.rag_embedding_cache_max_entries
+        self.enabled = settings.rag_embedding_cache_enabled and self.max_entries > 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+    @classmethod
+    def get_instance(cls) -> "EmbeddingCache":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    @staticmethod
+    def make_key(model_key: str, text: str) -> str:
+        return hashlib.sha256(f"{model_key}\0{text}".encode("utf-8")).hexdigest()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is not None or not self.enabled:
+            return self._conn
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_accessed ON embedding_cache(accessed_at)")
+            conn.commit()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("嵌入缓存不可用，已关闭: path=%s error=%s", self.path, e)
+            self.enabled = False
+            return None
+        self._conn = conn
+        return conn
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """批量读取缓存向量，返回命中的 key -> 向量"""
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            conn = self._connect()
+            if conn is None or not keys:
+                return found
+            try:
+                for start in range(0, len(keys), _QUERY_BATCH_SIZE):
+                    batch = keys[start:start + _QUERY_BATCH_SIZE]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = conn.execute(
+                        f"SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = array("f")
+                        vector.frombytes(blob)
+                        found[key] = vector.tolist()
+                if found:
+                    now = time.time()
+                    conn.executemany(
+                        "UPDATE embedding_cache SET accessed_at = ? WHERE key = ?",
+                        [(now, key) for key in found],
+                    )
+                    conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("读取嵌入缓存失败: %s", e)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        """批量写入向量（float32）"""
+        with self._lock:
+            conn = self._connect()
+            if conn is None or not items:
+                return
+            try:
+                now = time.time()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (key, vector, accessed_at) VALUES (?, ?, ?)",
+                    [(key, array("f", vector).tobytes(), now) for key, vector in items.items()],
+                )
+                conn.commit()
+                self._writes += len(items)
+                # 每写入上限的百分之一条检查一次条目总数
+                if self._writes >= max(self.max_entries // 100, 1):
+                    self._writes = 0
+                    self._evict(conn)
+            except sqlite3.Error as e:
+                logger.warning("写入嵌入缓存失败: %s", e)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        if total <= self.max_entries:
+            return
+        # 淘汰最久未访问的向量，直到条目数降到上限的90%
+        conn.execute(
+            "DELETE FROM embedding_cache WHERE key IN ("
+            "SELECT key FROM embedding_cache ORDER BY accessed_at ASC LIMIT ?)",
+            (total - int(self.max_entries * 0.9),),
+        )
+        conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """为文档嵌入增加缓存的 Embeddings 包装，查询嵌入不经过缓存"""
+
+    def __init__(self, embedding: Embeddings, model_key: str, cache: Optional[EmbeddingCache] = None):
+        self.embedding = embedding
+        self.model_key = model_key
+        self.cache = cache or EmbeddingCache.get_instance()
+        self.metrics = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def wrap(embedding: Embeddings, cache: Optional[EmbeddingCache] = None) -> Embeddings:
+        """包装嵌入模型；已包装、缓存关闭或无法识别模型时原样返回"""
+        if isinstance(embedding, CachedEmbeddings):
+            return embedding
+        cache = cache or EmbeddingCache.get_instance()
+        model = getattr(embedding, "model", None) or getattr(embedding, "model_name", None)
+        if not cache.enabled or not model:
+            return embedding
+        base_url = getattr(embedding, "openai_api_base", None) or getattr(embedding, "base_url", None) or ""
+        dimensions = getattr(embedding, "dimensions", None) or ""
+        model_key = f"{type(embedding).__name__}:{model}:{base_url}:{dimensions}"
+        return CachedEmbeddings(embedding, model_key, cache)
+
+    def _lookup(self, texts: List[str]) -> tuple[List[str], Dict[str, List[float]], List[str]]:
+        keys = [self.cache.make_key(self.model_key, text) for text in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+        # 同一批次内重复的文本只请求一次
+        missing = list({key: text for key, text in zip(keys, texts) if key not in found}.values())
+        self.metrics["hits"] += len(texts) - len(missing)
+        self.metrics["misses"] += len(missing)
+        return keys, found, missing
+
+    def _store(self, missing: List[str], vectors: List[List[float]], found: Dict[str, List[float]]) -> None:
+        new_items = {self.cache.make_key(self.model_key, text): vector for text, vector in zip(missing, vectors)}
+        self.cache.put_many(new_items)
+        found.update(new_items)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts)
+        if missing:
+            self._store(missing, self.embedding.embed_documents(missing), found)
+        return [found[key] for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = await asyncio.to_thread(self._lookup, texts)
+        if missing:
+            vectors = await self.embedding.aembed_documents(missing)
+            await asyncio.to_thread(self._store, missing, vectors, found)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embedding.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embedding.aembed_query(text)
@@ -9,6 +9,8 @@ from app.module.rag.infra.vectorstore.store import (
     chunks_to_documents,
     create_collection,
     delete_chunks_by_rag_file_ids,
+    delete_chunks_by_ids,
+    adelete_chunks_by_rag_file_ids,
     drop_collection,
     get_vector_dimension,
     rename_collection,
@@ -24,6 +26,8 @@ __all__ = [
     "rename_collection",
     "get_vector_dimension",
     "delete_chunks_by_rag_file_ids",
+    "delete_chunks_by_ids",
+    "adelete_chunks_by_rag_file_ids",
     "chunks_to_documents",
     "update_chunk_by_id",
     "delete_chunk_by_id",
@@ -13,59 +13,34 @@
 """
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from langchain_core.documents import Document
 from pymilvus import DataType, FunctionType, CollectionSchema, FieldSchema, Function
 
 from app.core.exception import BusinessError, ErrorCodes
 from app.module.rag.infra.document.types import DocumentChunk
-from app.module.rag.infra.embeddings import EmbeddingFactory
+from app.module.rag.infra.embeddings import CachedEmbeddings, EmbeddingFactory
 from app.module.rag.infra.vectorstore.milvus_client import get_milvus_client
 
 logger = logging.getLogger(__name__)
 
-BATCH_DELETE_SIZE = 500
+# 单个删除表达式中包含的 rag_file_id 数量上限
+DELETE_FILTER_BATCH_SIZE = 1000
+# 按主键删除时每次请求的 ID 数量上限
+DELETE_IDS_BATCH_SIZE = 10000
 
 
-def _delete_chunks_by_rag_file_id_batched(client, collection_name: str, rag_file_id: str) -> int:
-    """分批删除指定 rag_file_id 的所有 chunks
+def _in_filter(field: str, values: List[str]) -> str:
+    """构造 Milvus 的 in 表达式，值经 JSON 转义"""
+    return f"{field} in {json.dumps(values, ensure_ascii=False)}"
 
-    Args:
-        client: Milvus 客户端
-        collection_name: 集合名称
-        rag_file_id: RAG 文件 ID
-
-    Returns:
-        删除的总数量
-    """
-    filter_expr = f'metadata["rag_file_id"] == "{rag_file_id}"'
-    total_deleted = 0
-
-    while True:
-        try:
-            results = client.query(
-                collection_name=collection_name,
-                filter=filter_expr,
-                output_fields=["id"],
-                limit=BATCH_DELETE_SIZE,
-            )
-            if not results:
-                break
-
-            chunk_ids = [r["id"] for r in results]
-            id_filter = ' || '.join([f'id == "{cid}"' for cid in chunk_ids])
-            client.delete(collection_name=collection_name, filter=f"({id_filter})")
-            total_deleted += len(chunk_ids)
-
-            if len(chunk_ids) < BATCH_DELETE_SIZE:
-                break
-        except Exception as e:
-            logger.warning("分批删除失败: collection=%s rag_file_id=%s error=%s", collection_name, rag_file_id, e)
-            break
 
-    return total_deleted
+def _delete_count(result) -> int:
+    return int(result.get("delete_count", 0)) if isinstance(result, dict) else 0
 
 
 def drop_collection(collection_name: str) -> None:
@@ -227,30 +202,88 @@ def get_vector_dimension(
         raise BusinessError(ErrorCodes.RAG_EMBEDDING_FAILED, f"获取向量维度失败: {str(e)}") from e
 
 
-def delete_chunks_by_rag_file_ids(collection_name: str, rag_file_ids: List[str]) -> None:
+def delete_chunks_by_rag_file_ids(collection_name: str, rag_file_ids: List[str]) -> int:
     """按 RAG 文件 ID 列表删除 Milvus 中的分块
 
+    直接按 metadata 过滤删除，多个文件合并为一个 in 表达式，无需先查询分块 ID。
+
     Args:
         collection_name: 集合名称
         rag_file_ids: RAG 文件 ID 列表
+
+    Returns:
+        删除的分块数量
     """
     if not rag_file_ids:
-        return
+        return 0
 
     try:
         client = get_milvus_client()
+        ids = [str(rid) for rid in dict.fromkeys(rag_file_ids)]
+        deleted = 0
+        for start in range(0, len(ids), DELETE_FILTER_BATCH_SIZE):
+            batch = ids[start:start + DELETE_FILTER_BATCH_SIZE]
+            result = client.delete(
+                collection_name=collection_name,
+                filter=_in_filter('metadata["rag_file_id"]', batch),
+            )
+            deleted += _delete_count(result)
 
-        for rid in rag_file_ids:
-            deleted = _delete_chunks_by_rag_file_id_batched(client, collection_name, rid)
-            logger.info("删除文件分块: collection=%s rag_file_id=%s deleted=%d", collection_name, rid, deleted)
+        logger.info(
+            "已按 rag_file_id 删除集合 %s 中的分块: files=%d deleted=%d", collection_name, len(ids), deleted
+        )
+        return deleted
+
+    except Exception as e:
+        logger.error("删除 Milvus 分块失败: %s", e)
+        raise BusinessError(ErrorCodes.RAG_MILVUS_ERROR, f"删除分块失败: {str(e)}") from e
 
-        logger.info("已按 rag_file_id 删除集合 %s 中的分块: %s", collection_name, rag_file_ids)
+
+def delete_chunks_by_ids(collection_name: str, chunk_ids: List[str]) -> int:
+    """按主键批量删除分块
+
+    Args:
+        collection_name: 集合名称
+        chunk_ids: 分块 ID 列表
+
+    Returns:
+        删除的分块数量
+    """
+    if not chunk_ids:
+        return 0
+
+    try:
+        client = get_milvus_client()
+        deleted = 0
+        for start in range(0, len(chunk_ids), DELETE_IDS_BATCH_SIZE):
+            result = client.delete(
+                collection_name=collection_name,
+                ids=chunk_ids[start:start + DELETE_IDS_BATCH_SIZE],
+            )
+            deleted += _delete_count(result)
+        return deleted
 
     except Exception as e:
         logger.error("删除 Milvus 分块失败: %s", e)
         raise BusinessError(ErrorCodes.RAG_MILVUS_ERROR, f"删除分块失败: {str(e)}") from e
 
 
+async def adelete_chunks_by_rag_file_ids(collection_files: Dict[str, List[str]]) -> Dict[str, int]:
+    """并发删除多个集合（知识库）中指定 RAG 文件的分块，不阻塞事件循环
+
+    Args:
+        collection_files: 集合名称 -> RAG 文件 ID 列表
+
+    Returns:
+        集合名称 -> 删除的分块数量
+    """
+    names = list(collection_files)
+    results = await asyncio.gather(*(
+        asyncio.to_thread(delete_chunks_by_rag_file_ids, name, collection_files[name]) for name in names
+    ))
+    return dict(zip(names, results))
+
+
 def chunks_to_documents(
     chunks: List[DocumentChunk],
     ids: Optional[List[str]] = None,
@@ -323,7 +356,8 @@ def update_chunk_by_id(
             from app.module.rag.infra.embeddings import EmbeddingFactory
             embedding = EmbeddingFactory.create_embeddings()
 
-        vector = embedding.embed_query(text)
+        # 文本未修改（如只修改元数据）时直接使用缓存的向量
+        vector = CachedEmbeddings.wrap(embedding).embed_documents([text])[0]
 
         client.delete(collection_name=collection_name, filter=filter_expr)
 
@@ -5,7 +5,7 @@ RAG 文件仓储层
 使用 SQLAlchemy 异步 session 进行数据库操作
 """
 from typing import List, Optional, Tuple
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import delete, select, func, and_, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.models.knowledge_gen import RagFile, FileStatus
 from app.core.exception import BusinessError, ErrorCodes
@@ -18,6 +18,9 @@ class RagFileRepository:
     提供 RAG 文件的 CRUD 操作和查询功能
     """
 
+    # 单条 IN 查询包含的 ID 数量上限
+    IN_QUERY_BATCH_SIZE = 1000
+
     def __init__(self, db: AsyncSession):
         """初始化仓储
 
@@ -106,11 +109,11 @@ class RagFileRepository:
         if not rag_file_ids:
             return
 
-        await self.db.execute(
-            select(RagFile).where(RagFile.id.in_(rag_file_ids))
-        )
-        # 注意：实际删除需要在查询后进行，这里简化处理
-        # 在实际使用时，应该先查询再删除
+        for start in range(0, len(rag_file_ids), self.IN_QUERY_BATCH_SIZE):
+            await self.db.execute(
+                delete(RagFile).where(RagFile.id.in_(rag_file_ids[start:start + self.IN_QUERY_BATCH_SIZE]))
+            )
+        await self.db.flush()
 
     async def delete_by_knowledge_base(
         self,
@@ -152,6 +155,23 @@ class RagFileRepository:
         )
         return result.scalars().first()
 
+    async def get_by_ids(self, rag_file_ids: List[str]) -> List[RagFile]:
+        """根据 ID 列表批量获取 RAG 文件
+
+        Args:
+            rag_file_ids: RAG 文件 ID 列表
+
+        Returns:
+            存在的 RAG 文件实体列表
+        """
+        rag_files: List[RagFile] = []
+        for start in range(0, len(rag_file_ids), self.IN_QUERY_BATCH_SIZE):
+            result = await self.db.execute(
+                select(RagFile).where(RagFile.id.in_(rag_file_ids[start:start + self.IN_QUERY_BATCH_SIZE]))
+            )
+            rag_files.extend(result.scalars().all())
+        return rag_files
+
     async def get_by_file_id(self, file_id: str) -> Optional[RagFile]:
         """根据原始文件 ID 获取 RAG 文件
 
@@ -106,6 +106,24 @@ class KnowledgeBaseRepository:
         )
         return result.scalars().first()
 
+    async def get_by_ids(self, knowledge_base_ids: List[str]) -> List[KnowledgeBase]:
+        """根据 ID 列表批量获取知识库
+
+        Args:
+            knowledge_base_ids: 知识库ID列表
+
+        Returns:
+            知识库实体列表，按传入 ID 的顺序排列（去重），不存在的 ID 被忽略
+        """
+        ids = list(dict.fromkeys(knowledge_base_ids))
+        if not ids:
+            return []
+        result = await self.db.execute(
+            select(KnowledgeBase).where(KnowledgeBase.id.in_(ids))
+        )
+        by_id = {kb.id: kb for kb in result.scalars().all()}
+        return [by_id[kb_id] for kb_id in ids if kb_id in by_id]
+
     async def get_by_name(self, name: str) -> Optional[KnowledgeBase]:
         """根据名称获取知识库
 
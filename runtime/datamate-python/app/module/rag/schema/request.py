@@ -350,6 +350,10 @@ class ChunkFilterQuery(BaseModel):
         None,
         description="Milvus 过滤表达式（如 id > \"1\" && text like \"%keyword%\"）"
     )
+    cursor: Optional[str] = Field(
+        None,
+        description="游标：上一页最后一个分块的 ID，传入时按 ID 顺序读取下一页并忽略 page"
+    )
 
     class Config:
         json_schema_extra = {
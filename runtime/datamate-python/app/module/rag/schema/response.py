@@ -199,9 +199,17 @@ class PagedResponse(BaseModel):
     page: int = Field(..., description="当前页码")
     size: int = Field(..., description="每页数量")
     total_pages: int = Field(alias="totalPages", description="总页数")
+    next_cursor: Optional[str] = Field(None, alias="nextCursor", description="下一页游标（支持游标分页的接口返回）")
 
     @classmethod
-    def create(cls, content: List[Any], total_elements: int, page: int, size: int):
+    def create(
+        cls,
+        content: List[Any],
+        total_elements: int,
+        page: int,
+        size: int,
+        next_cursor: Optional[str] = None,
+    ):
         """创建分页响应
 
         Args:
@@ -209,6 +217,7 @@ class PagedResponse(BaseModel):
             total_elements: 总记录数
             page: 当前页码
             size: 每页数量
+            next_cursor: 下一页游标，没有下一页时为 None
 
         Returns:
             PagedResponse 实例
@@ -219,7 +228,8 @@ class PagedResponse(BaseModel):
             total_elements=total_elements,
             page=page,
             size=size,
-            total_pages=total_pages
+            total_pages=total_pages,
+            next_cursor=next_cursor,
         )
 
     class Config:
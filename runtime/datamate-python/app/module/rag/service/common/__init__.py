@@ -6,11 +6,17 @@
 from .text_cleaner import TextCleaner
 from .metadata_builder import MetadataBuilder
 from .batch_processor import BatchProcessor
+from .ingestion_pipeline import EmbeddingInsertPipeline
+from .retrieval_cache import RetrievalCache
+from .graph_rag_cache import GraphRagCache
 from .file_utils import get_file_path
 
 __all__ = [
     "TextCleaner",
     "MetadataBuilder",
     "BatchProcessor",
+    "EmbeddingInsertPipeline",
+    "RetrievalCache",
+    "GraphRagCache",
     "get_file_path",
 ]
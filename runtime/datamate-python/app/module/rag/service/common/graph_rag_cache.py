@@ -0,0 +1,88 @@
+"""
+知识图谱实例缓存
+
+按知识库名称缓存 LightRAG 实例（LRU）。实例数超过上限或空闲超过指定时间时淘汰，
+淘汰前调用 finalize_storages 将存储落盘并释放资源；正在写入或查询的实例（hold 期间）不会被淘汰。
+"""
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _CacheEntry:
+    rag: Any
+    last_used: float
+    holders: int = 0
+
+
+class GraphRagCache:
+    """进程内 LightRAG 实例缓存，所有方法均在事件循环线程中调用"""
+
+    def __init__(self, max_size: Optional[int] = None, idle_seconds: Optional[int] = None):
+        self.max_size = max_size if max_size is not None else settings.rag_graph_instance_cache_size
+        self.idle_seconds = idle_seconds if idle_seconds is not None else settings.rag_graph_instance_idle_seconds
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def get(self, name: str) -> Optional[Any]:
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        entry.last_used = time.monotonic()
+        self._entries.move_to_end(name)
+        return entry.rag
+
+    async def put(self, name: str, rag: Any) -> None:
+        self._entries[name] = _CacheEntry(rag, time.monotonic())
+        self._entries.move_to_end(name)
+        # 新实例即将返回给调用方使用，超出上限时不能淘汰它自己
+        with self.hold(name):
+            await self.evict()
+
+    def pop(self, name: str) -> Optional[Any]:
+        """移出缓存但不落盘，用于工作目录已被删除或重命名的知识库"""
+        entry = self._entries.pop(name, None)
+        return entry.rag if entry else None
+
+    @contextmanager
+    def hold(self, name: str) -> Iterator[None]:
+        """持有期间实例不会被淘汰，用于耗时的批量写入与查询"""
+        entry = self._entries.get(name)
+        if entry is not None:
+            entry.holders += 1
+        try:
+            yield
+        finally:
+            if entry is not None:
+                entry.holders -= 1
+                entry.last_used = time.monotonic()
+
+    async def evict(self) -> None:
+        """淘汰空闲超时的实例，以及超出数量上限的最久未使用实例"""
+        now = time.monotonic()
+        overflow = len(self._entries) - self.max_size
+        victims: List[Tuple[str, Any]] = []
+        for name, entry in list(self._entries.items()):
+            if entry.holders:
+                continue
+            if overflow > 0 or now - entry.last_used >= self.idle_seconds:
+                del self._entries[name]
+                victims.append((name, entry.rag))
+                overflow -= 1
+
+        for name, rag in victims:
+            try:
+                await rag.finalize_storages()
+                logger.info("已释放知识图谱实例: %s", name)
+            except Exception as e:
+                logger.warning("释放知识图谱实例失败: %s, error=%s", name, e)
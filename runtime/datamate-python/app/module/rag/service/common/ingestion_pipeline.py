@@ -0,0 +1,197 @@
+"""
+向量化入库流水线
+
+按估算 token 数自适应组批，多个批次并发请求嵌入服务（命中嵌入缓存的分块不再请求），嵌入结果通过有界队列交给写入协程写入 Milvus，
+使嵌入与向量写入重叠执行，并记录各阶段吞吐。
+"""
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from app.core.config import settings
+from app.module.rag.infra.document.types import DocumentChunk
+from app.module.rag.infra.embeddings import CachedEmbeddings
+from app.module.rag.infra.vectorstore import chunks_to_documents
+
+logger = logging.getLogger(__name__)
+
+# 队列结束标记
+_STOP = object()
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本 token 数：ASCII 约 4 个字符一个 token，其他字符（如中文）约一个字符一个 token"""
+    ascii_chars = sum(1 for ch in text if ch.isascii())
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars) or 1
+
+
+@dataclass
+class StageMetrics:
+    """单个阶段的吞吐统计"""
+
+    batches: int = 0
+    items: int = 0
+    seconds: float = 0.0
+
+    def add(self, items: int, seconds: float) -> None:
+        self.batches += 1
+        self.items += items
+        self.seconds += seconds
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class IngestionMetrics:
+    """流水线统计：embed/insert 的 seconds 为各批次耗时之和，wall_seconds 为整体耗时"""
+
+    embed: StageMetrics = field(default_factory=StageMetrics)
+    insert: StageMetrics = field(default_factory=StageMetrics)
+    splits: int = 0
+    wall_seconds: float = 0.0
+
+
+class EmbeddingInsertPipeline:
+    """嵌入 + 向量写入流水线
+
+    Args:
+        vectorstore: 向量存储实例（langchain_milvus.Milvus）
+        embedding: 嵌入模型，为空时使用向量存储自身的嵌入模型
+        max_batch_tokens: 单批次估算 token 上限
+        max_batch_size: 单批次分块数上限
+        embed_concurrency: 同时进行的嵌入请求数
+        insert_queue_size: 等待写入的批次上限，写入跟不上时反压嵌入阶段
+    """
+
+    def __init__(
+        self,
+        vectorstore,
+        embedding=None,
+        max_batch_tokens: Optional[int] = None,
+        max_batch_size: Optional[int] = None,
+        embed_concurrency: Optional[int] = None,
+        insert_queue_size: Optional[int] = None,
+    ):
+        self.vectorstore = vectorstore
+        # 文本未变化的分块直接复用缓存向量，只对新增或修改的分块请求嵌入服务
+        self.embedding = CachedEmbeddings.wrap(embedding or getattr(vectorstore, "embeddings", None))
+        self.max_batch_tokens = max_batch_tokens or settings.rag_embedding_batch_max_tokens
+        self.max_batch_size = max_batch_size or settings.rag_embedding_batch_max_size
+        self.embed_concurrency = embed_concurrency or settings.rag_embedding_concurrency
+        self.insert_queue_size = insert_queue_size or settings.rag_insert_queue_size
+        self.metrics = IngestionMetrics()
+
+    def build_batches(self, chunks: List[DocumentChunk]) -> List[List[DocumentChunk]]:
+        """按估算 token 数与分块数上限贪心组批，单个超长分块独立成批"""
+        batches: List[List[DocumentChunk]] = []
+        current: List[DocumentChunk] = []
+        current_tokens = 0
+        for chunk in chunks:
+            tokens = estimate_tokens(chunk.text)
+            if current and (current_tokens + tokens > self.max_batch_tokens or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(chunk)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    async def run(self, chunks: List[DocumentChunk]) -> int:
+        """嵌入并写入全部分块，返回写入数量"""
+        if not chunks:
+            return 0
+
+        start = time.monotonic()
+        batches = self.build_batches(chunks)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.insert_queue_size)
+        semaphore = asyncio.Semaphore(self.embed_concurrency)
+
+        async def embed_batch(batch: List[DocumentChunk]) -> None:
+            async with semaphore:
+                vectors = await self._embed(batch)
+            await queue.put((batch, vectors))
+
+        inserter = asyncio.create_task(self._insert_worker(queue))
+        embedder = asyncio.ensure_future(asyncio.gather(*(embed_batch(batch) for batch in batches)))
+        try:
+            done, _ = await asyncio.wait({embedder, inserter}, return_when=asyncio.FIRST_COMPLETED)
+            if inserter in done:
+                # 写入协程在收到结束标记前只会因异常结束
+                inserter.result()
+            embedder.result()
+            await queue.put(_STOP)
+            stored = await inserter
+        finally:
+            for task in (embedder, inserter):
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(embedder, inserter, return_exceptions=True)
+
+        self.metrics.wall_seconds = time.monotonic() - start
+        if isinstance(self.embedding, CachedEmbeddings):
+            logger.info(
+                "嵌入缓存: 命中=%d, 未命中=%d", self.embedding.metrics["hits"], self.embedding.metrics["misses"]
+            )
+        logger.info(
+            "向量化入库完成: 分块=%d, 批次=%d, 拆分重试=%d, 耗时=%.2fs, 整体吞吐=%.1f/s, "
+            "单请求嵌入吞吐=%.1f/s, 单请求写入吞吐=%.1f/s",
+            stored,
+            len(batches),
+            self.metrics.splits,
+            self.metrics.wall_seconds,
+            stored / self.metrics.wall_seconds if self.metrics.wall_seconds else 0.0,
+            self.metrics.embed.throughput,
+            self.metrics.insert.throughput,
+        )
+        return stored
+
+    async def _embed(self, batch: List[DocumentChunk]) -> List[List[float]]:
+        """请求一批嵌入；失败且批次可拆分时对半拆分后重试，以适配嵌入服务的单请求上限"""
+        texts = [chunk.text for chunk in batch]
+        start = time.monotonic()
+        try:
+            vectors = await self.embedding.aembed_documents(texts)
+        except Exception as e:
+            if len(batch) == 1:
+                raise
+            self.metrics.splits += 1
+            logger.warning("嵌入批次(%d 个分块)失败，拆分后重试: %s", len(batch), e)
+            middle = len(batch) // 2
+            left, right = await asyncio.gather(self._embed(batch[:middle]), self._embed(batch[middle:]))
+            return left + right
+        self.metrics.embed.add(len(batch), time.monotonic() - start)
+        return vectors
+
+    async def _insert_worker(self, queue: asyncio.Queue) -> int:
+        stored = 0
+        while True:
+            entry = await queue.get()
+            if entry is _STOP:
+                return stored
+            batch, vectors = entry
+            ids = [str(uuid.uuid4()) for _ in batch]
+            documents, doc_ids = chunks_to_documents(batch, ids=ids)
+            start = time.monotonic()
+            try:
+                await self.vectorstore.aadd_embeddings(
+                    texts=[doc.page_content for doc in documents],
+                    embeddings=vectors,
+                    metadatas=[doc.metadata for doc in documents],
+                    ids=doc_ids,
+                )
+            except Exception as e:
+                logger.error(
+                    "批次写入失败(%d 个分块): %s\n第一个文档内容: %.200s",
+                    len(batch),
+                    str(e),
+                    documents[0].page_content if documents else "N/A",
+                )
+                raise
+            self.metrics.insert.add(len(batch), time.monotonic() - start)
+            stored += len(batch)
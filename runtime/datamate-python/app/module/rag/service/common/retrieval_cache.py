@@ -0,0 +1,106 @@
+"""
+检索缓存
+
+- 查询向量缓存：以 (嵌入模型, 查询文本) 为键缓存查询向量，相同问题重复检索时不再请求嵌入服务。
+- 检索结果缓存：以 (知识库 ID 集合, 查询文本, top_k) 为键短时缓存检索结果，知识库文件或分块变更时按知识库失效。
+
+缓存保存在进程内存中，多个服务实例之间不共享失效通知，结果缓存的 TTL 即为跨实例的最大陈旧时间。
+"""
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+ResultKey = Tuple[Tuple[str, ...], str, int]
+
+
+class RetrievalCache:
+    """进程内检索缓存（LRU），所有方法均在事件循环线程中调用"""
+
+    _instance: Optional["RetrievalCache"] = None
+
+    def __init__(
+        self,
+        query_vector_max_entries: Optional[int] = None,
+        result_ttl_seconds: Optional[int] = None,
+        result_max_entries: Optional[int] = None,
+    ):
+        self.query_vector_max_entries = (
+            query_vector_max_entries if query_vector_max_entries is not None
+            else settings.rag_query_embedding_cache_max_entries
+        )
+        self.result_ttl_seconds = (
+            result_ttl_seconds if result_ttl_seconds is not None else settings.rag_retrieval_cache_ttl_seconds
+        )
+        self.result_max_entries = (
+            result_max_entries if result_max_entries is not None else settings.rag_retrieval_cache_max_entries
+        )
+        self._query_vectors: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._results: "OrderedDict[ResultKey, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        # 知识库 ID -> 包含该知识库的结果缓存键，用于按知识库失效
+        self._keys_by_kb: Dict[str, Set[ResultKey]] = {}
+
+    @classmethod
+    def get_instance(cls) -> "RetrievalCache":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    # ==================== 查询向量 ====================
+
+    def get_query_vector(self, model_key: str, query_text: str) -> Optional[List[float]]:
+        vector = self._query_vectors.get((model_key, query_text))
+        if vector is not None:
+            self._query_vectors.move_to_end((model_key, query_text))
+        return vector
+
+    def put_query_vector(self, model_key: str, query_text: str, vector: List[float]) -> None:
+        if self.query_vector_max_entries <= 0:
+            return
+        self._query_vectors[(model_key, query_text)] = vector
+        self._query_vectors.move_to_end((model_key, query_text))
+        while len(self._query_vectors) > self.query_vector_max_entries:
+            self._query_vectors.popitem(last=False)
+
+    # ==================== 检索结果 ====================
+
+    @staticmethod
+    def make_result_key(knowledge_base_ids: Iterable[str], query_text: str, top_k: int) -> ResultKey:
+        return tuple(sorted(set(knowledge_base_ids))), query_text, top_k
+
+    def get_results(self, key: ResultKey) -> Optional[List[Dict[str, Any]]]:
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires_at, results = entry
+        if time.monotonic() >= expires_at:
+            self._discard(key)
+            return None
+        self._results.move_to_end(key)
+        return copy.deepcopy(results)
+
+    def put_results(self, key: ResultKey, results: List[Dict[str, Any]]) -> None:
+        if self.result_ttl_seconds <= 0 or self.result_max_entries <= 0:
+            return
+        self._results[key] = (time.monotonic() + self.result_ttl_seconds, copy.deepcopy(results))
+        self._results.move_to_end(key)
+        for kb_id in key[0]:
+            self._keys_by_kb.setdefault(kb_id, set()).add(key)
+        while len(self._results) > self.result_max_entries:
+            self._discard(next(iter(self._results)))
+
+    def invalidate(self, knowledge_base_id: str) -> None:
+        """知识库内容变更后清除包含该知识库的检索结果"""
+        for key in self._keys_by_kb.pop(str(knowledge_base_id), set()):
+            self._discard(key)
+
+    def _discard(self, key: ResultKey) -> None:
+        self._results.pop(key, None)
+        for kb_id in key[0]:
+            keys = self._keys_by_kb.get(kb_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_kb[kb_id]
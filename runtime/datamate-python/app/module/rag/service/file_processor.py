@@ -8,11 +8,12 @@
 import asyncio
 import logging
 from pathlib import Path
-from typing import List
+from typing import List, Optional, Tuple
 
 from fastapi import BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.db.models.knowledge_gen import KnowledgeBase, RagFile, FileStatus, RagType
 from app.db.session import AsyncSessionLocal
 from app.module.rag.infra.document import ingest_file_to_chunks
@@ -25,6 +26,7 @@ from app.module.rag.service.common import (
     TextCleaner,
     MetadataBuilder,
     BatchProcessor,
+    RetrievalCache,
     get_file_path,
 )
 from app.module.system.service.common_service import get_model_by_id
@@ -116,12 +118,18 @@ class FileProcessor:
         knowledge_base: KnowledgeBase,
     ) -> None:
         from app.module.shared.common.document_loaders import load_documents
+        from app.module.rag.service.strategy.graph_strategy import GraphKnowledgeBaseStrategy
 
         try:
             rag_instance = await self._initialize_graph_rag(db, knowledge_base)
 
-            for rag_file in files:
-                await self._process_single_graph_file(db, rag_file, rag_instance, load_documents)
+            # 多个文件合并为一次 ainsert，由 LightRAG 并行抽取实体
+            batch_size = max(settings.rag_graph_insert_batch_size, 1)
+            with GraphKnowledgeBaseStrategy.hold_instance(str(knowledge_base.name)):
+                for start in range(0, len(files), batch_size):
+                    await self._process_graph_file_batch(
+                        db, files[start:start + batch_size], rag_instance, load_documents
+                    )
 
         except Exception as e:
             logger.exception("初始化知识图谱失败: %s", e)
@@ -135,45 +143,73 @@ class FileProcessor:
         strategy = GraphKnowledgeBaseStrategy(db)
         return await strategy._get_or_create_graph_rag(knowledge_base)
 
-    async def _process_single_graph_file(
+    async def _process_graph_file_batch(
         self,
         db: AsyncSession,
-        rag_file: RagFile,
+        files: List[RagFile],
         rag_instance,
         load_documents,
     ) -> None:
         file_repo = RagFileRepository(db)
 
-        try:
+        for rag_file in files:
             await self._update_status(db, file_repo, str(rag_file.id), FileStatus.PROCESSING, 10)
-            await db.commit()
+        await db.commit()
 
+        async def load(rag_file: RagFile) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+            """返回 (文件路径, 文件内容, 错误信息)"""
             file_path = get_file_path(rag_file)
             if not file_path or not Path(file_path).exists():
-                await self._mark_failed(db, file_repo, str(rag_file.id), "文件不存在")
-                return
-
-            documents = await asyncio.to_thread(load_documents, file_path)
+                return file_path, None, "文件不存在"
+            try:
+                documents = await asyncio.to_thread(load_documents, file_path)
+            except Exception as e:
+                logger.exception("文件 %s 加载失败: %s", str(rag_file.file_name), e)
+                return file_path, None, str(e)
             if not documents:
-                await self._mark_failed(db, file_repo, str(rag_file.id), "文件解析失败，未生成文档")
-                return
+                return file_path, None, "文件解析失败，未生成文档"
+            return file_path, "\n\n".join(doc.page_content for doc in documents), None
 
-            await self._update_progress(db, file_repo, str(rag_file.id), 30)
-            await db.commit()
+        loaded = await asyncio.gather(*(load(rag_file) for rag_file in files))
 
-            all_content = "\n\n".join(doc.page_content for doc in documents)
-            doc_id = str(rag_file.id)
-            logger.info("插入文档到知识图谱: %s, doc_id=%s, 文档数=%d", str(rag_file.file_name), doc_id, len(documents))
-            await rag_instance.ainsert(input=all_content, file_paths=[file_path], ids=doc_id)
+        ready: List[Tuple[RagFile, str, str]] = []
+        for rag_file, (file_path, content, error) in zip(files, loaded):
+            if error:
+                await self._mark_failed(db, file_repo, str(rag_file.id), error)
+            else:
+                ready.append((rag_file, file_path, content))
+        if not ready:
+            return
 
-            doc_status_data = await rag_instance.doc_status.get_by_id(doc_id)
-            chunk_count = len(doc_status_data.get("chunks_list", [])) if doc_status_data else 0
-            await self._mark_success(db, file_repo, str(rag_file.id), chunk_count)
-            logger.info("文件 %s 知识图谱处理完成, 实际分块数: %d", str(rag_file.file_name), chunk_count)
+        for rag_file, _, _ in ready:
+            await self._update_progress(db, file_repo, str(rag_file.id), 30)
+        await db.commit()
 
+        doc_ids = [str(rag_file.id) for rag_file, _, _ in ready]
+        logger.info("批量插入文档到知识图谱: 文件数=%d, doc_ids=%s", len(ready), doc_ids)
+        try:
+            await rag_instance.ainsert(
+                input=[content for _, _, content in ready],
+                ids=doc_ids,
+                file_paths=[file_path for _, file_path, _ in ready],
+            )
         except Exception as e:
-            logger.exception("文件 %s 知识图谱处理失败: %s", str(rag_file.file_name), e)
-            await self._mark_failed(db, file_repo, str(rag_file.id), str(e))
+            logger.exception("知识图谱批量插入失败: %s", e)
+            for rag_file, _, _ in ready:
+                await self._mark_failed(db, file_repo, str(rag_file.id), str(e))
+            return
+
+        # LightRAG 在文档状态中记录单个文档的处理结果，批次中个别文档失败不影响其他文档
+        for rag_file, _, _ in ready:
+            doc_status_data = await rag_instance.doc_status.get_by_id(str(rag_file.id)) or {}
+            if doc_status_data.get("status") == "failed":
+                await self._mark_failed(
+                    db, file_repo, str(rag_file.id), doc_status_data.get("error_msg") or "知识图谱构建失败"
+                )
+                continue
+            chunk_count = len(doc_status_data.get("chunks_list", []))
+            await self._mark_success(db, file_repo, str(rag_file.id), chunk_count)
+            logger.info("文件 %s 知识图谱处理完成, 实际分块数: %d", str(rag_file.file_name), chunk_count)
 
     async def _process_single_file(
         self,
@@ -229,7 +265,8 @@ class FileProcessor:
                 "knowledge_base_id": str(knowledge_base.id),
             })
 
-            await BatchProcessor.store_in_batches(vectorstore, valid_chunks)
+            await BatchProcessor.store_in_batches(vectorstore, valid_chunks, embedding=embedding)
+            RetrievalCache.get_instance().invalidate(str(knowledge_base.id))
 
             await self._mark_success(db, file_repo, rag_file.id, len(valid_chunks))
             logger.info("文件 %s ETL 处理完成", rag_file.file_name)
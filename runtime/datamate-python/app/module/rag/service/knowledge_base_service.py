@@ -20,7 +20,7 @@ from app.module.rag.infra.embeddings import EmbeddingFactory
 from app.module.rag.infra.vectorstore import (
     drop_collection,
     rename_collection,
-    delete_chunks_by_rag_file_ids,
+    adelete_chunks_by_rag_file_ids,
     update_chunk_by_id,
     delete_chunk_by_id,
 )
@@ -34,6 +34,7 @@ from app.module.rag.schema.request import (
     RagFileReq,
 )
 from app.module.rag.schema.response import KnowledgeBaseResp, PagedResponse, RagFileResp, ModelConfig
+from app.module.rag.service.common import RetrievalCache
 from app.module.rag.service.file_processor import FileProcessor
 
 logger = logging.getLogger(__name__)
@@ -121,6 +122,7 @@ class KnowledgeBaseService:
                 raise
 
         await self.db.commit()
+        RetrievalCache.get_instance().invalidate(knowledge_base_id)
 
     async def delete(self, knowledge_base_id: str) -> None:
         """删除知识库
@@ -158,6 +160,7 @@ class KnowledgeBaseService:
                 logger.error("删除知识图谱 workspace 失败: %s", e)
 
         await self.db.commit()
+        RetrievalCache.get_instance().invalidate(knowledge_base_id)
 
     async def get_by_id(self, knowledge_base_id: str) -> KnowledgeBaseResp:
         """获取知识库详情"""
@@ -360,19 +363,12 @@ class KnowledgeBaseService:
         kb_type = knowledge_base.type
         kb_name = str(knowledge_base.name)
 
-        rag_files = []
-        for file_id in request.file_ids:
-            rag_file = await self.file_repo.get_by_id(file_id)
-            if rag_file:
-                rag_files.append(rag_file)
+        rag_files = await self.file_repo.get_by_ids(list(request.file_ids))
 
         if rag_files:
             if kb_type == RagType.DOCUMENT.value:
                 try:
-                    delete_chunks_by_rag_file_ids(
-                        kb_name,
-                        [r.id for r in rag_files],
-                    )
+                    await adelete_chunks_by_rag_file_ids({kb_name: [str(r.id) for r in rag_files]})
                 except Exception as e:
                     logger.error("删除 Milvus 数据失败: %s", e)
             elif kb_type == RagType.GRAPH.value:
@@ -387,13 +383,13 @@ class KnowledgeBaseService:
                 except Exception as e:
                     logger.error("删除知识图谱数据失败: %s", e)
 
-        for file_id in request.file_ids:
-            try:
-                await self.file_repo.delete(file_id)
-            except Exception as e:
-                logger.error("删除数据库记录失败: %s, error=%s", file_id, e)
+        try:
+            await self.file_repo.batch_delete([str(r.id) for r in rag_files])
+        except Exception as e:
+            logger.error("删除数据库记录失败: %s", e)
 
         await self.db.commit()
+        RetrievalCache.get_instance().invalidate(knowledge_base_id)
         logger.info("成功删除 %d 个文件", len(rag_files))
 
     async def update_chunk(
@@ -442,6 +438,7 @@ class KnowledgeBaseService:
             metadata=metadata,
             embedding_instance=embedding,
         )
+        RetrievalCache.get_instance().invalidate(knowledge_base_id)
 
         logger.info(
             "成功更新分块: kb=%s chunk_id=%s",
@@ -475,6 +472,7 @@ class KnowledgeBaseService:
             collection_name=str(knowledge_base.name),
             chunk_id=chunk_id,
         )
+        RetrievalCache.get_instance().invalidate(knowledge_base_id)
 
         if rag_file_id:
             rag_file = await self.file_repo.get_by_id(rag_file_id)
@@ -3,25 +3,27 @@
 
 实现 GRAPH 类型知识库的检索和处理逻辑。
 """
+import asyncio
 import json
 import logging
 import os
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Awaitable, Callable, Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
 
 import numpy as np
 from lightrag import LightRAG
 from lightrag.base import QueryParam
 from lightrag.constants import DEFAULT_ENTITY_TYPES
 from lightrag.llm.openai import openai_complete_if_cache, openai_embed
-from lightrag.utils import EmbeddingFunc, get_env_value, setup_logger
+from lightrag.utils import EmbeddingFunc, compute_mdhash_id, get_env_value, setup_logger
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.core.exception import BusinessError, ErrorCodes
 from app.db.models.knowledge_gen import KnowledgeBase
 from app.module.rag.repository import KnowledgeBaseRepository
-from app.module.rag.service.common import get_file_path
+from app.module.rag.service.common import GraphRagCache, get_file_path
 from app.module.system.service.common_service import get_model_by_id
 from .base import KnowledgeBaseStrategy
 
@@ -61,6 +63,9 @@ async def _create_rag(
         workspace=workspace,
         llm_model_func=llm_func,
         embedding_func=embedding_func,
+        # 实体抽取的并发 LLM 请求数与单次 ainsert 中并行处理的文档数
+        llm_model_max_async=settings.rag_graph_llm_max_async,
+        max_parallel_insert=settings.rag_graph_max_parallel_insert,
         addon_params={
             "language": "Chinese",
             "entity_types": get_env_value("ENTITY_TYPES", DEFAULT_ENTITY_TYPES, list),
@@ -72,7 +77,8 @@ async def _create_rag(
 
 class GraphKnowledgeBaseStrategy(KnowledgeBaseStrategy):
     # 类级别的缓存，允许跨实例共享
-    _rag_cache: Dict[str, Any] = {}
+    _rag_cache = GraphRagCache()
+    _rag_create_lock = asyncio.Lock()
 
     def __init__(self, db: AsyncSession):
         super().__init__(db)
@@ -95,7 +101,8 @@ class GraphKnowledgeBaseStrategy(KnowledgeBaseStrategy):
             raise BusinessError(ErrorCodes.RAG_KNOWLEDGE_BASE_NOT_FOUND)
 
         rag_instance = await self._get_or_create_graph_rag(kb)
-        return await rag_instance.get_knowledge_graph(node_label=node_label)
+        with self.hold_instance(str(kb.name)):
+            return await rag_instance.get_knowledge_graph(node_label=node_label)
 
     async def search(
         self,
@@ -120,7 +127,8 @@ class GraphKnowledgeBaseStrategy(KnowledgeBaseStrategy):
             rag_instance = await self._get_or_create_graph_rag(kb)
             # Use aquery_data for content retrieval (not get_knowledge_graph)
             query_param = QueryParam(mode="mix", top_k=top_k, only_need_context=True)
-            retrieval_results = await rag_instance.aquery_data(query_text, query_param)
+            with self.hold_instance(str(kb.name)):
+                retrieval_results = await rag_instance.aquery_data(query_text, query_param)
 
             unified_results = self._convert_retrieval_results_into_unified(
                 retrieval_results, str(kb.id), str(kb.name)
@@ -286,15 +294,26 @@ class GraphKnowledgeBaseStrategy(KnowledgeBaseStrategy):
 
             rag_instance = await self._get_or_create_graph_rag(kb)
 
-            for idx, chunk in enumerate(chunks):
-                logger.info(
-                    "插入文档到知识图谱: %s, 进度: %d/%d",
-                    rag_file.file_name, idx + 1, len(chunks)
-                )
-                await rag_instance.ainsert(
-                    input=chunk.text,
-                    file_paths=[file_path]
-                )
+            # 文档 ID 由文件 ID 与分块内容生成：重新处理时内容变化的分块会作为新文档写入，
+            # 而不是因 ID 已存在被 LightRAG 跳过；同一文件内重复的分块只写入一次
+            docs = {
+                compute_mdhash_id(chunk.text, prefix=f"{rag_file_id}-"): chunk.text
+                for chunk in chunks
+            }
+            doc_ids = list(docs)
+            batch_size = max(settings.rag_graph_insert_batch_size, 1)
+            with self.hold_instance(str(kb.name)):
+                for start in range(0, len(doc_ids), batch_size):
+                    batch_ids = doc_ids[start:start + batch_size]
+                    logger.info(
+                        "插入文档到知识图谱: %s, 进度: %d/%d",
+                        rag_file.file_name, start + len(batch_ids), len(doc_ids)
+                    )
+                    await rag_instance.ainsert(
+                        input=[docs[doc_id] for doc_id in batch_ids],
+                        ids=batch_ids,
+                        file_paths=[file_path] * len(batch_ids),
+                    )
 
             await file_repo.update_status(rag_file_id, FileStatus.PROCESSED)
             await file_repo.update_chunk_count(rag_file_id, len(chunks))
@@ -319,8 +338,21 @@ class GraphKnowledgeBaseStrategy(KnowledgeBaseStrategy):
 
     async def _get_or_create_graph_rag(self, kb: KnowledgeBase) -> Any:
         kb_name = str(kb.name)
-        if kb_name in self._rag_cache:
-            return self._rag_cache[kb_name]
+        await self._rag_cache.evict()
+        rag = self._rag_cache.get(kb_name)
+        if rag is not None:
+            return rag
+
+        # 同一知识库只创建一个实例，避免多个实例同时读写同一 workspace
+        async with self._rag_create_lock:
+            rag = self._rag_cache.get(kb_name)
+            if rag is None:
+                rag = await self._create_graph_rag(kb)
+                await self._rag_cache.put(kb_name, rag)
+        return rag
+
+    async def _create_graph_rag(self, kb: KnowledgeBase) -> LightRAG:
+        kb_name = str(kb.name)
 
         chat_model = await get_model_by_id(self.db, str(kb.chat_model))
         embedding_model = await get_model_by_id(self.db, str(kb.embedding_model))
@@ -339,16 +371,21 @@ class GraphKnowledgeBaseStrategy(KnowledgeBaseStrategy):
             str(embedding_model.model_name),
             str(embedding_model.base_url),
             str(embedding_model.api_key),
-            LLMFactory.get_embedding_dimension(
+            await LLMFactory.aget_embedding_dimension(
                 str(embedding_model.model_name),
                 str(embedding_model.base_url),
                 str(embedding_model.api_key),
             ),
         )
 
-        rag = await _create_rag(llm_func, embedding_func, DEFAULT_WORKING_DIR, workspace=kb_name)
-        self._rag_cache[kb_name] = rag
-        return rag
+        return await _create_rag(llm_func, embedding_func, DEFAULT_WORKING_DIR, workspace=kb_name)
+
+    @classmethod
+    @contextmanager
+    def hold_instance(cls, name: str) -> Iterator[None]:
+        """批量写入或查询期间保持知识库实例不被缓存淘汰"""
+        with cls._rag_cache.hold(name):
+            yield
 
     @classmethod
     def rename_workspace(cls, old_name: str, new_name: str) -> None:
@@ -361,6 +398,6 @@ class GraphKnowledgeBaseStrategy(KnowledgeBaseStrategy):
 
     @classmethod
     def clear_cache(cls, name: str) -> None:
-        if name in cls._rag_cache:
-            del cls._rag_cache[name]
+        # workspace 已删除或重命名，直接丢弃实例，不再落盘到旧目录
+        if cls._rag_cache.pop(name) is not None:
             logger.info("已清除知识图谱缓存: %s", name)
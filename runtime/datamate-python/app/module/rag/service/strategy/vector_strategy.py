@@ -6,17 +6,24 @@
 import asyncio
 import json
 import logging
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from pymilvus import AnnSearchRequest, Function, FunctionType
 
 from app.core.exception import BusinessError, ErrorCodes
+from app.db.models.knowledge_gen import FileStatus
 from app.module.rag.infra.embeddings import EmbeddingFactory
 from app.module.rag.infra.vectorstore.milvus_client import get_milvus_client
 from app.module.rag.repository import KnowledgeBaseRepository, RagFileRepository
 from app.module.rag.schema.response import PagedResponse, RagChunkResp
 from app.module.rag.schema.request import ChunkFilterQuery
-from app.module.rag.service.common import TextCleaner, MetadataBuilder, BatchProcessor, get_file_path
+from app.module.rag.service.common import (
+    TextCleaner,
+    MetadataBuilder,
+    BatchProcessor,
+    RetrievalCache,
+    get_file_path,
+)
 from app.module.system.service.common_service import get_model_by_id
 from .base import KnowledgeBaseStrategy
 
@@ -29,6 +36,9 @@ class VectorKnowledgeBaseStrategy(KnowledgeBaseStrategy):
     提供 DOCUMENT 类型知识库的 query、 search 和 process_file 功能。
     """
 
+    # (模型名, base_url, api_key) -> 嵌入客户端，检索时复用，避免每次请求重建客户端
+    _embedding_clients: Dict[tuple, Any] = {}
+
     async def query(
         self,
         knowledge_base_id: str,
@@ -70,18 +80,18 @@ class VectorKnowledgeBaseStrategy(KnowledgeBaseStrategy):
         try:
             base_filter = f'metadata["rag_file_id"] == "{rag_file_id}"'
             combined_filter = self._build_combined_filter(base_filter, chunk_filter_query.expr)
+            total = self._count_chunks(client, knowledge_base.name, rag_file, combined_filter, chunk_filter_query.expr)
 
-            count_res = client.query(
-                collection_name=knowledge_base.name,
-                filter=combined_filter,
-                output_fields=["id"],
-            )
-            total = len(count_res)
-
-            offset = (chunk_filter_query.page - 1) * chunk_filter_query.size
+            if chunk_filter_query.cursor:
+                # 带 limit 的 Milvus 查询按主键有序返回，游标分页只读取一页数据，与页码深度无关
+                page_filter = f"({combined_filter}) && id > {json.dumps(chunk_filter_query.cursor)}"
+                offset = 0
+            else:
+                page_filter = combined_filter
+                offset = (chunk_filter_query.page - 1) * chunk_filter_query.size
             results = client.query(
                 collection_name=knowledge_base.name,
-                filter=combined_filter,
+                filter=page_filter,
                 output_fields=["id", "text", "metadata"],
                 limit=chunk_filter_query.size,
                 offset=offset,
@@ -108,6 +118,7 @@ class VectorKnowledgeBaseStrategy(KnowledgeBaseStrategy):
                 total_elements=total,
                 page=chunk_filter_query.page,
                 size=chunk_filter_query.size,
+                next_cursor=chunks[-1].id if len(chunks) == chunk_filter_query.size else None,
             )
 
         except Exception as e:
@@ -120,6 +131,18 @@ class VectorKnowledgeBaseStrategy(KnowledgeBaseStrategy):
                 f"查询文件分块失败: {str(e)}"
             ) from e
 
+    @staticmethod
+    def _count_chunks(client, collection_name: str, rag_file, combined_filter: str, user_expr: Optional[str]) -> int:
+        """统计分块总数：无过滤条件且文件已处理完成时直接使用记录的分块数，否则由 Milvus count(*) 计算"""
+        if not user_expr and rag_file.status == FileStatus.PROCESSED and rag_file.chunk_count is not None:
+            return rag_file.chunk_count
+        count_res = client.query(
+            collection_name=collection_name,
+            filter=combined_filter,
+            output_fields=["count(*)"],
+        )
+        return count_res[0]["count(*)"] if count_res else 0
+
     @staticmethod
     def _build_combined_filter(base_filter: str, user_expr: Optional[str]) -> str:
         if not user_expr:
@@ -146,24 +169,62 @@ class VectorKnowledgeBaseStrategy(KnowledgeBaseStrategy):
         Returns:
             统一格式的检索结果列表
         """
-        kb_repo = KnowledgeBaseRepository(self.db)
+        cache = RetrievalCache.get_instance()
+        cache_key = cache.make_result_key(knowledge_base_ids, query_text, top_k)
+        formatted = cache.get_results(cache_key)
 
-        knowledge_bases = []
-        for kb_id in knowledge_base_ids:
-            kb = await kb_repo.get_by_id(kb_id)
-            if not kb:
+        if formatted is None:
+            knowledge_bases = await KnowledgeBaseRepository(self.db).get_by_ids(knowledge_base_ids)
+            if len(knowledge_bases) != len(set(knowledge_base_ids)):
                 raise BusinessError(ErrorCodes.RAG_KNOWLEDGE_BASE_NOT_FOUND)
-            knowledge_bases.append(kb)
 
-        embedding_entity = await get_model_by_id(self.db, knowledge_bases[0].embedding_model)
+            query_vector = await self._embed_query(knowledge_bases[0].embedding_model, query_text)
+            all_results, complete = await self._execute_hybrid_search(
+                knowledge_bases, query_vector, query_text, top_k
+            )
+
+            all_results.sort(
+                key=lambda x: x.get("score") or x.get("distance", 0),
+                reverse=True
+            )
+            formatted = self._format_unified_results(all_results)
+            # 缓存阈值过滤前的结果，不同阈值的请求共用同一缓存；部分知识库检索失败时不缓存
+            if complete:
+                cache.put_results(cache_key, formatted)
+        else:
+            logger.debug("命中检索结果缓存: kbs=%s", cache_key[0])
+
+        if threshold is not None:
+            formatted = [r for r in formatted if r["score"] >= 0]
+
+        logger.info("向量检索完成: 结果数=%d", len(formatted))
+        return formatted
+
+    async def _embed_query(self, embedding_model_id: str, query_text: str) -> List[float]:
+        """查询文本向量化，复用嵌入客户端并缓存查询向量"""
+        embedding_entity = await get_model_by_id(self.db, embedding_model_id)
         if not embedding_entity:
             raise BusinessError(ErrorCodes.RAG_MODEL_NOT_FOUND)
 
-        embedding = EmbeddingFactory.create_embeddings(
-            model_name=embedding_entity.model_name,
-            base_url=getattr(embedding_entity, "base_url", None),
-            api_key=getattr(embedding_entity, "api_key", None),
-        )
+        model_name = embedding_entity.model_name
+        base_url = getattr(embedding_entity, "base_url", None)
+        api_key = getattr(embedding_entity, "api_key", None)
+
+        cache = RetrievalCache.get_instance()
+        model_key = f"{model_name}:{base_url or ''}"
+        query_vector = cache.get_query_vector(model_key, query_text)
+        if query_vector is not None:
+            return query_vector
+
+        client_key = (model_name, base_url, api_key)
+        embedding = self._embedding_clients.get(client_key)
+        if embedding is None:
+            embedding = EmbeddingFactory.create_embeddings(
+                model_name=model_name,
+                base_url=base_url,
+                api_key=api_key,
+            )
+            self._embedding_clients[client_key] = embedding
 
         try:
             query_vector = await asyncio.to_thread(embedding.embed_query, query_text)
@@ -174,85 +235,88 @@ class VectorKnowledgeBaseStrategy(KnowledgeBaseStrategy):
                 f"查询向量化失败: {str(e)}"
             ) from e
 
-        all_results = await self._execute_hybrid_search(
-            knowledge_bases, query_vector, query_text, top_k
-        )
+        cache.put_query_vector(model_key, query_text, query_vector)
+        return query_vector
 
-        all_results.sort(
-            key=lambda x: x.get("score") or x.get("distance", 0),
-            reverse=True
-        )
-
-        if threshold is not None:
-            all_results = [
-                r for r in all_results
-                if (r.get("score") or r.get("distance", 0)) >= 0
-            ]
-
-        formatted = self._format_unified_results(all_results)
-        logger.info("向量检索完成: 结果数=%d", len(formatted))
-        return formatted
-
-    @staticmethod
+    @classmethod
     async def _execute_hybrid_search(
+        cls,
         knowledge_bases: list,
         query_vector: list,
         query_text: str,
         top_k: int,
-    ) -> List[Dict[str, Any]]:
-        """执行混合检索"""
-        all_results = []
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """执行混合检索，各知识库并行查询，结果按知识库顺序合并
+
+        Returns:
+            (检索结果, 是否所有知识库都检索成功)
+        """
         client = get_milvus_client()
+        per_kb_results = await asyncio.gather(*(
+            asyncio.to_thread(cls._hybrid_search_collection, client, kb, query_vector, query_text, top_k)
+            for kb in knowledge_bases
+        ))
+        complete = all(results is not None for results in per_kb_results)
+        return [result for results in per_kb_results if results for result in results], complete
 
-        for kb in knowledge_bases:
-            try:
-                if not client.has_collection(kb.name):
-                    logger.warning("集合 %s 不存在，跳过", kb.name)
-                    continue
-
-                dense_search = AnnSearchRequest(
-                    data=[query_vector],
-                    anns_field="vector",
-                    param={"nprobe": 10},
-                    limit=top_k,
-                )
+    @staticmethod
+    def _hybrid_search_collection(
+        client,
+        kb,
+        query_vector: list,
+        query_text: str,
+        top_k: int,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """在单个知识库集合上执行混合检索，失败时记录日志并返回 None"""
+        results = []
+        try:
+            if not client.has_collection(kb.name):
+                logger.warning("集合 %s 不存在，跳过", kb.name)
+                return results
+
+            dense_search = AnnSearchRequest(
+                data=[query_vector],
+                anns_field="vector",
+                param={"nprobe": 10},
+                limit=top_k,
+            )
 
-                sparse_search = AnnSearchRequest(
-                    data=[query_text],
-                    anns_field="sparse",
-                    param={"drop_ratio_search": 0.2},
-                    limit=top_k,
-                )
+            sparse_search = AnnSearchRequest(
+                data=[query_text],
+                anns_field="sparse",
+                param={"drop_ratio_search": 0.2},
+                limit=top_k,
+            )
 
-                ranker = Function(
-                    name="weight",
-                    input_field_names=[],
-                    function_type=FunctionType.RERANK,
-                    params={
-                        "reranker": "weighted",
-                        "weights": [0.1, 0.9],
-                        "norm_score": True,
-                    }
-                )
-                search_results = client.hybrid_search(
-                    collection_name=kb.name,
-                    reqs=[dense_search, sparse_search],
-                    ranker=ranker,
-                    output_fields=["id", "text", "metadata"],
-                    limit=top_k,
-                )
+            ranker = Function(
+                name="weight",
+                input_field_names=[],
+                function_type=FunctionType.RERANK,
+                params={
+                    "reranker": "weighted",
+                    "weights": [0.1, 0.9],
+                    "norm_score": True,
+                }
+            )
+            search_results = client.hybrid_search(
+                collection_name=kb.name,
+                reqs=[dense_search, sparse_search],
+                ranker=ranker,
+                output_fields=["id", "text", "metadata"],
+                limit=top_k,
+            )
 
-                if search_results and len(search_results) > 0:
-                    for result in search_results[0]:
-                        result["knowledge_base_id"] = kb.id
-                        result["knowledge_base_name"] = kb.name
-                        all_results.append(result)
+            if search_results and len(search_results) > 0:
+                for result in search_results[0]:
+                    result["knowledge_base_id"] = kb.id
+                    result["knowledge_base_name"] = kb.name
+                    results.append(result)
 
-            except Exception as e:
-                logger.error("知识库 %s 混合检索失败: %s", kb.name, e)
-                continue
+        except Exception as e:
+            logger.error("知识库 %s 混合检索失败: %s", kb.name, e)
+            return None
 
-        return all_results
+        return results
 
     @staticmethod
     def _format_unified_results(
@@ -364,7 +428,8 @@ class VectorKnowledgeBaseStrategy(KnowledgeBaseStrategy):
             base_metadata = MetadataBuilder.build_chunk_metadata(rag_file, kb)
             MetadataBuilder.add_to_chunks(valid_chunks, base_metadata)
             
-            await BatchProcessor.store_in_batches(vectorstore, valid_chunks)
+            await BatchProcessor.store_in_batches(vectorstore, valid_chunks, embedding=embedding)
+            RetrievalCache.get_instance().invalidate(knowledge_base_id)
             
             await file_repo.update_status(rag_file_id, FileStatus.PROCESSED)
             await file_repo.update_chunk_count(rag_file_id, len(valid_chunks))
@@ -6,7 +6,8 @@ import os
 import shutil
 import asyncio
 
-from sqlalchemy import select
+from sqlalchemy import select, func, cast, literal, or_, and_
+from sqlalchemy.dialects.postgresql import JSONB, JSONPATH
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.logging import get_logger
@@ -23,6 +24,9 @@ from app.module.shared.util.resource_utils import get_concurrent_for_ratio_copy,
 
 logger = get_logger(__name__)
 
+# 按 ID 批量加载选中文件时单条 IN 查询的 ID 数量
+FILE_LOAD_BATCH_SIZE = 1000
+
 
 class RatioTaskService:
     """Service for Ratio Task DB operations."""
@@ -157,13 +161,10 @@ class RatioTaskService:
             if not rel.source_dataset_id or not rel.counts or rel.counts <= 0:
                 continue
 
-            files = await RatioTaskService.get_files(rel, session)
-            if not files:
+            chosen = await RatioTaskService.get_files(rel, session, limit=rel.counts)
+            if not chosen:
                 continue
 
-            pick_n = min(rel.counts or 0, len(files))
-            chosen = random.sample(files, pick_n) if pick_n < len(files) else files
-
             for file in chosen:
                 if file.file_path in source_paths:
                     continue
@@ -264,14 +265,11 @@ class RatioTaskService:
             if not rel.source_dataset_id or not rel.counts or rel.counts <= 0:
                 continue
 
-            files = await RatioTaskService.get_files(rel, session)
+            chosen = await RatioTaskService.get_files(rel, session, limit=rel.counts)
 
-            if not files:
+            if not chosen:
                 continue
 
-            pick_n = min(rel.counts or 0, len(files))
-            chosen = random.sample(files, pick_n) if pick_n < len(files) else files
-
             # Copy into target dataset with de-dup by target path
             for file in chosen:
                 if file.file_path in source_paths:
@@ -332,22 +330,111 @@ class RatioTaskService:
         return file_name
 
     @staticmethod
-    async def get_files(rel: RatioRelation, session) -> list[Any]:
-        # Fetch all files for the source dataset (ACTIVE only)
-        files_res = await session.execute(
-            select(DatasetFiles).where(
-                DatasetFiles.dataset_id == rel.source_dataset_id,
-                DatasetFiles.status == "ACTIVE",
-            )
-        )
-        files = list(files_res.scalars().all())
+    async def get_files(rel: RatioRelation, session, limit: Optional[int] = None) -> list[Any]:
+        """获取源数据集中满足过滤条件的 ACTIVE 文件
+
+        过滤与随机抽样在数据库侧完成，只返回被选中的 ID，再按批加载对应的文件记录。
 
-        # TAG mode: filter by tags according to relation.filter_conditions
+        Args:
+            rel: 配比关系
+            session: 数据库会话
+            limit: 随机抽取的文件数，为空时返回全部满足条件的文件
+        """
         conditions = RatioTaskService._parse_conditions(rel.filter_conditions)
-        if conditions:
-            files = [f for f in files if RatioTaskService._filter_file(f, conditions)]
+        file_ids = await RatioTaskService._select_file_ids(rel.source_dataset_id, conditions, session, limit)
+
+        files = []
+        for start in range(0, len(file_ids), FILE_LOAD_BATCH_SIZE):
+            files_res = await session.execute(
+                select(DatasetFiles).where(DatasetFiles.id.in_(file_ids[start:start + FILE_LOAD_BATCH_SIZE]))
+            )
+            files.extend(files_res.scalars().all())
         return files
 
+    @staticmethod
+    async def _select_file_ids(
+        dataset_id: str,
+        conditions: Optional[FilterCondition],
+        session,
+        limit: Optional[int] = None,
+    ) -> list[str]:
+        """筛选并随机抽取文件 ID
+
+        PostgreSQL 上以 ORDER BY random() 在数据库侧抽样；有标签条件时先用 jsonpath（@?，可使用 tags 的
+        GIN 索引）粗筛，再按 _filter_file 的标签语义逐行精确校验，取满 n 个即停止读取。
+        其他数据库只查询 ID 与标签列，在内存中过滤和抽样。
+        """
+        if limit is not None and limit <= 0:
+            return []
+
+        criteria = [DatasetFiles.dataset_id == dataset_id, DatasetFiles.status == "ACTIVE"]
+        if conditions and conditions.date_range and len(conditions.date_range) == 2:
+            try:
+                start_at = datetime.fromisoformat(conditions.date_range[0])
+                end_at = datetime.fromisoformat(conditions.date_range[1])
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Invalid data_range value: {conditions.date_range}: {e}")
+                return []
+            # 未打标签时间的文件不受时间范围限制
+            criteria.append(or_(
+                DatasetFiles.tags_updated_at.is_(None),
+                and_(DatasetFiles.tags_updated_at >= start_at, DatasetFiles.tags_updated_at <= end_at),
+            ))
+        label_filter = conditions.label if conditions and conditions.label else None
+
+        is_postgresql = session.bind.dialect.name == "postgresql"
+        if is_postgresql and not label_filter:
+            stmt = select(DatasetFiles.id).where(*criteria)
+            if limit is not None:
+                stmt = stmt.order_by(func.random()).limit(limit)
+            return list((await session.execute(stmt)).scalars().all())
+
+        if label_filter:
+            stmt = select(DatasetFiles.id, DatasetFiles.tags, DatasetFiles.tags_updated_at).where(*criteria)
+            sampled_in_db = is_postgresql and limit is not None
+            if is_postgresql:
+                # jsonpath 不区分 values 下的键，也会匹配没有标签值的 from_name，只作粗筛
+                stmt = stmt.where(
+                    cast(DatasetFiles.tags, JSONB).op("@?")(
+                        cast(literal(RatioTaskService._build_label_jsonpath(label_filter)), JSONPATH)
+                    )
+                )
+                if sampled_in_db:
+                    stmt = stmt.order_by(func.random())
+            file_ids = []
+            result = await session.stream(stmt.execution_options(yield_per=1000))
+            try:
+                async for row in result:
+                    if not RatioTaskService._filter_file(row, conditions):
+                        continue
+                    file_ids.append(row.id)
+                    if sampled_in_db and len(file_ids) >= limit:
+                        break
+            finally:
+                await result.close()
+            if sampled_in_db:
+                return file_ids
+        else:
+            file_ids = list((await session.execute(select(DatasetFiles.id).where(*criteria))).scalars().all())
+        if limit is not None and limit < len(file_ids):
+            file_ids = random.sample(file_ids, limit)
+        return file_ids
+
+    @staticmethod
+    def _build_label_jsonpath(label_filter) -> str:
+        """构造粗筛标签的 jsonpath：tags 中存在 from_name 等于标签名、且 values 任一键下包含标签值的条目
+
+        结果是 _filter_file 匹配结果的超集（不检查 values 的键是否与 type 一致），命中的行仍需逐行精确校验。
+        """
+        predicates = []
+        if label_filter.label:
+            predicates.append(f"@.from_name == {json.dumps(label_filter.label)}")
+        if label_filter.value:
+            predicates.append(f"@.values.* == {json.dumps(label_filter.value)}")
+        if not predicates:
+            return "$[*]"
+        return f"$[*] ? ({' && '.join(predicates)})"
+
     # ------------------------- helpers for TAG filtering ------------------------- #
 
     @staticmethod
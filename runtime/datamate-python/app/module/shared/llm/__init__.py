@@ -3,5 +3,6 @@
 LangChain 模型工厂：统一创建 Chat、Embedding 及健康检查，便于各模块复用。
 """
 from .factory import LLMFactory
+from .response_cache import LLMResponseCache
 
-__all__ = ["LLMFactory"]
+__all__ = ["LLMFactory", "LLMResponseCache"]
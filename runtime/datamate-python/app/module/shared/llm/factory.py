@@ -1,9 +1,17 @@
 # app/core/llm/factory.py
 """
-LangChain 模型工厂：基于 OpenAI 兼容接口封装 Chat / Embedding 的创建、健康检查与同步调用。
+LangChain 模型工厂：基于 OpenAI 兼容接口封装 Chat / Embedding 的创建、健康检查与同步/异步调用。
 便于模型配置、RAG、生成、评估等模块统一使用，避免分散的 get_chat_client / get_openai_client。
+
+- 同一 (模型, base_url, api_key) 复用同一个 Chat / Embedding 实例
+- 同一事件循环内同一 base_url 复用同一个带连接池与 keep-alive 的 httpx.AsyncClient，异步调用不占用线程池
+- 对话调用经过 LLM 响应缓存，相同模型、采样参数与提示词直接返回缓存结果
 """
-from typing import Literal
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Literal
 
 import httpx
 from langchain_core.language_models import BaseChatModel
@@ -11,11 +19,72 @@ from langchain_core.embeddings import Embeddings
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from pydantic import SecretStr
 
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.module.shared.llm.response_cache import LLMResponseCache
+
+logger = get_logger(__name__)
+
+# 当前协程所属的缓存统计作用域（如任务ID），由 LLMFactory.cache_scope 设置
+_cache_scope: ContextVar[str | None] = ContextVar("llm_cache_scope", default=None)
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.llm_http_max_connections,
+        max_keepalive_connections=settings.llm_http_max_keepalive_connections,
+    )
+
 
 class LLMFactory:
     """基于 LangChain 的 Chat / Embedding 工厂，面向 OpenAI 兼容 API。"""
 
-    custom_http_client = httpx.Client(verify=False)
+    custom_http_client = httpx.Client(verify=False, limits=_http_limits())
+
+    # (事件循环, base_url) -> AsyncClient，AsyncClient 只能在创建它的事件循环中使用
+    _async_clients: dict[tuple[asyncio.AbstractEventLoop, str], httpx.AsyncClient] = {}
+    # (类型, 模型, base_url, api_key) -> (AsyncClient, 模型实例)
+    _model_cache: dict[tuple, tuple[httpx.AsyncClient | None, object]] = {}
+    _embedding_dimensions: dict[tuple, int] = {}
+    _response_cache: LLMResponseCache | None = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_async_http_client(base_url: str | None) -> httpx.AsyncClient | None:
+        """获取当前事件循环下 base_url 对应的共享 AsyncClient，无运行中的事件循环时返回 None。"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        key = (loop, base_url or "")
+        with LLMFactory._lock:
+            # 各事件循环持有各自的客户端，不会相互替换；已关闭事件循环上的客户端无法再使用，直接移除
+            for stale in [k for k in LLMFactory._async_clients if k[0].is_closed()]:
+                del LLMFactory._async_clients[stale]
+            client = LLMFactory._async_clients.get(key)
+            if client is not None and not client.is_closed:
+                return client
+            client = httpx.AsyncClient(
+                verify=False,
+                limits=_http_limits(),
+                timeout=httpx.Timeout(settings.llm_http_timeout_seconds),
+            )
+            LLMFactory._async_clients[key] = client
+            return client
+
+    @staticmethod
+    def _get_or_create(kind: str, model_name: str, base_url: str, api_key: str | None, builder):
+        key = (kind, model_name, base_url or "", api_key or "")
+        async_client = LLMFactory.get_async_http_client(base_url)
+        with LLMFactory._lock:
+            cached = LLMFactory._model_cache.get(key)
+            # 没有事件循环时创建的实例可在任意场景复用；事件循环变化后需绑定新的 AsyncClient 重新创建
+            if cached and (async_client is None or cached[0] is async_client):
+                return cached[1]
+        model = builder(async_client)
+        with LLMFactory._lock:
+            LLMFactory._model_cache[key] = (async_client, model)
+        return model
 
     @staticmethod
     def create_chat(
@@ -23,12 +92,16 @@ class LLMFactory:
         base_url: str,
         api_key: str | None = None,
     ) -> BaseChatModel:
-        """创建对话模型，兼容 OpenAI 及任意 base_url 的 OpenAI 兼容服务。"""
-        return ChatOpenAI(
-            model=model_name,
-            base_url=base_url or None,
-            api_key=SecretStr(api_key or ""),
-            http_client=LLMFactory.custom_http_client,
+        """创建（或复用）对话模型，兼容 OpenAI 及任意 base_url 的 OpenAI 兼容服务。"""
+        return LLMFactory._get_or_create(
+            "chat", model_name, base_url, api_key,
+            lambda async_client: ChatOpenAI(
+                model=model_name,
+                base_url=base_url or None,
+                api_key=SecretStr(api_key or ""),
+                http_client=LLMFactory.custom_http_client,
+                http_async_client=async_client,
+            ),
         )
 
     @staticmethod
@@ -37,11 +110,16 @@ class LLMFactory:
         base_url: str,
         api_key: str | None = None,
     ) -> Embeddings:
-        """创建嵌入模型，兼容 OpenAI 及任意 base_url 的 OpenAI 兼容服务。"""
-        return OpenAIEmbeddings(
-            model=model_name,
-            base_url=base_url or None,
-            api_key=SecretStr(api_key or ""),
+        """创建（或复用）嵌入模型，兼容 OpenAI 及任意 base_url 的 OpenAI 兼容服务。"""
+        return LLMFactory._get_or_create(
+            "embedding", model_name, base_url, api_key,
+            lambda async_client: OpenAIEmbeddings(
+                model=model_name,
+                base_url=base_url or None,
+                api_key=SecretStr(api_key or ""),
+                http_client=LLMFactory.custom_http_client,
+                http_async_client=async_client,
+            ),
         )
 
     @staticmethod
@@ -59,17 +137,154 @@ class LLMFactory:
             model = LLMFactory.create_embedding(model_name, base_url, api_key)
             model.embed_query("text")
 
+    @staticmethod
+    async def acheck_health(
+        model_name: str,
+        base_url: str,
+        api_key: str | None,
+        model_type: Literal["CHAT", "EMBEDDING"] | str,
+    ) -> None:
+        """check_health 的异步版本，不阻塞事件循环。"""
+        if model_type == "CHAT":
+            model = LLMFactory.create_chat(model_name, base_url, api_key)
+            await model.ainvoke("hello")
+        else:
+            model = LLMFactory.create_embedding(model_name, base_url, api_key)
+            await model.aembed_query("text")
+
     @staticmethod
     def get_embedding_dimension(
         model_name: str,
         base_url: str,
         api_key: str | None = None,
     ) -> int:
-        """创建 Embedding 模型并返回向量维度。"""
-        emb = LLMFactory.create_embedding(model_name, base_url, api_key)
-        return len(emb.embed_query("text"))
+        """创建 Embedding 模型并返回向量维度，结果按模型配置缓存。"""
+        key = (model_name, base_url or "", api_key or "")
+        if key not in LLMFactory._embedding_dimensions:
+            emb = LLMFactory.create_embedding(model_name, base_url, api_key)
+            LLMFactory._embedding_dimensions[key] = len(emb.embed_query("text"))
+        return LLMFactory._embedding_dimensions[key]
+
+    @staticmethod
+    async def aget_embedding_dimension(
+        model_name: str,
+        base_url: str,
+        api_key: str | None = None,
+    ) -> int:
+        """get_embedding_dimension 的异步版本。"""
+        key = (model_name, base_url or "", api_key or "")
+        if key not in LLMFactory._embedding_dimensions:
+            emb = LLMFactory.create_embedding(model_name, base_url, api_key)
+            LLMFactory._embedding_dimensions[key] = len(await emb.aembed_query("text"))
+        return LLMFactory._embedding_dimensions[key]
 
     @staticmethod
     def invoke_sync(chat_model: BaseChatModel, prompt: str) -> str:
         """同步调用对话模型并返回 content，供 run_in_executor 等场景使用。"""
         return chat_model.invoke(prompt).content
+
+    @staticmethod
+    def get_response_cache() -> LLMResponseCache:
+        """获取进程内共享的 LLM 响应缓存"""
+        if LLMFactory._response_cache is None:
+            with LLMFactory._lock:
+                if LLMFactory._response_cache is None:
+                    LLMFactory._response_cache = LLMResponseCache()
+        return LLMFactory._response_cache
+
+    @staticmethod
+    @contextmanager
+    def cache_scope(scope: str) -> Iterator[None]:
+        """在该作用域内（包括其中创建的协程）的 LLM 调用按 scope 统计缓存命中率，退出时记录日志。"""
+        token = _cache_scope.set(scope)
+        try:
+            yield
+        finally:
+            _cache_scope.reset(token)
+            metrics = LLMFactory.get_response_cache().pop_metrics(scope)
+            if metrics["hits"] or metrics["misses"]:
+                logger.info(
+                    f"LLM response cache for {scope}: hits={metrics['hits']}, misses={metrics['misses']}, "
+                    f"hit_rate={metrics['hit_rate']:.2%}"
+                )
+
+    @staticmethod
+    def _cache_params(chat_model: BaseChatModel) -> dict[str, Any] | None:
+        """构成缓存键的模型标识与采样参数，无法识别模型时返回 None（不缓存）"""
+        model_name = getattr(chat_model, "model_name", None)
+        if not model_name:
+            return None
+        params = dict(getattr(chat_model, "_identifying_params", None) or {})
+        params.update({
+            "class": type(chat_model).__name__,
+            "model_name": model_name,
+            "base_url": getattr(chat_model, "openai_api_base", None),
+        })
+        return params
+
+    @staticmethod
+    async def ainvoke(chat_model: BaseChatModel, prompt: str, use_cache: bool = True) -> str:
+        """异步调用对话模型并返回 content，请求走共享的 AsyncClient，不占用线程池。
+
+        Args:
+            chat_model: 对话模型
+            prompt: 提示词
+            use_cache: 为 False 时跳过缓存读取直接调用模型，并用新结果覆盖缓存（如结果无法解析后的重试）
+        """
+        cache = LLMFactory.get_response_cache()
+        params = LLMFactory._cache_params(chat_model) if cache.enabled else None
+        if params is None:
+            return (await chat_model.ainvoke(prompt)).content
+
+        key = cache.make_key(params, prompt)
+        scope = _cache_scope.get()
+        if use_cache:
+            cached = await cache.aget(key)
+            if cached is not None:
+                cache.record(scope, hit=True)
+                return cached
+        cache.record(scope, hit=False)
+        content = (await chat_model.ainvoke(prompt)).content
+        if isinstance(content, str) and content:
+            await cache.aset(key, content)
+        return content
+
+    @staticmethod
+    async def aembed_documents(
+        embedding: Embeddings,
+        texts: list[str],
+        batch_size: int | None = None,
+        concurrency: int | None = None,
+    ) -> list[list[float]]:
+        """按批并发请求嵌入向量，返回顺序与 texts 一致。
+
+        Args:
+            embedding: 嵌入模型
+            texts: 文本列表
+            batch_size: 每个请求包含的文本数
+            concurrency: 同时发出的请求数
+        """
+        if not texts:
+            return []
+        batch_size = batch_size or settings.llm_embedding_batch_size
+        semaphore = asyncio.Semaphore(concurrency or settings.llm_embedding_concurrency)
+
+        async def embed_batch(batch: list[str]) -> list[list[float]]:
+            async with semaphore:
+                return await embedding.aembed_documents(batch)
+
+        results = await asyncio.gather(
+            *(embed_batch(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size))
+        )
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    @staticmethod
+    async def aclose() -> None:
+        """关闭共享的 AsyncClient，应用退出时调用。"""
+        with LLMFactory._lock:
+            clients = list(LLMFactory._async_clients.items())
+            LLMFactory._async_clients.clear()
+            LLMFactory._model_cache.clear()
+        for (loop, _), client in clients:
+            if loop is asyncio.get_running_loop() and not client.is_closed:
+                await client.aclose()
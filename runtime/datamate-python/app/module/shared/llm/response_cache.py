@@ -0,0 +1,143 @@
+"""
+LLM 响应缓存：以 (模型, 采样参数, 提示词) 的内容哈希为键，将模型返回缓存在本地 SQLite 中。
+
+任务重试、重跑或多个任务包含相同文档时，相同提示词直接命中缓存，不再重复调用模型。
+缓存条目超过 TTL 后失效，条目数超过上限时按最近访问时间淘汰。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Any
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class LLMResponseCache:
+    """基于 SQLite 的 LLM 响应缓存，按作用域（如任务ID）统计命中率。"""
+
+    def __init__(
+        self,
+        path: str | None = None,
+        ttl_seconds: int | None = None,
+        max_entries: int | None = None,
+    ):
+        self.path = path or settings.llm_response_cache_path
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.llm_response_cache_ttl_seconds
+        self.max_entries = max_entries if max_entries is not None else settings.llm_response_cache_max_entries
+        self.enabled = settings.llm_response_cache_enabled and self.max_entries > 0
+        self.metrics: dict[str, dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._writes = 0
+
+    @staticmethod
+    def make_key(model_params: dict[str, Any], prompt: str) -> str:
+        raw = json.dumps({"model": model_params, "prompt": prompt}, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection | None:
+        if self._conn is not None or not self.enabled:
+            return self._conn
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_response_cache ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_response_cache_accessed ON llm_response_cache(accessed_at)"
+            )
+            conn.commit()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"LLM response cache disabled, failed to open {self.path}: {e}")
+            self.enabled = False
+            return None
+        self._conn = conn
+        return conn
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute(
+                    "SELECT response, created_at FROM llm_response_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                if self.ttl_seconds > 0 and now - row[1] > self.ttl_seconds:
+                    conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+                    conn.commit()
+                    return None
+                conn.execute("UPDATE llm_response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                conn.commit()
+                return row[0]
+            except sqlite3.Error as e:
+                logger.warning(f"Read LLM response cache failed: {e}")
+                return None
+
+    def set(self, key: str, response: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                now = time.time()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_response_cache (key, response, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, response, now, now),
+                )
+                conn.commit()
+                self._writes += 1
+                # 每写入上限的百分之一条检查一次，避免每次写入都统计总数
+                if self._writes >= max(self.max_entries // 100, 1):
+                    self._writes = 0
+                    self._evict(conn, now)
+            except sqlite3.Error as e:
+                logger.warning(f"Write LLM response cache failed: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        if self.ttl_seconds > 0:
+            conn.execute("DELETE FROM llm_response_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        total = conn.execute("SELECT COUNT(*) FROM llm_response_cache").fetchone()[0]
+        if total > self.max_entries:
+            # 淘汰最久未访问的条目，直到条目数降到上限的90%
+            conn.execute(
+                "DELETE FROM llm_response_cache WHERE key IN ("
+                "SELECT key FROM llm_response_cache ORDER BY accessed_at ASC LIMIT ?)",
+                (total - int(self.max_entries * 0.9),),
+            )
+        conn.commit()
+
+    async def aget(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, response: str) -> None:
+        if self.enabled:
+            await asyncio.to_thread(self.set, key, response)
+
+    def record(self, scope: str | None, hit: bool) -> None:
+        if scope is None:
+            return
+        self.metrics[scope]["hits" if hit else "misses"] += 1
+
+    def pop_metrics(self, scope: str) -> dict[str, Any]:
+        metrics = self.metrics.pop(scope, {"hits": 0, "misses": 0})
+        total = metrics["hits"] + metrics["misses"]
+        return {**metrics, "hit_rate": metrics["hits"] / total if total else 0.0}
@@ -108,7 +108,7 @@ class ModelsService:
         """创建模型：健康检查后 saveAndSetDefault；isEnabled 恒为 True。
         若 uk_model_provider 已存在且 is_deleted=True，则恢复并更新相关字段。"""
         try:
-            LLMFactory.check_health(req.modelName, req.baseUrl, req.apiKey, req.type.value)
+            await LLMFactory.acheck_health(req.modelName, req.baseUrl, req.apiKey, req.type.value)
         except Exception as e:
             logger.error("Model health check failed: model=%s type=%s err=%s", req.modelName, req.type, e)
             raise HTTPException(status_code=400, detail="模型健康检查失败") from e
@@ -206,7 +206,7 @@ class ModelsService:
             raise HTTPException(status_code=404, detail="模型配置不存在")
 
         try:
-            LLMFactory.check_health(req.modelName, req.baseUrl, req.apiKey, req.type.value)
+            await LLMFactory.acheck_health(req.modelName, req.baseUrl, req.apiKey, req.type.value)
         except Exception as e:
             logger.error("Model health check failed: model=%s type=%s err=%s", req.modelName, req.type, e)
             raise HTTPException(status_code=400, detail="模型健康检查失败") from e
@@ -130,3 +130,23 @@ def test_validate_xml_requires_control_name_and_to_name() -> None:
     assert valid is False
     assert "Missing 'name' attribute" in (error or "")
 
+
+
+def test_iter_json_array_parses_split_stream() -> None:
+    import asyncio
+    import json
+
+    from app.module.annotation.client.labelstudio.client import iter_json_array
+
+    tasks = [{"id": i, "data": {"file_id": f"f{i}", "text": "标注 ,]["}, "annotations": []} for i in range(3)]
+    payload = json.dumps(tasks, ensure_ascii=False, indent=1).encode("utf-8")
+
+    async def chunks():
+        # 以很小的块切分，覆盖元素与多字节字符跨块的情况
+        for start in range(0, len(payload), 7):
+            yield payload[start:start + 7]
+
+    async def collect():
+        return [task async for task in iter_json_array(chunks())]
+
+    assert asyncio.run(collect()) == tasks
@@ -49,3 +49,367 @@ def test_get_prompt_contains_expected_keywords(synth_type: SynthesisType, requir
 def test_synthesis_type_enum_values_are_unique() -> None:
     values = [t.value for t in SynthesisType]
     assert len(values) == len(set(values))
+
+
+class _FakeMessage:
+    def __init__(self, content: str) -> None:
+        self.content = content
+
+
+class _FakeChat:
+    """记录并发调用数的假模型，问题提示返回两个问题，其余返回固定答案"""
+
+    def __init__(self) -> None:
+        self.active = 0
+        self.max_active = 0
+
+    async def ainvoke(self, prompt: str) -> _FakeMessage:
+        import asyncio
+
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        if prompt.startswith("Q:"):
+            return _FakeMessage('["问题一", "问题二"]')
+        return _FakeMessage("答案")
+
+
+class _FakeSession:
+    def __init__(self, store: dict) -> None:
+        self.store = store
+
+    async def __aenter__(self) -> "_FakeSession":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+    def add_all(self, records) -> None:
+        self.store["records"].extend(records)
+
+    async def execute(self, statement) -> None:
+        self.store["statements"] += 1
+
+    async def commit(self) -> None:
+        self.store["commits"] += 1
+
+
+def test_synthesis_pipeline_overlaps_chunks_across_files_and_batches_writes() -> None:
+    import asyncio
+    from types import SimpleNamespace
+
+    from app.module.generation.schema.generation import SyntheConfig
+    from app.module.generation.service.synthesis_pipeline import SynthesisPipeline
+
+    store = {"records": [], "statements": 0, "commits": 0}
+    chat = _FakeChat()
+    question_cfg = SyntheConfig(model_id="m1", prompt_template="Q:{text}")
+    answer_cfg = SyntheConfig(model_id="m1", prompt_template="A:{text}{question}")
+
+    async def run() -> SynthesisPipeline:
+        pipeline = SynthesisPipeline(
+            synth_task_id="task",
+            session_factory=lambda: _FakeSession(store),
+            chunks_in_flight=8,
+            model_concurrency=4,
+            write_batch_size=10,
+            flush_interval=0.05,
+        )
+        pipeline.start()
+        for file_no in range(3):
+            file_ctx = pipeline.create_file_context(
+                SimpleNamespace(id=f"file-{file_no}"), 5, question_cfg, answer_cfg, chat, chat
+            )
+            for index in range(1, 6):
+                await pipeline.submit(file_ctx, f"{file_no}-{index}", index, "切片内容")
+        await pipeline.close()
+        return pipeline
+
+    pipeline = asyncio.run(run())
+
+    assert len(store["records"]) == 30
+    assert pipeline.processed_chunks == pipeline.total_chunks == 15
+    assert pipeline.completed_files == {"file-0", "file-1", "file-2"}
+    # 问题与答案使用同一模型，共享并发上限
+    assert 1 < chat.max_active <= 4
+    # 结果按批写入，而不是每个切片提交一次
+    assert store["commits"] < 15
+
+
+def test_synthesis_pipeline_stops_generating_after_max_qa_pairs() -> None:
+    import asyncio
+    from types import SimpleNamespace
+
+    from app.module.generation.schema.generation import SyntheConfig
+    from app.module.generation.service.synthesis_pipeline import SynthesisPipeline
+
+    store = {"records": [], "statements": 0, "commits": 0}
+    chat = _FakeChat()
+    question_cfg = SyntheConfig(model_id="m1", prompt_template="Q:{text}")
+    answer_cfg = SyntheConfig(model_id="m2", prompt_template="A:{text}{question}")
+
+    async def run() -> SynthesisPipeline:
+        pipeline = SynthesisPipeline(
+            synth_task_id="task",
+            session_factory=lambda: _FakeSession(store),
+            max_qa_pairs=2,
+            existing_qa_pairs=2,
+            chunks_in_flight=2,
+        )
+        pipeline.start()
+        file_ctx = pipeline.create_file_context(
+            SimpleNamespace(id="file-0"), 3, question_cfg, answer_cfg, chat, chat
+        )
+        for index in range(1, 4):
+            await pipeline.submit(file_ctx, f"0-{index}", index, "切片内容")
+        await pipeline.close()
+        return pipeline
+
+    pipeline = asyncio.run(run())
+
+    assert store["records"] == []
+    assert pipeline.metrics["skipped_chunks"] == 3
+    assert pipeline.completed_files == {"file-0"}
+
+
+def test_synthesis_pipeline_counts_chunks_only_after_commit(monkeypatch) -> None:
+    import asyncio
+    from types import SimpleNamespace
+
+    from app.module.generation.schema.generation import SyntheConfig
+    from app.module.generation.service import synthesis_pipeline
+    from app.module.generation.service.synthesis_pipeline import SynthesisPipeline
+
+    monkeypatch.setattr(synthesis_pipeline, "_FLUSH_RETRY_DELAY", 0)
+
+    class _FailingSession(_FakeSession):
+        async def commit(self) -> None:
+            raise RuntimeError("database unavailable")
+
+    store = {"records": [], "statements": 0, "commits": 0}
+    chat = _FakeChat()
+    question_cfg = SyntheConfig(model_id="m1", prompt_template="Q:{text}")
+    answer_cfg = SyntheConfig(model_id="m1", prompt_template="A:{text}{question}")
+
+    async def run() -> SynthesisPipeline:
+        pipeline = SynthesisPipeline(
+            synth_task_id="task",
+            session_factory=lambda: _FailingSession(store),
+            chunks_in_flight=2,
+        )
+        pipeline.start()
+        file_ctx = pipeline.create_file_context(
+            SimpleNamespace(id="file-0"), 2, question_cfg, answer_cfg, chat, chat
+        )
+        for index in range(1, 3):
+            await pipeline.submit(file_ctx, f"0-{index}", index, "切片内容")
+        await pipeline.close()
+        return pipeline
+
+    pipeline = asyncio.run(run())
+
+    assert pipeline.processed_chunks == 0
+    assert pipeline.completed_files == set()
+    assert pipeline.metrics["write_failures"] == 4
+    # 重试后仍写入失败的文件标记为失败，不会一直停留在处理中
+    assert pipeline.failed_files == {"file-0"}
+
+
+def test_synthesis_pipeline_retries_failed_flush(monkeypatch) -> None:
+    import asyncio
+    from types import SimpleNamespace
+
+    from app.module.generation.schema.generation import SyntheConfig
+    from app.module.generation.service import synthesis_pipeline
+    from app.module.generation.service.synthesis_pipeline import SynthesisPipeline
+
+    class _FlakySession(_FakeSession):
+        async def commit(self) -> None:
+            self.store["attempts"] += 1
+            if self.store["attempts"] == 1:
+                raise RuntimeError("connection reset")
+            await super().commit()
+
+    monkeypatch.setattr(synthesis_pipeline, "_FLUSH_RETRY_DELAY", 0)
+    store = {"records": [], "statements": 0, "commits": 0, "attempts": 0}
+    chat = _FakeChat()
+    question_cfg = SyntheConfig(model_id="m1", prompt_template="Q:{text}")
+    answer_cfg = SyntheConfig(model_id="m1", prompt_template="A:{text}{question}")
+
+    async def run() -> SynthesisPipeline:
+        pipeline = SynthesisPipeline(
+            synth_task_id="task",
+            session_factory=lambda: _FlakySession(store),
+            chunks_in_flight=2,
+        )
+        pipeline.start()
+        file_ctx = pipeline.create_file_context(
+            SimpleNamespace(id="file-0"), 1, question_cfg, answer_cfg, chat, chat
+        )
+        await pipeline.submit(file_ctx, "0-1", 1, "切片内容")
+        await pipeline.close()
+        return pipeline
+
+    pipeline = asyncio.run(run())
+
+    assert pipeline.completed_files == {"file-0"}
+    assert pipeline.failed_files == set()
+    assert pipeline.metrics["write_failures"] == 0
+
+
+def test_chunk_processor_bulk_inserts_and_streams_chunks_by_keyset() -> None:
+    import asyncio
+    from types import SimpleNamespace
+
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    from app.db.models.data_synthesis import DataSynthesisChunkInstance
+    from app.module.generation.service.chunk_processor import ChunkProcessor
+
+    async def run():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(DataSynthesisChunkInstance.__table__.create)
+        file_task = SimpleNamespace(id="file-task", total_chunks=0, status="pending")
+        docs = [SimpleNamespace(page_content=f"切片{i}", metadata={"page": i}) for i in range(1, 8)]
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            processor = ChunkProcessor(session)
+            persisted = await processor.persist_chunks(SimpleNamespace(id="task"), file_task, "file", docs)
+            streamed = [chunk async for chunk in processor.iter_chunks("file-task", batch_size=3)]
+            # 流式读取不应把切片加载为 ORM 对象
+            assert not session.identity_map
+        await engine.dispose()
+        return persisted, file_task, streamed
+
+    persisted, file_task, streamed = asyncio.run(run())
+
+    assert persisted == 7
+    assert file_task.total_chunks == 7 and file_task.status == "processing"
+    assert [chunk.chunk_index for chunk in streamed] == list(range(1, 8))
+    assert streamed[0].chunk_content == "切片1"
+
+
+def test_exporter_streams_file_instances_concurrently_to_compressed_jsonl(tmp_path) -> None:
+    import asyncio
+    import gzip
+    import json
+
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    from app.db.models.data_synthesis import DataSynthesisFileInstance, SynthesisData
+    from app.module.generation.service.export_service import SynthesisDatasetExporter
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'export.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(DataSynthesisFileInstance.__table__.create)
+            await conn.run_sync(SynthesisData.__table__.create)
+
+        def session_factory() -> AsyncSession:
+            return AsyncSession(engine, expire_on_commit=False)
+
+        async with session_factory() as session:
+            # 第 4 个文件与第 1 个同名，导出时需要追加后缀
+            for file_no, count in enumerate([5, 0, 3, 2]):
+                session.add(DataSynthesisFileInstance(
+                    id=f"f{file_no}", synthesis_instance_id="task", file_name=f"doc{file_no % 3}.pdf",
+                    source_file_id=f"src{file_no}", total_chunks=0, processed_chunks=0,
+                ))
+                session.add_all(
+                    SynthesisData(
+                        id=f"f{file_no}-{i}", synthesis_file_instance_id=f"f{file_no}", chunk_instance_id="c",
+                        data={"instruction": f"q{i}", "output": f"a{i}", "input": "ctx"},
+                    )
+                    for i in range(count)
+                )
+            await session.commit()
+
+            exporter = SynthesisDatasetExporter(
+                session, format="alpaca", output_path=str(tmp_path / "out"), file_type="jsonl.gz",
+                session_factory=session_factory, concurrency=2, batch_size=2,
+            )
+            result = await exporter.export_data("task")
+        await engine.dispose()
+        return result
+
+    result = asyncio.run(run())
+
+    assert result.total_records == 10
+    assert [path.rsplit("/", 1)[-1] for path in result.file_paths] == [
+        "doc0.jsonl.gz", "doc2.jsonl.gz", "doc0_1.jsonl.gz",
+    ]
+    with gzip.open(result.file_paths[0], "rt", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 5
+    assert lines[0] == {"instruction": "q0", "output": "a0"}
+    with gzip.open(result.file_paths[2], "rt", encoding="utf-8") as f:
+        assert sum(1 for _ in f) == 2
+
+
+def test_question_generator_refreshes_cached_unparseable_answer(tmp_path, monkeypatch) -> None:
+    import asyncio
+    from types import SimpleNamespace
+
+    from app.module.generation.schema.generation import SyntheConfig
+    from app.module.generation.service.qa_generator import QuestionGenerator
+    from app.module.shared.llm import LLMFactory, LLMResponseCache
+
+    class _FlakyChat:
+        model_name = "model-a"
+        _identifying_params: dict = {}
+
+        def __init__(self) -> None:
+            self.calls = 0
+
+        async def ainvoke(self, prompt: str):
+            self.calls += 1
+            return SimpleNamespace(content="不是JSON" if self.calls == 1 else '["问题一"]')
+
+    monkeypatch.setattr(LLMFactory, "_response_cache", LLMResponseCache(str(tmp_path / "cache.db")))
+    chat = _FlakyChat()
+    generator = QuestionGenerator(db=None)
+    cfg = SyntheConfig(model_id="m1", prompt_template="Q:{text}")
+
+    async def run():
+        first = await generator.generate_questions("切片内容", cfg, chat)
+        second = await generator.generate_questions("切片内容", cfg, chat)
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    # 无法解析的结果会被重新请求的结果覆盖，之后直接命中缓存
+    assert first == second == ["问题一"]
+    assert chat.calls == 2
+
+
+def test_record_file_writer_uses_fixed_parquet_schema(tmp_path) -> None:
+    import json
+
+    import pyarrow.parquet as pq
+
+    from app.module.generation.service.export_service import _RecordFileWriter
+
+    def write(format: str, batches: list[list[dict]]) -> list[dict]:
+        path = str(tmp_path / f"{format}.parquet")
+        writer = _RecordFileWriter(path, "parquet", format)
+        writer.open()
+        for batch in batches:
+            writer.write_batch(batch)
+        writer.close()
+        return pq.read_table(path).to_pylist()
+
+    conversations = [{"from": "human", "value": "q"}, {"from": "gpt", "value": "a"}]
+    # 首批没有 context，后续批次的 context 不能丢失
+    rows = write("sharegpt", [
+        [{"conversations": conversations}],
+        [{"conversations": conversations, "context": "ctx"}],
+    ])
+    assert [row["context"] for row in rows] == [None, "ctx"]
+
+    # 首批字段全为空值时，后续批次也不会因类型不一致而失败
+    rows = write("alpaca", [[{"instruction": None, "output": None}], [{"instruction": "q", "output": {"a": 1}}]])
+    assert rows[1] == {"instruction": "q", "output": '{"a": 1}'}
+
+    rows = write("raw", [[{"a": 1}], [{"a": 2, "extra": "x"}]])
+    assert [json.loads(row["data"]) for row in rows] == [{"a": 1}, {"a": 2, "extra": "x"}]
@@ -47,3 +47,219 @@ def test_remove_empty_lines_private_method_behavior() -> None:
 )
 def test_has_printable_content_parametrized(text: str, expected: bool) -> None:
     assert TextCleaner.has_printable_content(text) is expected
+
+
+def test_embedding_insert_pipeline_batches_by_tokens_and_overlaps_stages() -> None:
+    import asyncio
+
+    from app.module.rag.infra.document.types import DocumentChunk
+    from app.module.rag.service.common.ingestion_pipeline import EmbeddingInsertPipeline
+
+    class _FakeEmbedding:
+        def __init__(self) -> None:
+            self.active = 0
+            self.max_active = 0
+
+        async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+            # 超过 3 个文本的请求模拟嵌入服务的单请求上限
+            if len(texts) > 3:
+                raise ValueError("batch too large")
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            await asyncio.sleep(0.01)
+            self.active -= 1
+            return [[float(len(text))] for text in texts]
+
+    class _FakeVectorStore:
+        def __init__(self) -> None:
+            self.inserted: list[tuple[list[str], list[list[float]]]] = []
+
+        async def aadd_embeddings(self, texts, embeddings, metadatas, ids) -> list[str]:
+            await asyncio.sleep(0.01)
+            assert len(texts) == len(embeddings) == len(metadatas) == len(ids)
+            self.inserted.append((texts, embeddings))
+            return ids
+
+    chunks = [DocumentChunk(text="文" * (i % 5 + 1), metadata={"chunk_index": i}) for i in range(20)]
+    embedding = _FakeEmbedding()
+    store = _FakeVectorStore()
+    pipeline = EmbeddingInsertPipeline(
+        store, embedding=embedding, max_batch_tokens=12, max_batch_size=6, embed_concurrency=3,
+    )
+
+    batches = pipeline.build_batches(chunks)
+    assert all(len(batch) <= 6 for batch in batches)
+    assert all(sum(len(c.text) for c in batch) <= 12 or len(batch) == 1 for batch in batches)
+
+    stored = asyncio.run(pipeline.run(chunks))
+
+    assert stored == 20
+    inserted_texts = sorted(text for texts, _ in store.inserted for text in texts)
+    assert inserted_texts == sorted(chunk.text for chunk in chunks)
+    assert all(vector == [float(len(text))] for texts, vectors in store.inserted for text, vector in zip(texts, vectors))
+    assert pipeline.metrics.splits > 0
+    assert 1 < embedding.max_active <= 3 * 2
+
+
+def test_cached_embeddings_only_embeds_changed_chunks(tmp_path) -> None:
+    import asyncio
+
+    from app.module.rag.infra.embeddings import CachedEmbeddings, EmbeddingCache
+
+    class _FakeEmbedding:
+        model = "embed-model"
+        openai_api_base = "http://llm.local/v1"
+
+        def __init__(self) -> None:
+            self.requested: list[str] = []
+
+        def embed_documents(self, texts: list[str]) -> list[list[float]]:
+            self.requested.extend(texts)
+            return [[float(len(text)), 0.5] for text in texts]
+
+        async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+            return self.embed_documents(texts)
+
+    cache = EmbeddingCache(str(tmp_path / "embeddings.db"), max_entries=100)
+    embedding = _FakeEmbedding()
+    cached = CachedEmbeddings.wrap(embedding, cache=cache)
+    assert isinstance(cached, CachedEmbeddings)
+
+    first = asyncio.run(cached.aembed_documents(["a", "bb", "a"]))
+    second = cached.embed_documents(["bb", "ccc", "a"])
+
+    assert first == [[1.0, 0.5], [2.0, 0.5], [1.0, 0.5]]
+    assert second == [[2.0, 0.5], [3.0, 0.5], [1.0, 0.5]]
+    # 重复文本与已缓存的文本不再请求嵌入服务
+    assert embedding.requested == ["a", "bb", "ccc"]
+    assert cached.metrics == {"hits": 3, "misses": 3}
+
+    # 不同模型不共享缓存
+    other = _FakeEmbedding()
+    other.model = "other-model"
+    CachedEmbeddings.wrap(other, cache=cache).embed_documents(["a"])
+    assert other.requested == ["a"]
+
+
+def test_embedding_cache_evicts_least_recently_used(tmp_path) -> None:
+    from app.module.rag.infra.embeddings import EmbeddingCache
+
+    cache = EmbeddingCache(str(tmp_path / "embeddings.db"), max_entries=3)
+    cache.put_many({"k0": [0.0], "k1": [1.0], "k2": [2.0]})
+    assert cache.get_many(["k0"]) == {"k0": [0.0]}
+    cache.put_many({"k3": [3.0]})
+
+    assert set(cache.get_many(["k0", "k1", "k2", "k3"])) == {"k0", "k3"}
+
+
+def test_delete_chunks_by_rag_file_ids_uses_batched_in_filters(monkeypatch) -> None:
+    import asyncio
+
+    from app.module.rag.infra.vectorstore import store
+
+    class _FakeClient:
+        def __init__(self) -> None:
+            self.calls: list[tuple[str, dict]] = []
+
+        def delete(self, collection_name: str, **kwargs) -> dict:
+            self.calls.append((collection_name, kwargs))
+            return {"delete_count": 2}
+
+    client = _FakeClient()
+    monkeypatch.setattr(store, "get_milvus_client", lambda: client)
+    monkeypatch.setattr(store, "DELETE_FILTER_BATCH_SIZE", 2)
+
+    deleted = asyncio.run(store.adelete_chunks_by_rag_file_ids({
+        "kb_a": ["f1", "f2", "f3", "f1"],
+        "kb_b": ['f"4'],
+    }))
+
+    assert deleted == {"kb_a": 4, "kb_b": 2}
+    filters = sorted((name, kwargs["filter"]) for name, kwargs in client.calls)
+    assert filters == [
+        ("kb_a", 'metadata["rag_file_id"] in ["f1", "f2"]'),
+        ("kb_a", 'metadata["rag_file_id"] in ["f3"]'),
+        ("kb_b", 'metadata["rag_file_id"] in ["f\\"4"]'),
+    ]
+
+
+def test_retrieval_cache_expires_and_invalidates_by_knowledge_base(monkeypatch) -> None:
+    from app.module.rag.service.common import retrieval_cache
+    from app.module.rag.service.common.retrieval_cache import RetrievalCache
+
+    now = [100.0]
+    monkeypatch.setattr(retrieval_cache.time, "monotonic", lambda: now[0])
+    cache = RetrievalCache(query_vector_max_entries=1, result_ttl_seconds=10, result_max_entries=10)
+
+    key_ab = cache.make_result_key(["kb_b", "kb_a", "kb_a"], "q", 5)
+    key_c = cache.make_result_key(["kb_c"], "q", 5)
+    assert key_ab == (("kb_a", "kb_b"), "q", 5)
+    cache.put_results(key_ab, [{"id": "1", "metadata": {}}])
+    cache.put_results(key_c, [{"id": "2", "metadata": {}}])
+
+    # 返回副本，调用方修改不影响缓存
+    cache.get_results(key_ab)[0]["metadata"]["x"] = 1
+    assert cache.get_results(key_ab) == [{"id": "1", "metadata": {}}]
+
+    cache.invalidate("kb_b")
+    assert cache.get_results(key_ab) is None
+    assert cache.get_results(key_c) is not None
+
+    now[0] += 10
+    assert cache.get_results(key_c) is None
+
+    cache.put_query_vector("m", "q1", [1.0])
+    cache.put_query_vector("m", "q2", [2.0])
+    assert cache.get_query_vector("m", "q1") is None
+    assert cache.get_query_vector("m", "q2") == [2.0]
+
+
+
+def test_graph_rag_cache_flushes_evicted_instances(monkeypatch) -> None:
+    import asyncio
+
+    from app.module.rag.service.common import graph_rag_cache
+    from app.module.rag.service.common.graph_rag_cache import GraphRagCache
+
+    finalized = []
+
+    class FakeRag:
+        def __init__(self, name: str):
+            self.name = name
+
+        async def finalize_storages(self) -> None:
+            finalized.append(self.name)
+
+    now = [100.0]
+    monkeypatch.setattr(graph_rag_cache.time, "monotonic", lambda: now[0])
+    cache = GraphRagCache(max_size=2, idle_seconds=60)
+
+    async def run() -> None:
+        await cache.put("a", FakeRag("a"))
+        await cache.put("b", FakeRag("b"))
+        assert cache.get("a").name == "a"
+        # 超出数量上限时淘汰最久未使用的 b
+        await cache.put("c", FakeRag("c"))
+        assert finalized == ["b"]
+        assert "b" not in cache
+
+        # 持有中的实例空闲超时也不会被淘汰
+        with cache.hold("a"):
+            now[0] += 60
+            await cache.evict()
+            assert finalized == ["b", "c"]
+            assert cache.get("a") is not None
+
+        # 手动清除的实例不落盘
+        assert cache.pop("a").name == "a"
+        assert finalized == ["b", "c"]
+
+        # 其余实例都在使用中时，新放入的实例也不会被立即淘汰
+        cache.max_size = 1
+        await cache.put("d", FakeRag("d"))
+        with cache.hold("d"):
+            await cache.put("e", FakeRag("e"))
+        assert "d" in cache and "e" in cache
+        assert finalized == ["b", "c"]
+
+    asyncio.run(run())
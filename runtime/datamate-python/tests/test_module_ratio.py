@@ -86,3 +86,81 @@ def test_create_ratio_task_request_alias_mapping_for_dataset_id() -> None:
         ],
     )
     assert req.config[0].dataset_id == "ds-alias"
+
+
+def test_ratio_get_files_filters_and_samples_selected_ids() -> None:
+    import asyncio
+    import json
+    from datetime import datetime
+    from types import SimpleNamespace
+
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    from app.db.models import DatasetFiles
+    from app.module.ratio.service.ratio_task import RatioTaskService
+
+    def tag(value: str) -> list[dict]:
+        return [{"from_name": "sentiment", "type": "choices", "values": {"choices": [value]}}]
+
+    async def run():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(DatasetFiles.__table__.create)
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            session.add_all([
+                DatasetFiles(
+                    id=f"f{i}",
+                    dataset_id="src",
+                    file_name=f"{i}.txt",
+                    file_path=f"/dataset/src/{i}.txt",
+                    tags=tag("positive" if i % 2 else "negative"),
+                    tags_updated_at=datetime(2025, 1, 10) if i < 8 else datetime(2025, 3, 1),
+                    status="ACTIVE" if i != 1 else "DELETED",
+                )
+                for i in range(10)
+            ])
+            # 标签值不在 values[type] 下、或只有 from_name 没有标签值的文件不匹配（jsonpath 粗筛会放过它们）
+            session.add_all([
+                DatasetFiles(
+                    id=file_id, dataset_id="src", file_name=f"{file_id}.txt", file_path=f"/dataset/src/{file_id}.txt",
+                    tags=tags, tags_updated_at=datetime(2025, 1, 10), status="ACTIVE",
+                )
+                for file_id, tags in [
+                    ("other_key", [{"from_name": "sentiment", "type": "choices", "values": {"labels": ["positive"]}}]),
+                    ("bare", [{"from_name": "sentiment", "type": "choices", "values": {}}]),
+                ]
+            ])
+            await session.commit()
+
+            conditions = json.dumps({
+                "dateRange": ["2025-01-01", "2025-02-01"],
+                "label": {"label": "sentiment", "value": "positive"},
+            })
+            rel = SimpleNamespace(source_dataset_id="src", filter_conditions=conditions)
+            matched = await RatioTaskService.get_files(rel, session)
+            sampled = await RatioTaskService.get_files(rel, session, limit=2)
+            label_only = json.dumps({"label": {"label": "sentiment"}})
+            labeled = await RatioTaskService.get_files(
+                SimpleNamespace(source_dataset_id="src", filter_conditions=label_only), session
+            )
+        await engine.dispose()
+        return matched, sampled, labeled
+
+    matched, sampled, labeled = asyncio.run(run())
+
+    assert sorted(f.id for f in matched) == ["f3", "f5", "f7"]
+    assert "bare" not in {f.id for f in labeled} and "other_key" not in {f.id for f in labeled}
+    assert len(labeled) == 9
+    assert len(sampled) == 2 and {f.id for f in sampled} <= {"f3", "f5", "f7"}
+
+
+def test_ratio_label_jsonpath_escapes_values() -> None:
+    from app.module.ratio.schema.ratio_task import LabelFilter
+    from app.module.ratio.service.ratio_task import RatioTaskService
+
+    path = RatioTaskService._build_label_jsonpath(LabelFilter(label='sent"iment', value="正面"))
+
+    assert path == '$[*] ? (@.from_name == "sent\\"iment" && @.values.* == "\\u6b63\\u9762")'
+    assert RatioTaskService._build_label_jsonpath(LabelFilter(label="sentiment")) == (
+        '$[*] ? (@.from_name == "sentiment")'
+    )
@@ -75,3 +75,140 @@ def test_factory_get_handler_returns_cot_handler() -> None:
     factory = StructuredFileHandlerFactory()
     handler = factory.get_handler(ItemTypes.COT.value)
     assert isinstance(handler, COTItemHandler)
+
+
+def test_llm_factory_reuses_chat_instances_and_async_client_per_loop() -> None:
+    import asyncio
+
+    from app.module.shared.llm import LLMFactory
+
+    async def create_pair():
+        chat_a = LLMFactory.create_chat("model-a", "http://llm.local/v1", "key")
+        chat_b = LLMFactory.create_chat("model-a", "http://llm.local/v1", "key")
+        chat_c = LLMFactory.create_chat("model-a", "http://llm.local/v1", "other-key")
+        client = LLMFactory.get_async_http_client("http://llm.local/v1")
+        assert client is LLMFactory.get_async_http_client("http://llm.local/v1")
+        await LLMFactory.aclose()
+        return chat_a, chat_b, chat_c, client
+
+    chat_a, chat_b, chat_c, client = asyncio.run(create_pair())
+    assert chat_a is chat_b
+    assert chat_a is not chat_c
+    assert client.is_closed
+
+
+def test_llm_factory_keeps_one_async_client_per_event_loop() -> None:
+    import asyncio
+    import threading
+
+    from app.module.shared.llm import LLMFactory
+
+    async def get_client():
+        return LLMFactory.get_async_http_client("http://llm.local/v1")
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        other_client = asyncio.run_coroutine_threadsafe(get_client(), loop).result()
+
+        async def use_from_main_loop():
+            client = await get_client()
+            # 其他事件循环的客户端不会被替换，仍可在其所属循环中继续使用
+            assert client is not other_client
+            assert asyncio.run_coroutine_threadsafe(get_client(), loop).result() is other_client
+            await LLMFactory.aclose()
+
+        asyncio.run(use_from_main_loop())
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+    assert not other_client.is_closed
+    asyncio.run(other_client.aclose())
+
+
+def test_llm_factory_aembed_documents_batches_and_keeps_order() -> None:
+    import asyncio
+
+    from app.module.shared.llm import LLMFactory
+
+    class _FakeEmbedding:
+        def __init__(self) -> None:
+            self.batches: list[list[str]] = []
+
+        async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+            self.batches.append(texts)
+            await asyncio.sleep(0.01 * (3 - len(self.batches)))
+            return [[float(text)] for text in texts]
+
+    embedding = _FakeEmbedding()
+    texts = [str(i) for i in range(5)]
+    vectors = asyncio.run(LLMFactory.aembed_documents(embedding, texts, batch_size=2, concurrency=3))
+
+    assert vectors == [[float(i)] for i in range(5)]
+    assert [len(batch) for batch in embedding.batches] == [2, 2, 1]
+
+
+def test_llm_factory_ainvoke_serves_repeated_prompts_from_response_cache(tmp_path, monkeypatch) -> None:
+    import asyncio
+    from types import SimpleNamespace
+
+    from app.module.shared.llm import LLMFactory, LLMResponseCache
+
+    class _FakeChat:
+        model_name = "model-a"
+        openai_api_base = "http://llm.local/v1"
+
+        def __init__(self, temperature: float) -> None:
+            self.temperature = temperature
+            self.calls = 0
+
+        @property
+        def _identifying_params(self) -> dict:
+            return {"temperature": self.temperature}
+
+        async def ainvoke(self, prompt: str):
+            self.calls += 1
+            return SimpleNamespace(content=f"{prompt}#{self.calls}")
+
+    monkeypatch.setattr(LLMFactory, "_response_cache", LLMResponseCache(str(tmp_path / "cache.db")))
+    chat = _FakeChat(temperature=0.1)
+    hot_chat = _FakeChat(temperature=0.9)
+
+    async def run():
+        with LLMFactory.cache_scope("task-1"):
+            first = await LLMFactory.ainvoke(chat, "p")
+            second = await LLMFactory.ainvoke(chat, "p")
+            refreshed = await LLMFactory.ainvoke(chat, "p", use_cache=False)
+            other = await LLMFactory.ainvoke(hot_chat, "p")
+            metrics = dict(LLMFactory.get_response_cache().metrics["task-1"])
+        return first, second, refreshed, other, metrics
+
+    first, second, refreshed, other, metrics = asyncio.run(run())
+
+    assert first == second == "p#1"
+    assert refreshed == "p#2"
+    # 采样参数不同的模型不共享缓存
+    assert other == "p#1" and hot_chat.calls == 1
+    assert metrics == {"hits": 1, "misses": 3}
+    assert LLMFactory.get_response_cache().get(LLMResponseCache.make_key({"x": 1}, "p")) is None
+
+
+def test_llm_response_cache_expires_and_evicts_least_recently_used(tmp_path) -> None:
+    from app.module.shared.llm import LLMResponseCache
+
+    cache = LLMResponseCache(str(tmp_path / "cache.db"), ttl_seconds=0, max_entries=3)
+    for i in range(3):
+        cache.set(f"k{i}", f"v{i}")
+    assert cache.get("k0") == "v0"
+    cache.set("k3", "v3")
+
+    # k1 最久未访问，超过上限后被淘汰
+    assert cache.get("k1") is None
+    assert cache.get("k0") == "v0" and cache.get("k3") == "v3"
+
+    expiring = LLMResponseCache(str(tmp_path / "ttl.db"), ttl_seconds=1, max_entries=10)
+    expiring.set("k", "v")
+    expiring._conn.execute("UPDATE llm_response_cache SET created_at = created_at - 10")
+    assert expiring.get("k") is None
@@ -6,18 +6,19 @@ Description:
     2.感知哈希算法则是从图像的整体结构和特征维度来计算图片的相似度。
     3.ORB算法可以用来对图像中的关键点快速创建特征向量，这些特征向量可以用来识别图像中的对象。通过比较两张图片的特征向量计算相似度。
     4.感知哈希算法和ORB算法计算相似度高于0.75，则选择二者较大值；若低于0.75，则选择二者最小值作为相似度
-    5.将文件特征数据存到数据库。根据任务uuid获取历史文件特征，遍历特征并进行去重比较
+    5.将文件特征数据存到数据库。pHash以64位整数存储，算子在内存中维护任务内的pHash数组，
+      通过异或+popcount向量化计算汉明距离筛选候选图片，仅对候选图片加载ORB特征并比较
 Create: 2025/1/7
 """
 import json
 import time
 import zlib
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 import cv2
 import numpy as np
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 from loguru import logger
 
 from datamate.sql_manager.sql_manager import SQLManager
@@ -52,7 +53,9 @@ class ImgSimilarImagesCleaner(Filter):
     DEFAULT_ORB_RATIO = 0.8  # 默认特征点距离比率
     DEFAULT_MIX_SIMILARITY = 0.75  # 默认相似度算法阈值
     DEFAULT_IMG_RESIZE = 200  # 默认图片压缩尺寸
-    DEFAULT_PAGE_SIZE = 500  # 默认每页数据量
+    DEFAULT_SHORTLIST_SIMILARITY = 0.7  # 默认进入ORB比较的pHash相似度下限
+    DEFAULT_SHORTLIST_SIZE = 50  # 默认进入ORB比较的候选图片数量上限
+    DEFAULT_SYNC_LOOKBACK = 1000  # 默认增量同步时重新扫描的last_id以下id窗口大小
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -62,9 +65,17 @@ class ImgSimilarImagesCleaner(Filter):
         self.orb_ratio = self.DEFAULT_ORB_RATIO  # 特征点距离的比率，该数值为经验值
         self.mix_similarity = self.DEFAULT_MIX_SIMILARITY  # 选择相似度算法的阈值，该数值为经验值
         self.img_resize = self.DEFAULT_IMG_RESIZE  # 图片压缩尺寸
-        self.conn = None  # 数据库连接
-        self.trans = None  # 数据库事务
-        self.page_size = self.DEFAULT_PAGE_SIZE  # 每页数据量
+        # pHash候选筛选阈值，不高于相似度阈值，避免低阈值时漏掉需要ORB比较的图片
+        self.shortlist_similarity = min(self.DEFAULT_SHORTLIST_SIMILARITY, float(self.similar_threshold))
+        self.shortlist_size = self.DEFAULT_SHORTLIST_SIZE  # ORB比较的候选数量上限
+        self.matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
+        # 任务内已入库图片的pHash索引：id数组与对应的pHash数组（uint64），增量同步
+        self.feature_ids = np.array([], dtype=np.int64)
+        self.p_hashes = np.array([], dtype=np.uint64)
+        self.known_feature_ids = set()
+        self.last_feature_id = 0
+        self.sync_lookback = self.DEFAULT_SYNC_LOOKBACK
+        self.tables_created = False
         # 获取数据库sql
         self.sql_dict = self.load_sql_dict()
 
@@ -75,28 +86,38 @@ class ImgSimilarImagesCleaner(Filter):
         with open(sql_config_path, 'r', encoding='utf-8') as f:
             return json.load(f)
 
+    @classmethod
+    def release_task(cls, task_uuid: str):
+        """任务结束后删除该任务的图片特征记录"""
+        if not task_uuid:
+            return
+        sql_dict = cls.load_sql_dict()
+        with SQLManager().create_connect() as connection:
+            connection.execute(text(sql_dict.get("delete_signatures_sql")), {"task_uuid": task_uuid})
+
     @staticmethod
-    def get_p_hash(image: np.ndarray) -> str:
-        """计算pHash值"""
-        hashed_value = ""
+    def get_p_hash(image: np.ndarray) -> Optional[int]:
+        """计算pHash值，返回64位无符号整数"""
         if not image.size:
-            return hashed_value
+            return None
         gray_image = cv2.cvtColor(cv2.resize(image, (8, 8), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
         dct_image = cv2.dct(np.float32(gray_image))
-        hashed_value = ''.join(['1' if x >= 0 else '0' for x in dct_image[:8, :8].flatten()])
-        return hashed_value
+        bits = (dct_image[:8, :8].flatten() >= 0).astype(np.uint8)
+        return int(np.packbits(bits).view(">u8")[0])
 
     @staticmethod
-    def get_phash_similarity(hash_comparison: str, hash_compared: str) -> float:
+    def get_phash_similarity(hash_comparison: Optional[int], hash_compared: Optional[int]) -> float:
         """通过计算汉明距离，获取图片相似度"""
         # 若哈希值为空，则相似度为0
-        if not hash_comparison or not hash_compared:
+        if hash_comparison is None or hash_compared is None:
             return 0.0
-        # 计算汉明距离
-        distance = sum(
-            bit_comparison != bit_compared for bit_comparison, bit_compared in zip(hash_comparison, hash_compared))
-        similarity = 1 - distance / len(hash_comparison)
-        return similarity
+        distance = (hash_comparison ^ hash_compared).bit_count()
+        return 1 - distance / 64
+
+    @staticmethod
+    def to_signed(p_hash: int) -> int:
+        """64位无符号整数转换为有符号整数，用于BIGINT列存储"""
+        return p_hash - (1 << 64) if p_hash >= (1 << 63) else p_hash
 
     def filter_similar_images(self, img: np.ndarray, file_name: str) -> np.ndarray:
         """判断数据集中是否存在相似图片"""
@@ -126,14 +147,13 @@ class ImgSimilarImagesCleaner(Filter):
 
         try:
             # knn筛选结果
-            matches = (cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False).
-                       knnMatch(query_matrix, trainDescriptors=train_matrix, k=2))
+            matches = self.matcher.knnMatch(query_matrix, trainDescriptors=train_matrix, k=2)
             if not matches:
                 return 0.0
             # 遍历每一对特征点，筛选距离更近的特征点
             count = 0
-            for (m, n) in matches:
-                if m.distance < self.orb_ratio * n.distance:
+            for match in matches:
+                if len(match) == 2 and match[0].distance < self.orb_ratio * match[1].distance:
                     count += 1
             orb_similarity = count / len(matches)
             return orb_similarity
@@ -142,72 +162,104 @@ class ImgSimilarImagesCleaner(Filter):
                              f"{file_name} and {file_name_history}: {e}")
             return 0.0
 
-    def execute_sql(self, p_hash: str, des_matrix: np.ndarray, file_name: str,
-                    img: np.ndarray) -> np.ndarray:
-        des_matrix_binary = zlib.compress(des_matrix.tobytes())  # 使用 zlib 进行压缩数组
-        timestamp = get_now_time('Asia/Shanghai', '%Y-%m-%d %H:%M:%S', file_name,
-                                 "ImgSimilarCleaner")
-        query_task_uuid_sql = str(self.sql_dict.get("query_task_uuid_sql"))
-        insert_sql = str(self.sql_dict.get("insert_sql"))
-        create_tables_sql = str(self.sql_dict.get("create_tables_sql"))
-
-        db_manager = SQLManager()
+    def get_connection(self, file_name: str):
         try:
-            self.conn = db_manager.create_connect()
+            connection = SQLManager().create_connect()
         except Exception as e:
             logger.error(f"fileName: {file_name}, database connection failed: {str(e)}")
             raise RuntimeError(82000, str(e)) from None
+        if not self.tables_created:
+            connection.execute(text(str(self.sql_dict.get("create_tables_sql"))))
+            connection.execute(text(str(self.sql_dict.get("create_index_sql"))))
+            self.tables_created = True
+        return connection
 
-        with self.conn as connection:
-            """从数据库中获取文件特征、比较相似度，插入新的文件特征"""
-            connection.execute(text(create_tables_sql))
-            result = connection.execute(text(query_task_uuid_sql), {"task_uuid": self.task_uuid}).fetchall()
-            total_count = len(result)
-            if self.has_similar_images(connection, des_matrix, file_name, p_hash, total_count):
-                    return np.array([])
+    def execute_sql(self, p_hash: int, des_matrix: np.ndarray, file_name: str,
+                    img: np.ndarray) -> np.ndarray:
+        """同步pHash索引、比较相似度，插入新的文件特征"""
+        des_matrix_binary = zlib.compress(des_matrix.tobytes())  # 使用 zlib 进行压缩数组
+        timestamp = get_now_time('Asia/Shanghai', '%Y-%m-%d %H:%M:%S', file_name,
+                                 "ImgSimilarCleaner")
+        with self.get_connection(file_name) as connection:
+            self.sync_p_hashes(connection)
+            if self.has_similar_images(connection, des_matrix, file_name, p_hash):
+                return np.array([])
 
             insert_data = {
                 "task_uuid": self.task_uuid,
-                "p_hash": p_hash,
+                "p_hash": self.to_signed(p_hash),
                 "des_matrix": des_matrix_binary,
-                "matrix_shape": str(des_matrix.shape),
+                "matrix_rows": int(des_matrix.shape[0]) if des_matrix.size else 0,
                 "file_name": file_name.encode("utf-8").hex(),
                 "timestamp": timestamp
             }
-            connection.execute(text(insert_sql),insert_data)
+            connection.execute(text(str(self.sql_dict.get("insert_sql"))), insert_data)
         return img
 
-    def has_similar_images(self, connection, des_matrix, file_name, p_hash, total_count):
-        for i in range(0, total_count, self.page_size):
-            query_sql = self.sql_dict.get("query_sql")
-            rows = connection.execute(text(query_sql), {"task_uuid": self.task_uuid, "ge": self.page_size, "le": i}).fetchall()
-            # 对应任务uuid，最后一页没有数据，跳出循环
-            if not rows:
-                break            # 对两张图片进行相似度比较
-            if self.determine_similar_images(rows, p_hash, des_matrix, file_name):
-                return True
-        return False
+    def sync_p_hashes(self, connection):
+        """
+        增量加载其他actor新写入的pHash。
+        BIGSERIAL的id按分配顺序而非提交顺序递增，较小的id可能晚于较大的id提交，
+        因此每次同步都重新扫描last_id以下的一段窗口，并跳过已加载的id
+        """
+        rows = connection.execute(text(str(self.sql_dict.get("query_p_hash_sql"))),
+                                  {"task_uuid": self.task_uuid,
+                                   "last_id": max(self.last_feature_id - self.sync_lookback, 0)}).fetchall()
+        rows = [row for row in rows if row[0] not in self.known_feature_ids]
+        if not rows:
+            return
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        p_hashes = np.array([row[1] for row in rows], dtype=np.int64).view(np.uint64)
+        self.feature_ids = np.concatenate([self.feature_ids, ids])
+        self.p_hashes = np.concatenate([self.p_hashes, p_hashes])
+        self.known_feature_ids.update(ids.tolist())
+        self.last_feature_id = max(self.last_feature_id, int(ids.max()))
+
+    def get_shortlist(self, p_hash: int) -> List[tuple]:
+        """通过异或+popcount向量化计算汉明距离，返回按pHash相似度排序的候选(id, 相似度)"""
+        if not self.p_hashes.size:
+            return []
+        distances = np.bitwise_count(self.p_hashes ^ np.uint64(p_hash))
+        max_distance = int(64 * (1 - self.shortlist_similarity))
+        candidates = np.nonzero(distances <= max_distance)[0]
+        if candidates.size > self.shortlist_size:
+            nearest = np.argpartition(distances[candidates], self.shortlist_size)[:self.shortlist_size]
+            candidates = candidates[nearest]
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+        return [(int(self.feature_ids[i]), 1 - int(distances[i]) / 64) for i in candidates]
 
-    def determine_similar_images(self, file_features: List, p_hash: str, des_matrix: np.ndarray,
-                                 file_name: str) -> bool:
+    def has_similar_images(self, connection, des_matrix, file_name, p_hash):
+        shortlist = self.get_shortlist(p_hash)
+        if not shortlist:
+            return False
+        query_sql = text(str(self.sql_dict.get("query_features_sql"))).bindparams(
+            bindparam("ids", expanding=True))
+        rows = connection.execute(query_sql, {"ids": [feature_id for feature_id, _ in shortlist]}).fetchall()
+        features = {row[0]: row for row in rows}
+        file_features = [(phash_similarity, features[feature_id])
+                         for feature_id, phash_similarity in shortlist if feature_id in features]
+        return self.determine_similar_images(file_features, des_matrix, file_name)
+
+    def determine_similar_images(self, file_features: List, des_matrix: np.ndarray, file_name: str) -> bool:
         """根据文件特征，判断两张图片相似度是否超过指定阈值"""
-        for signature in file_features:
-            pash_feature, orb_feature, matrix_shape, file_name_history = signature[2], signature[3], signature[4], \
-                signature[5]
-            if not pash_feature:
-                # 若图片为空，p_hash、des_matrix为空，跳过比对
-                continue
-            # 解压缩数据
-            decompressed_data = zlib.decompress(orb_feature)
-            # 将字节流转换回矩阵
-            des_matrix_history = np.frombuffer(decompressed_data, dtype=np.uint8).reshape(eval(matrix_shape))
+        for phash_similarity, signature in file_features:
+            orb_feature, matrix_rows, file_name_history = signature[1], signature[2], signature[3]
             # 移除转义字符 '\' 并将十六进制字符串转换为字节序列
             bytes_data = bytes.fromhex(file_name_history)
             # 解码字节序列为 UTF-8 编码的字符串
             file_name_decoded = bytes_data.decode('utf-8')
 
-            phash_similarity = self.get_phash_similarity(p_hash, pash_feature)
-            orb_similarity = self.get_orb_similarity(des_matrix, des_matrix_history, file_name, file_name_decoded)
+            if phash_similarity >= max(self.mix_similarity, self.similar_threshold):
+                # pHash相似度已满足阈值，无需进行ORB比较
+                orb_similarity = 0.0
+            else:
+                # 解压缩数据，将字节流转换回矩阵
+                decompressed_data = zlib.decompress(orb_feature)
+                des_matrix_history = np.frombuffer(decompressed_data, dtype=np.uint8)
+                if matrix_rows:
+                    des_matrix_history = des_matrix_history.reshape(matrix_rows, -1)
+                orb_similarity = self.get_orb_similarity(des_matrix, des_matrix_history, file_name,
+                                                         file_name_decoded)
             max_similarity = max(phash_similarity, orb_similarity)
             min_similarity = min(phash_similarity, orb_similarity)
             if max_similarity >= self.mix_similarity:
@@ -6,15 +6,19 @@ Description: 文档局部内容去重
 Create: 2025/01/07
 """
 
+import hashlib
 import json
 import re
 import time
+import uuid
+from collections import defaultdict
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 
 import numpy as np
-from datasketch import MinHash
-from sqlalchemy import text
+import pandas as pd
+from datasketch import MinHash, MinHashLSH
+from sqlalchemy import bindparam, text
 from loguru import logger
 
 from datamate.sql_manager.sql_manager import SQLManager
@@ -26,7 +30,9 @@ class DuplicateFilesFilter(Filter):
     """相似文档去除插件
 
     基于MinHash计算当前文档与数据集中其它文档相似性，相似性高于设定阈值则返回空。
+    MinHash签名按LSH分桶，桶哈希持久化在数据库中，每个文档只需与命中相同桶的候选文档比较。
     """
+    support_batch = True
 
     def __init__(self, *args, **kwargs):
         # 标点符号
@@ -36,14 +42,15 @@ class DuplicateFilesFilter(Filter):
         self.duplicate_th = kwargs.get("fileDuplicateThreshold", 0.5)
         # task_uuid为标识该数据集的唯一标志
         self.task_uuid = kwargs.get("uuid", "")
-        # 数据库连接
-        self.conn = None
-        # 数据库事务
-        self.trans = None
-        # 每页数据量
-        self.page_size = 500
+        # MinHash排列数
+        self.num_perm = 128
+        # LSH分桶参数：bands个桶，每个桶rows行，取datasketch按阈值计算的误判率最小的组合
+        lsh = MinHashLSH(threshold=self.duplicate_th, num_perm=self.num_perm)
+        self.bands, self.rows = lsh.b, lsh.r
         # 获取数据库sql
         self.sql_dict = self.load_sql_dict()
+        # 建表语句每个算子实例只执行一次
+        self.tables_created = False
 
     @staticmethod
     def load_sql_dict():
@@ -52,6 +59,16 @@ class DuplicateFilesFilter(Filter):
         with open(sql_config_path, 'r', encoding='utf-8') as f:
             return json.load(f)
 
+    @classmethod
+    def release_task(cls, task_uuid: str):
+        """任务结束后删除该任务的签名和LSH桶记录"""
+        if not task_uuid:
+            return
+        sql_dict = cls.load_sql_dict()
+        with SQLManager().create_connect() as connection:
+            connection.execute(text(sql_dict.get("delete_lsh_sql")), {"task_uuid": task_uuid})
+            connection.execute(text(sql_dict.get("delete_signatures_sql")), {"task_uuid": task_uuid})
+
     def get_minhash(self, input_text: str) -> MinHash:
         """获取输入文档的minhash
 
@@ -61,11 +78,33 @@ class DuplicateFilesFilter(Filter):
         Returns:
             text_minhash: 输入文档对应的minhash值
         """
-        text_minhash = MinHash()
+        text_minhash = MinHash(num_perm=self.num_perm)
         for word in re.split(f"[{re.escape(self.punctuation_pattern)}]", input_text.strip()):
             text_minhash.update(word.strip().encode('utf8'))
         return text_minhash
 
+    def get_band_hashes(self, text_minhash: MinHash) -> List[int]:
+        """将MinHash签名切分为bands个桶，每个桶哈希为有符号64位整数（对应BIGINT列）"""
+        hash_values = text_minhash.hashvalues
+        band_hashes = []
+        for band in range(self.bands):
+            band_values = hash_values[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(band.to_bytes(2, "big") + band_values.tobytes(), digest_size=8).digest()
+            band_hashes.append(int.from_bytes(digest, "big", signed=True))
+        return band_hashes
+
+    def get_connection(self, file_name: str):
+        try:
+            connection = SQLManager().create_connect()
+        except Exception as e:
+            logger.error(f"fileName: {file_name}, database connection failed: {str(e)}")
+            raise RuntimeError(82000, str(e)) from None
+        if not self.tables_created:
+            for sql_key in ("create_tables_sql", "create_lsh_tables_sql", "create_lsh_index_sql"):
+                connection.execute(text(self.sql_dict.get(sql_key)))
+            self.tables_created = True
+        return connection
+
     def deduplicate_files(self, sample: Dict[str, Any], file_name: str) -> str:
         """去除相似文件
 
@@ -79,73 +118,101 @@ class DuplicateFilesFilter(Filter):
         input_text = sample[self.text_key]
         if not input_text:
             return input_text
-        text_minhash = self.get_minhash(input_text)
-        return self.execute_sql(text_minhash, file_name, input_text)
-
-    def execute_sql(self, text_minhash: MinHash, file_name: str,
-                    input_text: str) -> str:
-        """从数据库中获取文件特征、比较相似度，插入新的文件特征"""
-        timestamp = get_now_time('Asia/Shanghai', '%Y-%m-%d %H:%M:%S', file_name,
-                                 "DuplicateFilesFilter")
-        minhash_values = text_minhash.hashvalues
-        # 将 NumPy 数组转换为字符串
-        minhash_values_string = np.array2string(minhash_values)
-        query_task_uuid_sql = self.sql_dict.get("query_task_uuid_sql")
-        insert_sql = self.sql_dict.get("insert_sql")
-        create_tables_sql = self.sql_dict.get("create_tables_sql")
-        db_manager = SQLManager()
-        try:
-            self.conn = db_manager.create_connect()
-        except Exception as e:
-            logger.error(f"fileName: {file_name}, database connection failed: {str(e)}")
-            raise RuntimeError(82000, str(e)) from None
-        with self.conn as connection:
-            connection.execute(text(create_tables_sql))
-            result = connection.execute(text(query_task_uuid_sql), {"task_uuid": self.task_uuid}).fetchall()
-            total_count = len(result)
-            if self.has_similar_text(connection, file_name, text_minhash, total_count):
-                return ""
-            insert_data = {
+        is_duplicated = self.deduplicate_batch([input_text], [file_name])[0]
+        return "" if is_duplicated else input_text
+
+    def deduplicate_batch(self, input_texts: List[str], file_names: List[str]) -> List[bool]:
+        """批量去重：先在批内按LSH桶去重，再用一次查询获取数据库中的候选文档，最后批量写入保留文档的签名
+
+        Returns:
+            每个文档是否与已有文档相似
+        """
+        minhashes = [self.get_minhash(input_text) for input_text in input_texts]
+        band_hashes = [self.get_band_hashes(text_minhash) for text_minhash in minhashes]
+        duplicated = [False] * len(input_texts)
+
+        # 1. 批内去重，后出现的相似文档被去除
+        batch_buckets = defaultdict(list)
+        for index, hashes in enumerate(band_hashes):
+            candidates = {other for band_hash in hashes for other in batch_buckets[band_hash]}
+            for other in candidates:
+                if self.is_similar(minhashes[index], minhashes[other], file_names[index], file_names[other]):
+                    duplicated[index] = True
+                    break
+            if not duplicated[index]:
+                for band_hash in hashes:
+                    batch_buckets[band_hash].append(index)
+
+        kept = [index for index in range(len(input_texts)) if not duplicated[index]]
+        if not kept:
+            return duplicated
+
+        with self.get_connection(file_names[0]) as connection:
+            # 2. 与数据库中命中相同桶的历史文档比较
+            candidates = self.query_candidates(connection, {h for index in kept for h in band_hashes[index]})
+            for index in kept:
+                matched = {signature_id for h in band_hashes[index] for signature_id in candidates[0].get(h, [])}
+                for signature_id in matched:
+                    history_minhash, history_file_name = candidates[1][signature_id]
+                    if history_file_name == file_names[index]:
+                        continue
+                    if self.is_similar(minhashes[index], history_minhash, file_names[index], history_file_name):
+                        duplicated[index] = True
+                        break
+
+            # 3. 写入保留文档的签名和桶哈希
+            self.insert_signatures(connection, [(file_names[index], minhashes[index], band_hashes[index])
+                                                for index in range(len(input_texts)) if not duplicated[index]])
+        return duplicated
+
+    def query_candidates(self, connection, band_hashes) -> Tuple[Dict[int, List[str]], Dict[str, Tuple]]:
+        """查询命中桶哈希的历史签名
+
+        Returns:
+            (桶哈希 -> 签名id列表, 签名id -> (MinHash, 文件名))
+        """
+        bucket_to_ids = defaultdict(list)
+        signatures = {}
+        if not band_hashes:
+            return bucket_to_ids, signatures
+        query_sql = text(self.sql_dict.get("query_candidates_sql")).bindparams(
+            bindparam("band_hashes", expanding=True))
+        rows = connection.execute(query_sql, {"task_uuid": self.task_uuid,
+                                              "band_hashes": list(band_hashes)}).fetchall()
+        for band_hash, signature_id, signature, file_name_hex in rows:
+            bucket_to_ids[band_hash].append(signature_id)
+            if signature_id not in signatures:
+                minhash_obj = MinHash(num_perm=self.num_perm)
+                minhash_obj.hashvalues = np.frombuffer(bytes(signature), dtype=np.uint64)
+                signatures[signature_id] = (minhash_obj, bytes.fromhex(file_name_hex).decode('utf-8'))
+        return bucket_to_ids, signatures
+
+    def insert_signatures(self, connection, items: List[Tuple[str, MinHash, List[int]]]):
+        if not items:
+            return
+        timestamp = get_now_time('Asia/Shanghai', '%Y-%m-%d %H:%M:%S', items[0][0], "DuplicateFilesFilter")
+        signature_rows = []
+        lsh_rows = []
+        for file_name, text_minhash, hashes in items:
+            signature_id = str(uuid.uuid4())
+            signature_rows.append({
+                "id": signature_id,
                 "task_uuid": self.task_uuid,
-                "file_feature": minhash_values_string,
+                "signature": text_minhash.hashvalues.astype(np.uint64).tobytes(),
                 "file_name": file_name.encode("utf-8").hex(),
                 "timestamp": timestamp
-            }
-            connection.execute(text(insert_sql), insert_data)
-        return input_text
-
-    def has_similar_text(self, connection, file_name, text_minhash, total_count) -> bool:
-        query_sql = self.sql_dict.get("query_sql")
-        for i in range(0, total_count, self.page_size):
-            rows = connection.execute(
-                text(query_sql), {"task_uuid": self.task_uuid, "file_name": file_name, "ge": self.page_size, "le": i}).fetchall()
-            # 对应任务uuid，最后一页没有数据，跳出循环
-            if not rows:
-                break
-            # 对两个文本进行相似度比较
-            if self.determine_similar_text(rows, text_minhash, file_name):
-                return True
-        return False
-
-    def determine_similar_text(self, file_features: List, text_minhash: MinHash, file_name: str) -> bool:
-        for signature in file_features:
-            # 历史文件特征和历史文件名称
-            file_feature, file_name_history = signature[2], signature[3]
-            if not file_feature:
-                continue
-            minhash_obj = MinHash(num_perm=128)
-            minhash_obj.hashvalues = np.fromstring(file_feature.strip('[]'), dtype=np.uint64, sep=' ')
-            similarity = text_minhash.jaccard(minhash_obj)
-
-            # 移除转义字符 '\' 并将十六进制字符串转换为字节序列
-            bytes_data = bytes.fromhex(file_name_history)
-            # 解码字节序列为 UTF-8 编码的字符串
-            file_name_decoded = bytes_data.decode('utf-8')
-
-            if similarity >= self.duplicate_th:
-                logger.info(f"taskId: {self.task_uuid}, fileName: {file_name} is similar to {file_name_decoded}, "
-                            f"and the similarity is {similarity:4f}")
-                return True
+            })
+            lsh_rows.extend({"task_uuid": self.task_uuid, "band_hash": band_hash, "signature_id": signature_id}
+                            for band_hash in hashes)
+        connection.execute(text(self.sql_dict.get("insert_signature_sql")), signature_rows)
+        connection.execute(text(self.sql_dict.get("insert_lsh_sql")), lsh_rows)
+
+    def is_similar(self, text_minhash: MinHash, other_minhash: MinHash, file_name: str, other_file_name: str) -> bool:
+        similarity = text_minhash.jaccard(other_minhash)
+        if similarity >= self.duplicate_th:
+            logger.info(f"taskId: {self.task_uuid}, fileName: {file_name} is similar to {other_file_name}, "
+                        f"and the similarity is {similarity:4f}")
+            return True
         return False
 
     def execute(self, sample: Dict[str, Any]) -> Dict[str, Any]:
@@ -157,3 +224,17 @@ class DuplicateFilesFilter(Filter):
         logger.info(f"taskId: {self.task_uuid} fileName: {file_name}, "
                     f"method: DuplicateFilesFilter costs {(time.time() - start):6f} s")
         return sample
+
+    def execute_batch(self, batch: pd.DataFrame) -> pd.DataFrame:
+        start = time.time()
+        if not self.task_uuid:
+            self.task_uuid = batch["instance_id"].iloc[0] if "instance_id" in batch else ""
+        mask = batch[self.text_key].map(bool)
+        if mask.any():
+            duplicated = self.deduplicate_batch(batch.loc[mask, self.text_key].tolist(),
+                                                batch.loc[mask, self.filename_key].tolist())
+            duplicated_index = batch.index[mask][duplicated]
+            batch.loc[duplicated_index, self.text_key] = ""
+        logger.info(f"taskId: {self.task_uuid} batch size: {len(batch)}, "
+                    f"method: DuplicateFilesFilter costs {(time.time() - start):6f} s")
+        return batch
@@ -5,7 +5,6 @@
 Description: 过滤语言概率太低的文档（支持自定义阈值）
 Create: 2023/12/7 15:43
 """
-import sys
 import time
 from pathlib import Path
 from typing import Dict, Any
@@ -13,53 +12,7 @@ from typing import Dict, Any
 from loguru import logger
 
 from datamate.core.base_op import Filter
-from datamate.common.utils.aho_corasick import build_trie, add_fail_pointer
-
-sys.setrecursionlimit(5000)
-
-
-class AhoCorasic:
-    """AC自动机算法进行目标字符串搜索"""
-
-    def __init__(self, words):
-        self._root = add_fail_pointer(build_trie(words))
-
-    def search_and_count(self, text: str, special_symbols: set):
-        """
-        匹配敏感词，统计敏感词字数。
-
-        Args:
-            text: 文本
-            special_symbols: 特殊字符（需跳过）
-        Returns:
-            统计敏感词字数
-        """
-        target_count = 0
-        node = self._root
-
-        valid_len = 0  # 当前遍历的有效长度
-        for _, s in enumerate(text):
-            if s in special_symbols:  # 跳过特殊字符
-                continue
-
-            matched = True
-            while s not in node.child:  # 当node.child没有字符s
-                if node == self._root:  # 当node为root（无node.fail），有效长度归0且跳出
-                    valid_len = 0
-                    matched = False
-                    break
-                elif node.fail == self._root:  # node.fail为root场景，有效长度归0，但可继续
-                    valid_len = 0
-                node = node.fail  # 移动到失败指针节点
-            if not matched:
-                continue
-
-            node = node.child.get(s)
-            valid_len += 1
-            if node.word:  # node是单词尾字母
-                target_count += valid_len
-                valid_len = 0
-        return target_count
+from datamate.common.utils.aho_corasick import AhoCorasic
 
 
 class FileWithManySensitiveWordsFilter(Filter):
@@ -10,6 +10,8 @@ import time
 from pathlib import Path
 from typing import Dict, Any
 
+import pandas as pd
+
 from loguru import logger
 
 from datamate.core.base_op import Mapper
@@ -19,6 +21,8 @@ class ExtraSpaceCleaner(Mapper):
     """去除多余空格、多余空行，包括文档首尾空格、首尾tab
     【注意】去除多余空格前，会先将文档中所有空格规范化为\u0020
     """
+    support_batch = True
+
 
     def __init__(self, *args, **kwargs):
         # 匹配文档中非常见的unicode 空格
@@ -38,6 +42,8 @@ class ExtraSpaceCleaner(Mapper):
         self.extra_space_in_chinese_re_compile = re.compile(extra_space_in_chinese_pattern)
         self.extra_line_re_compile = re.compile(extra_line_pattern)
         self.white_space_pattern_compile = re.compile(self.white_space_pattern)
+        # 换行符两侧的空白，替换为单个换行符等价于逐行移除首尾空格
+        self.line_edge_space_re_compile = re.compile(r"[^\S\n]*\n[^\S\n]*")
 
     def execute(self, sample: Dict[str, Any]) -> Dict[str, Any]:
         start = time.time()
@@ -47,6 +53,16 @@ class ExtraSpaceCleaner(Mapper):
             f"fileName: {sample[self.filename_key]}, method: ExtraSpaceCleaner costs {time.time() - start:6f} s")
         return sample
 
+    def execute_batch(self, batch: pd.DataFrame) -> pd.DataFrame:
+        # 与_clean_extra_space步骤一致，使用pandas字符串方法对整批文本执行
+        texts = batch[self.text_key].str.replace(self.white_space_pattern_compile, '\u0020', regex=True).str.strip()
+        texts = '【' + texts.str.replace(self.line_edge_space_re_compile, "\n", regex=True) + '】'
+        texts = texts.str.replace(self.extra_space_re_compile, "\u0020", regex=True)
+        texts = texts.str.replace(self.extra_space_in_chinese_re_compile, "", regex=True)
+        texts = texts.str.replace(self.extra_line_re_compile, "\n", regex=True)
+        batch[self.text_key] = texts.str[1:-1]
+        return batch
+
     def _get_escaped_special_chars(self) -> str:
         with open(self._file_path, 'r', encoding='utf-8') as f:
             self._special_token = f.read().splitlines()
@@ -9,18 +9,22 @@ import re
 import time
 from typing import Dict, Any
 
+import pandas as pd
+
 from loguru import logger
 
 from datamate.core.base_op import Mapper
 
 
 class InvisibleCharactersCleaner(Mapper):
-    @staticmethod
-    def _invisible_characters_filter(input_data: str):
-        # 移除ASCII中不可见字符，包括0-7、14-19 21-31、127-160的字符
-        invisible_char_pattern = '[\x00-\x07|\x0E-\x13|\x15-\x1F|\x7F-\xA0]'
-        invisible_chars_re = re.compile(invisible_char_pattern)
-        return invisible_chars_re.sub('', input_data)
+    support_batch = True
+
+    # 移除ASCII中不可见字符，包括0-7、14-19 21-31、127-160的字符
+    invisible_chars_re = re.compile('[\x00-\x07|\x0E-\x13|\x15-\x1F|\x7F-\xA0]')
+
+    @classmethod
+    def _invisible_characters_filter(cls, input_data: str):
+        return cls.invisible_chars_re.sub('', input_data)
 
     def execute(self, sample: Dict[str, Any]) -> Dict[str, Any]:
         start = time.time()
@@ -29,3 +33,7 @@ class InvisibleCharactersCleaner(Mapper):
         logger.info(f"fileName: {sample[self.filename_key]}, "
                     f"method: InvisibleCharactersCleaner costs {time.time() - start:6f} s")
         return sample
+
+    def execute_batch(self, batch: pd.DataFrame) -> pd.DataFrame:
+        batch[self.text_key] = batch[self.text_key].str.replace(self.invisible_chars_re, '', regex=True)
+        return batch
@@ -5,6 +5,8 @@
 import math
 from multiprocessing import Pool, cpu_count
 
+import numpy as np
+from scipy.sparse import csr_matrix
 from six import iteritems
 from six.moves import range
 from loguru import logger
@@ -106,3 +108,74 @@ class SimilarityAlgBM25(object):
         eps = EPSILON * self.average_idf
         for word in negative_idfs_list:
             self.idf_dict[word] = eps
+
+
+def top_k_scores(scores, num_best):
+    """
+    Select the num_best highest scores as (index, score) pairs.
+    Ties keep the lower index first, the same as a stable descending sort.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    num_best = min(num_best, scores.shape[0])
+    if num_best <= 0:
+        return []
+    order = np.argsort(-scores, kind="stable")[:num_best]
+    return [(int(index), float(scores[index])) for index in order]
+
+
+class SparseSimilarityBM25(object):
+    """
+    BM25 over a sparse term-frequency matrix.
+    Term frequencies and idf values are computed once for the corpus; scores between
+    corpus documents are a sparse product of the query term counts and the BM25 weights.
+    """
+
+    def __init__(self, corpus_docs):
+        self.vocabulary = {}
+        rows, cols = [], []
+        for index, document_file in enumerate(corpus_docs):
+            for word in document_file:
+                rows.append(index)
+                cols.append(self.vocabulary.setdefault(word, len(self.vocabulary)))
+
+        self.corpus_files_size = len(corpus_docs)
+        # duplicate (row, col) entries are summed into term frequencies
+        self.term_freqs = csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, cols)),
+            shape=(self.corpus_files_size, len(self.vocabulary)),
+        )
+        self.term_freqs.sum_duplicates()
+        self.doc_len = np.asarray(self.term_freqs.sum(axis=1), dtype=np.float64).ravel()
+        self.avg_dl = float(self.doc_len.mean()) if self.corpus_files_size else 0.0
+        self.idf = self._compute_idf()
+        self.weights = self._compute_weights()
+
+    def _compute_idf(self):
+        doc_freqs = np.bincount(self.term_freqs.indices, minlength=len(self.vocabulary))
+        idf = np.log(self.corpus_files_size - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+        if idf.size:
+            # negative idf values are replaced with a fraction of the average idf
+            idf[idf < 0] = EPSILON * idf.mean()
+        return idf
+
+    def _compute_weights(self):
+        weights = self.term_freqs.copy()
+        row_index = np.repeat(np.arange(self.corpus_files_size), np.diff(weights.indptr))
+        length_norm = PARAM_K1 * (1 - PARAM_B + PARAM_B * self.doc_len / (self.avg_dl or 1.0))
+        freqs = weights.data
+        weights.data = self.idf[weights.indices] * freqs * (PARAM_K1 + 1) / (freqs + length_norm[row_index])
+        return weights
+
+    def get_sim_scores(self, document):
+        """Scores of a tokenized query against every corpus document"""
+        cols = [self.vocabulary[word] for word in document if word in self.vocabulary]
+        query = np.bincount(cols, minlength=len(self.vocabulary)).astype(np.float64)
+        return self.weights @ query
+
+    def get_corpus_scores(self, query_indexes, doc_indexes):
+        """
+        Dense score matrix of corpus documents query_indexes (rows) against
+        corpus documents doc_indexes (columns), computed as one sparse product.
+        """
+        product = self.term_freqs[query_indexes] @ self.weights[doc_indexes].T
+        return product.toarray()
@@ -7,6 +7,7 @@ __all__ = ['build_llm_prompt', 'get_json_list']
 import math
 
 import jieba
+import numpy as np
 from loguru import logger
 
 from . import graph_sim_func as bm25
@@ -59,18 +60,22 @@ class KnowledgeSlice:
 
 
 class BM25Model:
+    # 语料只分词、统计一次，之后的相似度计算复用稀疏词频与 IDF 矩阵
     def __init__(self, data_list):
         self.data_list = data_list
         self.corpus = self.load_corpus()
+        self.bm = bm25.SparseSimilarityBM25(self.corpus)
 
     def bm25_similarity(self, query, num_best=1):
         query = jieba.lcut(query)
-        bm = bm25.SimilarityAlgBM25(self.corpus)
-        scores = bm.get_sim_scores(query)
-        id_score = [(i, score) for i, score in enumerate(scores)]
-        id_score.sort(key=lambda e: e[1], reverse=True)
+        scores = self.bm.get_sim_scores(query)
 
-        return id_score[0: num_best]
+        return bm25.top_k_scores(scores, num_best)
+
+    def similarity_matrix(self, start, end):
+        # 语料中 [start, end) 切片两两之间的得分，行为查询切片
+        indexes = np.arange(start, end)
+        return self.bm.get_corpus_scores(indexes, indexes)
 
     def load_corpus(self):
         corpus = [jieba.lcut(data) for data in self.data_list]
@@ -88,18 +93,6 @@ class KnowledgeGraph:
         self.slicing_corpus = []
         self.knowledge_slice = KnowledgeSlice(self.corpus_file_string, self.chunk_size, self.overlap_size)
 
-    @staticmethod
-    def update_gallery_list(gallery_list, iterated_dict):
-        # get a gallery list which not in iterated_dict
-        gallery_list_update = []
-        gallery_list_index = []
-        for i, _ in enumerate(gallery_list):
-            if i not in iterated_dict:
-                gallery_list_update.append(gallery_list[i])
-                gallery_list_index.append(i)
-
-        return gallery_list_update, gallery_list_index
-
     def document_slicing(self):
         json_list = []
         all_slices_info = self.knowledge_slice.execute()
@@ -111,40 +104,39 @@ class KnowledgeGraph:
 
         self.slicing_corpus = json_list
 
-    def build_knowledge_relation(self, slicing_corpus_list):
+    def build_knowledge_relation(self, slicing_corpus_list, bm25_model=None, start=0):
         # knowledge relation for each paragraph
         if not self.kg_relation:
             return slicing_corpus_list
-        iterated_dict = {}
         kr_result_json_list = []
-        gallery_list = []
-        kr_relation_list = []
 
         if len(slicing_corpus_list) < 3:
             return slicing_corpus_list
 
-        for _, item in enumerate(slicing_corpus_list):
-            gallery_list.append(item['slice_data'])
+        if bm25_model is None:
+            bm25_model = BM25Model([item['slice_data'] for item in slicing_corpus_list])
+            start = 0
+        # scores[k][j]: 以切片 k 为查询时切片 j 的得分
+        scores = bm25_model.similarity_matrix(start, start + len(slicing_corpus_list))
+        iterated = np.zeros(len(slicing_corpus_list), dtype=bool)
 
         for k, item in enumerate(slicing_corpus_list):
-            if k not in iterated_dict:
-                iterated_dict[k] = 1
-                cur_gallery_list, cur_gallery_src_index = self.update_gallery_list(gallery_list, iterated_dict)
-                if len(cur_gallery_list) < 1:
-                    kr_result_json_list.append({
-                        "slice_data": item['slice_data']
-                    })
-                    return kr_result_json_list
-                bm25_class = BM25Model(cur_gallery_list)
-                id_scores = bm25_class.bm25_similarity(item['slice_data'], 1)
-                kr_result_doc = item['slice_data'] + cur_gallery_list[id_scores[0][0]]
+            if iterated[k]:
+                continue
+            iterated[k] = True
+            gallery_index = np.flatnonzero(~iterated)
+            if gallery_index.size < 1:
                 kr_result_json_list.append({
-                    "slice_data": kr_result_doc
+                    "slice_data": item['slice_data']
                 })
-                if cur_gallery_src_index[id_scores[0][0]] not in iterated_dict:
-                    iterated_dict[cur_gallery_src_index[id_scores[0][0]]] = 1
-            else:
-                continue
+                return kr_result_json_list
+            # 得分相同时取下标最小的切片
+            best_index = int(gallery_index[np.argmax(scores[k, gallery_index])])
+            kr_result_doc = item['slice_data'] + slicing_corpus_list[best_index]['slice_data']
+            kr_result_json_list.append({
+                "slice_data": kr_result_doc
+            })
+            iterated[best_index] = True
 
         return kr_result_json_list
 
@@ -154,6 +146,11 @@ class KnowledgeGraph:
         knowledge_chunk_num = math.ceil(knowledge_total_num / search_space_size)
         knowledge_relation_result = []
 
+        # 整篇文档只分词并构建一次 BM25 矩阵，各搜索窗口复用
+        bm25_model = None
+        if self.kg_relation and knowledge_total_num >= 3:
+            bm25_model = BM25Model([item['slice_data'] for item in self.slicing_corpus])
+
         for i in range(0, knowledge_chunk_num):
             cur_max_index = (i + 1) * search_space_size
             if cur_max_index > knowledge_total_num:
@@ -161,7 +158,8 @@ class KnowledgeGraph:
             else:
                 corpus_list = self.slicing_corpus[i * search_space_size:cur_max_index]
             # to do knowledge relation
-            cur_knowledge_relation_result = self.build_knowledge_relation(corpus_list)
+            cur_knowledge_relation_result = self.build_knowledge_relation(
+                corpus_list, bm25_model, i * search_space_size)
             knowledge_relation_result.extend(cur_knowledge_relation_result)
 
         return knowledge_relation_result
@@ -9,12 +9,16 @@ import re
 import time
 from typing import Dict, Any
 
+import pandas as pd
+
 from loguru import logger
 
 from datamate.core.base_op import Mapper
 
 
 class AnonymizedPhoneNumber(Mapper):
+    support_batch = True
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.phone_re_compile = self.get_phone_re_compile()
@@ -43,6 +47,11 @@ class AnonymizedPhoneNumber(Mapper):
             f"fileName: {sample[self.filename_key]}, method: PhoneNumberCleaner costs {time.time() - start:6f} s")
         return sample
 
+    def execute_batch(self, batch: pd.DataFrame) -> pd.DataFrame:
+        texts = '【' + batch[self.text_key] + '】'
+        batch[self.text_key] = texts.str.replace(self.phone_re_compile, "<tel>", regex=True).str[1:-1]
+        return batch
+
     def _phone_number_filter(self, input_data: str):
         """ 电话号码匿名化"""
         # 正则匹配：电话号码前需匹配不是数字的字符串
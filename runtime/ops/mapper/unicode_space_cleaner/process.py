@@ -9,17 +9,23 @@ import re
 import time
 from typing import Dict, Any
 
+import pandas as pd
+
 from loguru import logger
 
 from datamate.core.base_op import Mapper
 
 
 class UnicodeSpaceCleaner(Mapper):
+    support_batch = True
+
+    white_space_re = re.compile(
+        '[\u00A0 \u1680 \u2000-\u200D \u2028-\u2029 \u202F \u205F \u3000 \u180E \u2060 \uFEFF]')
+
     @classmethod
     def _clean_unicode_space(cls, input_data: str):
         """将文档中不同的 unicode 空格，如 u2008，转换为正常空格（半角空格）"""
-        white_space_pattern = '[\u00A0 \u1680 \u2000-\u200D \u2028-\u2029 \u202F \u205F \u3000 \u180E \u2060 \uFEFF]'
-        return re.compile(white_space_pattern).sub('\u0020', input_data)
+        return cls.white_space_re.sub('\u0020', input_data)
 
     def execute(self, sample: Dict[str, Any]) -> Dict[str, Any]:
         start = time.time()
@@ -28,3 +34,7 @@ class UnicodeSpaceCleaner(Mapper):
         logger.info(
             f"fileName: {sample[self.filename_key]}, method: UnicodeSpaceCleaner costs {time.time() - start:6f} s")
         return sample
+
+    def execute_batch(self, batch: pd.DataFrame) -> pd.DataFrame:
+        batch[self.text_key] = batch[self.text_key].str.replace(self.white_space_re, '\u0020', regex=True)
+        return batch
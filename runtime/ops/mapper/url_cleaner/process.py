@@ -9,6 +9,8 @@ import re
 import time
 from typing import Dict, Any
 
+import pandas as pd
+
 from loguru import logger
 
 from datamate.core.base_op import Mapper
@@ -16,6 +18,7 @@ from datamate.core.base_op import Mapper
 
 class AnonymizedUrlCleaner(Mapper):
     """将文档中的网址匿名化"""
+    support_batch = True
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -31,6 +34,11 @@ class AnonymizedUrlCleaner(Mapper):
         logger.info(f"fileName: {sample[self.filename_key]}, method: UrlCleaner costs {time.time() - start:6f} s")
         return sample
 
+    def execute_batch(self, batch: pd.DataFrame) -> pd.DataFrame:
+        texts = '【' + batch[self.text_key] + '】'
+        batch[self.text_key] = texts.str.replace(self.url_re_compile, "<url>", regex=True).str[1:-1]
+        return batch
+
     def _url_filter(self, input_data: str):
         input_data = ''.join(['【', input_data, '】'])
         text = self.url_re_compile.sub("<url>", input_data)
@@ -1,5 +1,25 @@
 # -- encoding: utf-8 --
+"""
+AC自动机。
+
+自动机以扁平数组表示（goto转移表、fail指针、输出表），构建一次后序列化到本地磁盘，
+同一节点上的其他actor直接以内存映射方式加载，无需重复构建；匹配时直接在数组上向量化二分查找转移。
+"""
+import hashlib
+import os
+import shutil
+import tempfile
 from collections import deque
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+from loguru import logger
+
+# 字符编码上限，goto转移表的键为 state * CHAR_LIMIT + ord(char)
+CHAR_LIMIT = 0x110000
+# 缓存格式版本，数组结构变化时递增，避免加载旧格式的缓存
+CACHE_FORMAT_VERSION = 2
+CACHE_DIR = os.getenv("AC_AUTOMATON_CACHE_DIR", os.path.join(tempfile.gettempdir(), "datamate", "ac_automaton"))
 
 
 class TrieNode:
@@ -10,13 +30,214 @@ class TrieNode:
         self.word = None
 
 
+class ArrayAutomaton:
+    """
+    扁平数组表示的AC自动机，匹配时直接在（可内存映射的）数组上查找，不展开为Python对象。
+
+    goto_keys/goto_values: 按键排序的转移表，键为 state * CHAR_LIMIT + ord(char)
+    fail: 每个状态的失败指针
+    word_lengths: 每个状态自身结尾的敏感词长度，不是词尾为0
+    out_offsets/out_lengths: CSR格式的输出表，记录每个状态（含后缀链接）结尾的敏感词长度
+    """
+    ARRAY_NAMES = ("goto_keys", "goto_values", "fail", "word_lengths", "out_offsets", "out_lengths")
+
+    def __init__(self, goto_keys, goto_values, fail, word_lengths, out_offsets, out_lengths):
+        self.goto_keys = goto_keys
+        self.goto_values = goto_values
+        self.fail = fail
+        self.word_lengths = word_lengths
+        self.out_offsets = out_offsets
+        self.out_lengths = out_lengths
+
+    @classmethod
+    def build(cls, words: Iterable[str]) -> "ArrayAutomaton":
+        goto = {}
+        word_len = [0]
+        for word in words:
+            state = 0
+            for char in word:
+                key = state * CHAR_LIMIT + ord(char)
+                next_state = goto.get(key)
+                if next_state is None:
+                    next_state = len(word_len)
+                    goto[key] = next_state
+                    word_len.append(0)
+                state = next_state
+            word_len[state] = len(word)
+
+        children = [[] for _ in word_len]
+        for key, child in goto.items():
+            children[key // CHAR_LIMIT].append((key % CHAR_LIMIT, child))
+
+        # 按层遍历构建失败指针和输出表
+        fail = [0] * len(word_len)
+        outputs = [[] for _ in word_len]
+        queue = deque([0])
+        while queue:
+            state = queue.popleft()
+            if word_len[state]:
+                outputs[state].append(word_len[state])
+            outputs[state].extend(outputs[fail[state]])
+            for code, child in children[state]:
+                queue.append(child)
+                if not state:
+                    continue
+                fail_state = fail[state]
+                while fail_state and fail_state * CHAR_LIMIT + code not in goto:
+                    fail_state = fail[fail_state]
+                fail[child] = goto.get(fail_state * CHAR_LIMIT + code, 0)
+
+        keys = np.fromiter(goto.keys(), dtype=np.int64, count=len(goto))
+        values = np.fromiter(goto.values(), dtype=np.int32, count=len(goto))
+        order = np.argsort(keys)
+        out_offsets = np.zeros(len(word_len) + 1, dtype=np.int32)
+        out_offsets[1:] = np.cumsum([len(output) for output in outputs])
+        out_lengths = np.fromiter((length for output in outputs for length in output), dtype=np.int32)
+        return cls(keys[order], values[order], np.array(fail, dtype=np.int32), np.array(word_len, dtype=np.int32),
+                   out_offsets, out_lengths)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAY_NAMES:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, path: str) -> "ArrayAutomaton":
+        return cls(*(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in cls.ARRAY_NAMES))
+
+    def _find(self, keys: np.ndarray) -> np.ndarray:
+        """在排序的转移表上二分查找，返回每个键对应的下一状态，不存在的转移为-1"""
+        if not len(self.goto_keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        index = np.minimum(np.searchsorted(self.goto_keys, keys), len(self.goto_keys) - 1)
+        return np.where(self.goto_keys[index] == keys, self.goto_values[index].astype(np.int64), -1)
+
+    def _scan(self, text: str, special_symbols: set) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        计算跳过特殊字符后每个位置的自动机状态。
+
+        AC自动机在位置i的状态即以i结尾、且为前缀树路径的最长后缀，因此按长度逐层向量化查找：
+        第d层由第d-1层在前一位置的状态读入当前字符得到，命中的更长路径覆盖较短路径。
+
+        Returns:
+            (非特殊字符在原文本中的下标, 各位置的状态, 各位置状态的深度)
+        """
+        codes = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32).astype(np.int64)
+        positions = np.arange(len(codes))
+        special_codes = [ord(symbol) for symbol in special_symbols if len(symbol) == 1]
+        if special_codes:
+            keep = ~np.isin(codes, special_codes)
+            codes, positions = codes[keep], positions[keep]
+
+        states = np.zeros(len(codes), dtype=np.int64)
+        depths = np.zeros(len(codes), dtype=np.int32)
+        index = np.arange(len(codes))
+        layer = self._find(codes)
+        depth = 1
+        while True:
+            hit = layer >= 0
+            if not hit.any():
+                break
+            index, layer = index[hit], layer[hit]
+            states[index] = layer
+            depths[index] = depth
+            depth += 1
+            # 以index结尾的路径读入下一个字符，延长为以index + 1结尾的路径
+            has_next = index + 1 < len(codes)
+            index = index[has_next] + 1
+            layer = self._find(layer[has_next] * CHAR_LIMIT + codes[index])
+        return positions, states, depths
+
+    def iter(self, text: str, special_symbols: set = frozenset()) -> Iterator[Tuple[int, int]]:
+        """遍历文本（跳过特殊字符），返回(结尾下标, 敏感词长度)"""
+        positions, states, _ = self._scan(text, special_symbols)
+        starts = np.asarray(self.out_offsets[states])
+        ends = np.asarray(self.out_offsets[states + 1])
+        for i in np.nonzero(ends > starts)[0].tolist():
+            for length in self.out_lengths[starts[i]:ends[i]].tolist():
+                yield int(positions[i]), length
+
+    def count_greedy(self, text: str, special_symbols: set = frozenset()) -> int:
+        """
+        贪心统计敏感词字数（跳过特殊字符）：到达词尾状态即计入当前有效长度并清零，
+        匹配片段互不重叠，与原前缀树实现的统计方式一致
+        """
+        _, states, depths = self._scan(text, special_symbols)
+        is_word = (np.asarray(self.word_lengths[states]) > 0).tolist()
+        count = valid_len = previous_depth = 0
+        for depth, word_end in zip(depths.tolist(), is_word):
+            # 未匹配，或经失败指针回退到根状态后重新匹配时，有效长度清零
+            if not depth or (depth == 1 and previous_depth):
+                valid_len = 0
+            previous_depth = depth
+            if not depth:
+                continue
+            valid_len += 1
+            if word_end:
+                count += valid_len
+                valid_len = 0
+        return count
+
+
+def load_automaton(words: Iterable[str], cache_dir: str = CACHE_DIR):
+    """
+    获取词表对应的自动机：按词表内容哈希查找磁盘缓存，未命中则构建并写入缓存。
+
+    Args:
+        words: 敏感词列表
+        cache_dir: 缓存目录
+    Returns:
+        ArrayAutomaton
+    """
+    words = sorted({word for word in words if word})
+    digest = hashlib.sha256("\n".join([str(CACHE_FORMAT_VERSION)] + words).encode("utf-8")).hexdigest()
+    path = os.path.join(cache_dir, digest)
+    if os.path.isdir(path):
+        try:
+            return ArrayAutomaton.load(path)
+        except Exception as e:
+            logger.warning(f"Load AC automaton cache {path} failed, rebuild it: {e}")
+
+    automaton = ArrayAutomaton.build(words)
+    tmp_path = None
+    try:
+        # 先写临时目录再原子重命名，避免并发actor读到写了一半的缓存
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=cache_dir)
+        automaton.save(tmp_path)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        if not os.path.isdir(path):
+            logger.warning(f"Save AC automaton cache {path} failed: {e}")
+        if tmp_path:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    return automaton
+
+
 class AhoCorasic:
     """AC自动机算法进行目标字符串搜索"""
 
-    def __init__(self, words):
-        self._root = add_fail_pointer(build_trie(words))
+    def __init__(self, words, cache_dir: str = CACHE_DIR):
+        self._automaton = load_automaton(words, cache_dir)
 
-    def search(self, text: str, special_symbols: set):
+    def iter_matches(self, text: str, special_symbols: set) -> Iterator[Tuple[int, int]]:
+        """
+        匹配敏感词，匹配时跳过特殊字符。
+
+        Returns:
+            敏感词在原文本中的[起始下标, 结束下标)
+        """
+        for end, length in self._automaton.iter(text, special_symbols):
+            # 从结尾向前数出length个非特殊字符，得到起始下标
+            start = end
+            length -= 1
+            while length:
+                start -= 1
+                if text[start] not in special_symbols:
+                    length -= 1
+            yield start, end + 1
+
+    def search(self, text: str, special_symbols: set) -> List[str]:
         """
         匹配敏感词。
 
@@ -26,35 +247,19 @@ class AhoCorasic:
         Returns:
             匹配成功的字符串列表
         """
-        seq_list = []
-        node = self._root
-
-        valid_len = 0  # 当前遍历的有效长度
-        for i, s in enumerate(text):
-            if s in special_symbols:  # 跳过特殊字符
-                if valid_len != 0:
-                    valid_len += 1
-                continue
+        return list({text[start:end] for start, end in self.iter_matches(text, special_symbols)})
 
-            matched = True
-            while s not in node.child:  # 当node.child没有字符s
-                if node == self._root:  # 当node为root（无node.fail），有效长度归0且跳出
-                    valid_len = 0
-                    matched = False
-                    break
-                elif node.fail == self._root:  # node.fail为root场景，有效长度归0，但可继续
-                    valid_len = 0
-                node = node.fail  # 移动到失败指针节点
-            if not matched:
-                continue
+    def search_and_count(self, text: str, special_symbols: set) -> int:
+        """
+        匹配敏感词，统计敏感词字数。
 
-            node = node.child.get(s)
-            valid_len += 1
-            if node.word:  # node是单词尾字母
-                sensitive_word = text[i - valid_len + 1:i + 1]
-                seq_list.append(sensitive_word)
-        seq_list = list(set(seq_list))
-        return seq_list
+        Args:
+            text: 文本
+            special_symbols: 特殊字符（需跳过）
+        Returns:
+            统计敏感词字数
+        """
+        return self._automaton.count_greedy(text, special_symbols)
 
 
 def build_trie(words: list):
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+"""
+去重集合后端。
+
+算子通过check_and_add批量判断指纹是否已存在并写入新指纹，支持以下后端：
+    sql: 基于数据库主键冲突判断（默认），跨actor、跨进程共享
+    ray: 基于Ray命名actor持有的内存集合，跨actor共享，任务结束后由算子的release_task释放
+    memory: 进程内集合，仅适用于单actor调试
+"""
+
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List
+
+import ray
+from loguru import logger
+from sqlalchemy import text
+
+from datamate.sql_manager.sql_manager import SQLManager
+
+DEDUP_ACTOR_PREFIX = "datamate_dedup_set_"
+DEDUP_ACTOR_NAMESPACE = "datamate"
+
+
+class DedupSetBackend(ABC):
+    """去重集合后端基类，统计吞吐指标"""
+
+    def __init__(self, task_uuid: str):
+        self.task_uuid = task_uuid
+        self.metrics = {"checked": 0, "duplicated": 0, "calls": 0, "latency": 0.0}
+
+    def check_and_add(self, keys: List[str], names: List[str] = None) -> List[bool]:
+        """
+        批量判断指纹是否已存在，不存在的指纹写入集合
+        :param keys: 指纹列表
+        :param names: 指纹对应的文件名列表
+        :return: 每个指纹是否重复（批内后出现的相同指纹也视为重复）
+        """
+        if not keys:
+            return []
+        names = names or [""] * len(keys)
+        start = time.time()
+        duplicated = self._check_and_add(keys, names)
+        self.metrics["calls"] += 1
+        self.metrics["checked"] += len(keys)
+        self.metrics["duplicated"] += sum(duplicated)
+        self.metrics["latency"] += time.time() - start
+        return duplicated
+
+    def get_throughput(self) -> float:
+        """每秒检查的指纹数"""
+        if not self.metrics["latency"]:
+            return 0.0
+        return self.metrics["checked"] / self.metrics["latency"]
+
+    def log_metrics(self):
+        logger.info(f"taskId: {self.task_uuid}, dedup backend: {type(self).__name__}, "
+                    f"checked: {self.metrics['checked']}, duplicated: {self.metrics['duplicated']}, "
+                    f"calls: {self.metrics['calls']}, throughput: {self.get_throughput():.2f} keys/s")
+
+    @abstractmethod
+    def _check_and_add(self, keys: List[str], names: List[str]) -> List[bool]:
+        pass
+
+
+class MemoryDedupSet(DedupSetBackend):
+    """进程内去重集合"""
+
+    def __init__(self, task_uuid: str):
+        super().__init__(task_uuid)
+        self.keys = set()
+
+    def _check_and_add(self, keys: List[str], names: List[str]) -> List[bool]:
+        duplicated = []
+        for key in keys:
+            duplicated.append(key in self.keys)
+            self.keys.add(key)
+        return duplicated
+
+
+class SqlDedupSet(DedupSetBackend):
+    """基于数据库的去重集合，依赖(task_uuid, file_feature)主键冲突原子地判断并写入"""
+
+    def __init__(self, task_uuid: str, table_name: str):
+        super().__init__(task_uuid)
+        self.table_name = table_name
+        self.tables_created = False
+
+    def _check_and_add(self, keys: List[str], names: List[str]) -> List[bool]:
+        # 批内去重，保留首次出现的指纹
+        first_index: Dict[str, int] = {}
+        for index, key in enumerate(keys):
+            first_index.setdefault(key, index)
+        unique_keys = list(first_index.keys())
+        unique_names = [names[first_index[key]] for key in unique_keys]
+
+        insert_sql = text(
+            f"INSERT INTO {self.table_name} (task_uuid, file_feature, file_name, timestamp) "
+            f"SELECT :task_uuid, feature, name, now() "
+            f"FROM unnest(CAST(:features AS TEXT[]), CAST(:names AS TEXT[])) AS t(feature, name) "
+            f"ON CONFLICT (task_uuid, file_feature) DO NOTHING RETURNING file_feature"
+        )
+        with SQLManager.create_connect() as connection:
+            if not self.tables_created:
+                connection.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {self.table_name} (task_uuid VARCHAR(255), file_feature TEXT, "
+                    f"file_name TEXT, timestamp TIMESTAMP, PRIMARY KEY (task_uuid, file_feature));"
+                ))
+                self.tables_created = True
+            rows = connection.execute(insert_sql, {"task_uuid": self.task_uuid,
+                                                   "features": unique_keys,
+                                                   "names": unique_names}).fetchall()
+        inserted = {row[0] for row in rows}
+        return [not (key in inserted and first_index[key] == index) for index, key in enumerate(keys)]
+
+
+@ray.remote(num_cpus=0, max_restarts=0)
+class DedupSetActor:
+    """持有去重集合的Ray actor"""
+
+    def __init__(self):
+        self.keys = set()
+
+    def check_and_add(self, keys: List[str]) -> List[bool]:
+        duplicated = []
+        for key in keys:
+            duplicated.append(key in self.keys)
+            self.keys.add(key)
+        return duplicated
+
+
+class RayDedupSet(DedupSetBackend):
+    """基于Ray命名actor的去重集合，同一任务的所有算子actor共享一个集合"""
+
+    def __init__(self, task_uuid: str):
+        super().__init__(task_uuid)
+        self.actor = DedupSetActor.options(name=DEDUP_ACTOR_PREFIX + task_uuid,
+                                           namespace=DEDUP_ACTOR_NAMESPACE,
+                                           lifetime="detached",
+                                           get_if_exists=True).remote()
+
+    def _check_and_add(self, keys: List[str], names: List[str]) -> List[bool]:
+        return ray.get(self.actor.check_and_add.remote(keys))
+
+
+def create_dedup_set(backend: str, task_uuid: str, table_name: str) -> DedupSetBackend:
+    """
+    创建去重集合后端
+    :param backend: 后端类型，sql/ray/memory
+    :param task_uuid: 任务唯一标识
+    :param table_name: sql后端使用的表名
+    """
+    if backend == "ray":
+        return RayDedupSet(task_uuid)
+    if backend == "memory":
+        return MemoryDedupSet(task_uuid)
+    if backend != "sql":
+        logger.warning(f"Unknown dedup backend: {backend}, use sql backend instead.")
+    return SqlDedupSet(task_uuid, table_name)
+
+
+def release_dedup_set(task_uuid: str):
+    """释放任务对应的Ray去重集合actor"""
+    try:
+        actor = ray.get_actor(DEDUP_ACTOR_PREFIX + task_uuid, namespace=DEDUP_ACTOR_NAMESPACE)
+    except ValueError:
+        return
+    ray.kill(actor)
@@ -1,27 +1,45 @@
 import os
+import shutil
+import socket
 import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
 from loguru import logger
 import mimetypes
 from datetime import datetime
 
 from datamate.sql_manager.persistence_atction import TaskInfoPersistence
 
+# 算子写出文件时在导出目录下记录写出路径的清单目录，扫描时跳过
+MANIFEST_DIR = ".datamate_manifest"
+
+_manifest_lock = Lock()
+_manifest_dirs = set()
+
+
+def record_written_path(export_path, file_path):
+    """
+    记录本进程写入导出目录的文件路径，供增量扫描使用。
+    每个进程写一个清单文件，避免多个actor并发写同一文件；每次写入后关闭文件，不长期占用句柄。
+    """
+    manifest_dir = os.path.join(os.path.abspath(export_path), MANIFEST_DIR)
+    manifest_path = os.path.join(manifest_dir, f"{socket.gethostname()}_{os.getpid()}.lst")
+    try:
+        with _manifest_lock:
+            if manifest_dir not in _manifest_dirs:
+                os.makedirs(manifest_dir, exist_ok=True)
+                _manifest_dirs.add(manifest_dir)
+            with open(manifest_path, "a", encoding="utf-8") as manifest:
+                manifest.write(f"{file_path}\n")
+    except OSError as e:
+        logger.warning(f"Record written path {file_path} failed: {e}")
+
+
 class FileScanner:
-    def __init__(self, dataset_id):
+    def __init__(self, dataset_id, max_workers=None):
         self.dataset_id = dataset_id
         self.persistence = TaskInfoPersistence()
-
-    def get_existing_paths(self):
-        """
-        优化点1：一次性获取所有已存在的文件路径，存为 Set
-        """
-        logger.info("Fetching existing files from DB...")
-        existing_files = self.persistence.query_existing_files(self.dataset_id)
-        # fetchall 返回的是 list of tuples [('path1',), ('path2',)]
-        # 我们将其转换为 set {'path1', 'path2'} 以实现 O(1) 查找速度
-        existing_set = {row[0] for row in existing_files}
-        logger.info(f"Found {len(existing_set)} existing files in DB.")
-        return existing_set
+        self.max_workers = max_workers or int(os.getenv("FILE_SCAN_WORKERS", str(min(32, (os.cpu_count() or 1) * 4))))
 
     def prepare_file_data(self, sample, file_id):
         """
@@ -56,51 +74,117 @@ class FileScanner:
             "updated_at": create_time
         }
 
-    def scan_and_process(self, root_dir, batch_size=5000):
-        logger.info(f"Scanning directory: {root_dir}")
+    def build_sample(self, full_path, file_name, stats):
+        f_type, _ = mimetypes.guess_type(full_path)
+        if not f_type:
+            f_type = os.path.splitext(file_name)[1]
+        return {
+            "fileSize": stats.st_size,
+            "fileType": f_type,
+            "fileName": file_name,
+            "dataset_id": self.dataset_id,
+            "filePath": full_path
+        }
 
-        # 1. 内存中收集扫描到的所有文件 {path: metadata_dict}
+    def scan_dir(self, dir_path):
+        """扫描单层目录，返回该层文件的元数据和子目录列表"""
+        samples = []
+        sub_dirs = []
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name != MANIFEST_DIR:
+                                sub_dirs.append(entry.path)
+                            continue
+                        # 与os.walk一致，不进入指向目录的符号链接
+                        if entry.is_dir():
+                            continue
+                        if entry.name.startswith('.'):
+                            continue
+                        samples.append(self.build_sample(entry.path, entry.name, entry.stat()))
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"Scan directory {dir_path} failed: {e}")
+        return samples, sub_dirs
+
+    def scan_tree(self, root_dir):
+        """线程池并行扫描目录树，每个子目录作为一个任务提交"""
         scanned_files_map = {}
-
-        for root, dirs, files in os.walk(root_dir):
-            for file in files:
-                if file.startswith('.'): continue
-
-                full_path = os.path.join(root, file)
-
-                # 预先收集元数据
-                try:
-                    stats = os.stat(full_path)
-                    f_type, _ = mimetypes.guess_type(full_path)
-                    if not f_type: f_type = os.path.splitext(file)[1]
-
-                    # 构造 sample 格式
-                    scanned_files_map[full_path] = {
-                        "fileSize": stats.st_size,
-                        "fileType": f_type,
-                        "fileName": file,
-                        "dataset_id": self.dataset_id,
-                        "filePath": full_path
-                    }
-                except OSError:
-                    continue
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = {pool.submit(self.scan_dir, root_dir)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    samples, sub_dirs = future.result()
+                    for sample in samples:
+                        scanned_files_map[sample["filePath"]] = sample
+                    pending.update(pool.submit(self.scan_dir, sub_dir) for sub_dir in sub_dirs)
+        return scanned_files_map
+
+    def stat_paths(self, paths):
+        """增量模式：只获取指定文件的元数据"""
+        def stat_path(path):
+            try:
+                return self.build_sample(path, os.path.basename(path), os.stat(path))
+            except OSError:
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return {sample["filePath"]: sample for sample in pool.map(stat_path, paths) if sample}
+
+    @staticmethod
+    def read_manifest(root_dir):
+        """读取算子记录的写出路径，清单不存在时返回None"""
+        manifest_dir = os.path.join(os.path.abspath(root_dir), MANIFEST_DIR)
+        if not os.path.isdir(manifest_dir):
+            return None
+        paths = set()
+        for name in os.listdir(manifest_dir):
+            with open(os.path.join(manifest_dir, name), "r", encoding="utf-8") as f:
+                paths.update(line.rstrip("\n") for line in f if line.strip())
+        return paths
+
+    def scan_and_process(self, root_dir, batch_size=5000, incremental=False):
+        """
+        扫描导出目录并将数据库中不存在的文件写入数据集。
+        应在各actor的执行结果落库后调用；插入语句对(dataset_id, file_path)冲突不做处理，重复扫描不会产生重复记录
+        :param root_dir: 导出目录
+        :param batch_size: 每批插入的行数
+        :param incremental: 为True时只扫描本次任务记录的写出文件，没有记录时退化为全量扫描
+        """
+        written_paths = self.read_manifest(root_dir) if incremental else None
+        if written_paths is not None:
+            logger.info(f"Scanning {len(written_paths)} files written by current job in: {root_dir}")
+            scanned_files_map = self.stat_paths(written_paths)
+        else:
+            logger.info(f"Scanning directory: {root_dir}")
+            scanned_files_map = self.scan_tree(root_dir)
 
         logger.info(f"Scanned {len(scanned_files_map)} files on disk.")
 
-        # 2. 获取数据库中已有的路径
-        existing_paths = self.get_existing_paths()
-
-        # 3. 内存做差集 (Set Difference) -> 找出需要新增的路径
-        scanned_paths_set = set(scanned_files_map.keys())
-        new_paths = list(scanned_paths_set - existing_paths)
+        # 分页读取数据库中已有的路径，逐页剔除，避免一次性加载全部路径
+        existing_count = 0
+        for existing_paths in self.persistence.query_existing_files(self.dataset_id):
+            existing_count += len(existing_paths)
+            for path in existing_paths:
+                scanned_files_map.pop(path, None)
+        logger.info(f"Found {existing_count} existing files in DB.")
 
+        new_paths = list(scanned_files_map.keys())
         logger.info(f"Need to insert {len(new_paths)} new files.")
 
-        if not new_paths:
+        if new_paths:
+            self.insert_files(scanned_files_map, new_paths, batch_size)
+        else:
             logger.info("No new files to insert.")
-            return
 
-        # 4. 准备批量插入的数据
+        if written_paths is not None:
+            shutil.rmtree(os.path.join(os.path.abspath(root_dir), MANIFEST_DIR), ignore_errors=True)
+
+    def insert_files(self, scanned_files_map, new_paths, batch_size):
         insert_batch = []
         total_inserted = 0
 
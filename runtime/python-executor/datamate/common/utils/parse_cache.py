@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+"""
+文件解析结果缓存。
+
+以文件路径、修改时间和文件大小作为内容地址，将unstructured等耗时解析得到的文本缓存到本地磁盘，
+首个算子失败重试或流水线重跑时直接命中缓存，无需重复解析。缓存总大小超过上限时按最近访问时间淘汰。
+各worker进程的命中指标上报到driver创建的汇总actor，任务结束后由driver统一输出。
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+from threading import Lock
+from typing import Callable, Dict, Optional
+
+import ray
+from loguru import logger
+
+PARSE_CACHE_METRICS_ACTOR = "datamate_parse_cache_metrics"
+
+
+@ray.remote(num_cpus=0, max_restarts=0)
+class ParseCacheMetricsActor:
+    """汇总各worker进程上报的解析缓存指标"""
+
+    def __init__(self):
+        self.metrics = {"hits": 0, "misses": 0, "evictions": 0, "parse_time": 0.0}
+
+    def add(self, metrics: Dict[str, float]):
+        for key, value in metrics.items():
+            self.metrics[key] += value
+
+    def get(self) -> Dict[str, float]:
+        return self.metrics
+
+
+class ParseCache:
+    """
+    进程级的磁盘解析缓存，同一节点上的actor共享缓存目录。
+
+    FILE_PARSE_CACHE_DIR: 缓存目录
+    FILE_PARSE_CACHE_MAX_BYTES: 缓存总大小上限，默认2GB，为0时关闭缓存
+    FILE_PARSE_CACHE_EVICT_INTERVAL: 写入后检查目录总大小的最小间隔秒数，默认60秒
+
+    缓存目录由多个进程共享，淘汰按目录的实际总大小进行：进程创建缓存时检查一次，
+    之后写入量达到上限的十分之一或距上次检查超过间隔时再检查，短生命周期的actor也能触发淘汰
+    """
+    _instance = None
+    _instance_lock = Lock()
+    _metrics_collector = None
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = None):
+        self.cache_dir = cache_dir or os.getenv(
+            "FILE_PARSE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "datamate", "parse_cache"))
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv("FILE_PARSE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+        self.enabled = self.max_bytes > 0
+        self.metrics = {"hits": 0, "misses": 0, "evictions": 0, "parse_time": 0.0}
+        self._reported = dict.fromkeys(self.metrics, 0)
+        self._metrics_actor = None
+        self._written_bytes = 0
+        self.evict_interval = float(os.getenv("FILE_PARSE_CACHE_EVICT_INTERVAL", "60"))
+        self._last_evict = time.monotonic()
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._evict()
+
+    @classmethod
+    def get_instance(cls) -> "ParseCache":
+        if cls._instance is not None:
+            return cls._instance
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def start_metrics_collector(cls):
+        """在driver上创建汇总actor，actor名称在当前job的命名空间内；driver持有句柄，避免actor被回收"""
+        cls._metrics_collector = ParseCacheMetricsActor.options(name=PARSE_CACHE_METRICS_ACTOR,
+                                                                get_if_exists=True).remote()
+
+    @classmethod
+    def report_instance_metrics(cls):
+        """将当前进程自上次上报以来新增的指标上报给汇总actor（未启动汇总时不做任何操作）"""
+        cache = cls._instance
+        if cache is None:
+            return
+        delta = {key: value - cache._reported[key] for key, value in cache.metrics.items()}
+        if not any(delta.values()):
+            return
+        if cache._metrics_actor is None:
+            try:
+                cache._metrics_actor = ray.get_actor(PARSE_CACHE_METRICS_ACTOR)
+            except ValueError:
+                return
+        ray.get(cache._metrics_actor.add.remote(delta))
+        cache._reported = dict(cache.metrics)
+
+    @classmethod
+    def log_collected_metrics(cls):
+        """在driver上输出各worker汇总的缓存命中情况，并释放汇总actor"""
+        actor = cls._metrics_collector
+        if actor is None:
+            return
+        cls._metrics_collector = None
+        metrics = ray.get(actor.get.remote())
+        if metrics["hits"] + metrics["misses"]:
+            cls.log_metrics(metrics)
+        ray.kill(actor)
+
+    @staticmethod
+    def make_key(filepath: str, filetype: str) -> Optional[str]:
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return None
+        raw = f"{os.path.abspath(filepath)}\0{stat.st_mtime_ns}\0{stat.st_size}\0{filetype}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_text(self, filepath: str, filetype: str, parse_fn: Callable[[str], str]) -> str:
+        """
+        获取文件解析后的文本，未命中时调用parse_fn解析并写入缓存
+        :param filepath: 文件路径
+        :param filetype: 文件类型
+        :param parse_fn: 解析函数，入参为文件路径
+        """
+        key = self.make_key(filepath, filetype) if self.enabled else None
+        if key is not None:
+            text = self._read(key)
+            if text is not None:
+                self.metrics["hits"] += 1
+                return text
+
+        self.metrics["misses"] += 1
+        start = time.time()
+        text = parse_fn(filepath)
+        self.metrics["parse_time"] += time.time() - start
+        if key is not None:
+            self._write(key, text)
+        return text
+
+    @staticmethod
+    def log_metrics(metrics: Dict[str, float]):
+        total = metrics["hits"] + metrics["misses"]
+        hit_rate = metrics["hits"] / total if total else 0
+        logger.info(f"Parse cache hits: {metrics['hits']}, misses: {metrics['misses']}, "
+                    f"hit rate: {hit_rate:.2%}, evictions: {metrics['evictions']}, "
+                    f"parse time: {metrics['parse_time']:.6f} s")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.txt")
+
+    def _read(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            # 更新访问时间，用于LRU淘汰
+            os.utime(path)
+        except OSError:
+            return None
+        return content.decode("utf-8")
+
+    def _write(self, key: str, text: str):
+        content = text.encode("utf-8")
+        try:
+            # 先写临时文件再原子重命名，避免其他actor读到写了一半的缓存
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Write parse cache failed: {e}")
+            return
+        self._written_bytes += len(content)
+        if (self._written_bytes >= self.max_bytes // 10
+                or time.monotonic() - self._last_evict >= self.evict_interval):
+            self._written_bytes = 0
+            self._evict()
+
+    def _evict(self):
+        """按缓存目录的实际总大小淘汰，超过上限时删除最久未访问的缓存"""
+        self._last_evict = time.monotonic()
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".txt"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return
+
+        # 淘汰最久未访问的缓存，直到总大小降到上限的80%
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes * 0.8:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.metrics["evictions"] += 1
@@ -6,20 +6,26 @@ import os
 import time
 import traceback
 import uuid
+from contextlib import contextmanager
 from pathlib import Path
 from typing import List, Dict, Any, Tuple
 
 import cv2
 import numpy as np
+import pandas as pd
+import pyarrow as pa
 from loguru import logger
 from unstructured.partition.auto import partition
 
 from datamate.common.error_code import ERROR_CODE_TABLE, UNKNOWN_ERROR_CODE
+from datamate.common.utils.file_scanner import record_written_path
 from datamate.common.utils.llm_request import LlmReq
+from datamate.common.utils.parse_cache import ParseCache
 from datamate.common.utils.registry import Registry
 from datamate.common.utils import check_valid_path
 from datamate.core.constant import Fields
 from datamate.sql_manager.persistence_atction import TaskInfoPersistence
+from datamate.sql_manager.persistence_buffer import PersistenceBuffer
 
 OPERATORS = Registry("Operators")
 
@@ -27,6 +33,17 @@ FAILED_STATUS = "FAILED"
 SUCCESS_STATUS = "COMPLETED"
 
 
+def samples_to_table(samples, batch: pa.Table) -> pa.Table:
+    """将sample列表转换为pyarrow表，各sample的字段可能不同，按首次出现顺序补齐缺失字段"""
+    if not samples:
+        return batch.slice(0, 0)
+    columns = {}
+    for sample in samples:
+        for key in sample:
+            columns.setdefault(key, None)
+    return pa.Table.from_pylist([{key: sample.get(key) for key in columns} for sample in samples])
+
+
 def get_exception_info(e):
     exc_type = type(e).__name__  # 异常类型（如 'ZeroDivisionError'）
     exc_msg = str(e)  # 异常原因（如 'division by zero'）
@@ -55,6 +72,8 @@ class BaseOp:
 
     use_model = False
     custom_ops = False
+    # 批量执行失败回退逐条执行时文件已读取，execute中不再重复读取
+    _file_loaded = False
 
     def __init__(self, *args, **kwargs):
         self.accelerator = kwargs.get("accelerator", "cpu")
@@ -83,6 +102,10 @@ class BaseOp:
         else:
             return "UnknownOp"
 
+    @classmethod
+    def release_task(cls, task_uuid: str):
+        """任务处理结束后在driver上调用，释放算子持有的任务级资源（如数据库中的中间记录），默认无操作"""
+
     @staticmethod
     def is_npu_available():
         try:
@@ -159,12 +182,17 @@ class BaseOp:
         }
         sample["failed_reason"] = failed_reason
 
+    @staticmethod
+    def partition_file(filepath: str) -> str:
+        elements = partition(filename=filepath)
+        return "\n\n".join([str(el) for el in elements])
+
     def read_file(self, sample):
         filepath = sample[self.filepath_key]
         filetype = sample[self.filetype_key]
         if filetype in ["ppt", "pptx", "docx", "doc", "xlsx", "csv", "md", "pdf"]:
-            elements = partition(filename=filepath)
-            sample[self.text_key] = "\n\n".join([str(el) for el in elements])
+            # 解析耗时较长，命中缓存时直接复用之前的解析结果
+            sample[self.text_key] = ParseCache.get_instance().get_text(filepath, filetype, self.partition_file)
             sample[self.data_key] = b""
         elif filetype in ["txt", "md", "markdown", "xml", "html", "json", "jsonl"]:
             with open(filepath, "rb") as f:
@@ -174,16 +202,28 @@ class BaseOp:
                 )
                 sample[self.data_key] = b""
         elif filetype in ["jpg", "jpeg", "png", "bmp"]:
-            image_np = cv2.imdecode(np.fromfile(filepath, dtype=np.uint8), -1)
+            with open(filepath, "rb") as f:
+                image_bytes = f.read()
+            # 以缩小尺寸解码校验图片可读，无法解码的文件在读取时即报错；校验后直接使用原始字节，无需按原格式重新编码
+            image_np = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+            if image_np is None:
+                raise ValueError(f"Failed to decode image file: {filepath}")
             if image_np.size:
-                data = cv2.imencode(f".{filetype}", image_np)[1]
-                image_bytes = data.tobytes()
                 sample[self.data_key] = image_bytes
                 sample[self.text_key] = ""
         return sample
 
+    @contextmanager
+    def reuse_loaded_file(self):
+        """上下文内execute不再读取文件，用于批量执行失败后的逐条回退"""
+        self._file_loaded = True
+        try:
+            yield
+        finally:
+            self._file_loaded = False
+
     def read_file_first(self, sample):
-        if self.is_first_op:
+        if self.is_first_op and not self._file_loaded:
             self.read_file(sample)
 
     def convert_to_dj(self, sample):
@@ -214,8 +254,19 @@ class BaseOp:
             TaskInfoPersistence().persistence_task_info(sample)
         return sample
 
+    @staticmethod
+    def save_batch_and_db(batch: pa.Table) -> pa.Table:
+        """批量写出文件并落库，批次返回前将本进程缓冲的记录写入数据库"""
+        try:
+            return samples_to_table([BaseOp.save_file_and_db(sample) for sample in batch.to_pylist()], batch)
+        finally:
+            PersistenceBuffer.flush_instance()
+
 
 class Mapper(BaseOp):
+    # 实现了execute_batch的算子置为True，RayDataset会通过map_batches批量调度该算子
+    support_batch = False
+
     def __init__(self, *args, **kwargs):
         super(Mapper, self).__init__(*args, **kwargs)
 
@@ -225,26 +276,86 @@ class Mapper(BaseOp):
             return sample
 
         self.fill_sample_params(sample, **kwargs)
-        execute_status = FAILED_STATUS
         try:
             sample = self.execute(sample)
-            execute_status = SUCCESS_STATUS
         except Exception as e:
-            # 算子执行失败，记录文件执行信息到数据库，并更该文件执行结果状态
-            self.create_failure_sample(sample, self.name, e)
-            logger.error(
-                f"Ops named {self.name} map failed, Error Info: \n"
-                f"{str(get_exception_info(e))}"
-            )
-            sample["execute_status"] = execute_status
-            sample[self.filesize_key] = "0"
-            sample[self.filetype_key] = ""
-            sample["execute_result"] = False
-            TaskInfoPersistence().update_task_result(sample)
+            self._handle_failed_sample(sample, e)
             # 不抛出异常，跳过当前文件继续处理下一个文件
             return sample
 
-        sample["execute_status"] = execute_status
+        return self._handle_success_sample(sample)
+
+    def call_batch(self, batch: pa.Table, **kwargs) -> pa.Table:
+        """批量执行入口，由RayDataset通过map_batches调用"""
+        return samples_to_table(self.call_samples(batch.to_pylist(), **kwargs), batch)
+
+    def call_samples(self, samples: List[Dict[str, Any]], **kwargs) -> List[Dict[str, Any]]:
+        """对一批sample执行算子，支持批处理的算子调用execute_batch，否则逐条执行"""
+        if not self.support_batch:
+            return [self(sample, **kwargs) for sample in samples]
+
+        pending = []
+        for sample in samples:
+            # 该算子前已有算子执行该文件失败
+            if sample.get(Fields.result) is False:
+                continue
+            self.fill_sample_params(sample, **kwargs)
+            try:
+                self.read_file_first(sample)
+            except Exception as e:
+                self._handle_failed_sample(sample, e)
+                continue
+            pending.append(sample)
+
+        if not pending:
+            return samples
+
+        start = time.time()
+        try:
+            # 使用object类型构造，避免None被转换为NaN
+            result = self.execute_batch(pd.DataFrame(pending, dtype=object))
+            executed = result.to_dict("records")
+        except Exception as e:
+            # 批量执行失败时逐条执行，仅将出错的文件标记为失败
+            logger.warning(
+                f"Ops named {self.name} batch execute failed, fallback to single sample mode. Error: {e}"
+            )
+            executed = [self._execute_single(sample) for sample in pending]
+        else:
+            executed = [self._handle_success_sample(sample) for sample in executed]
+        logger.info(
+            f"batch size: {len(pending)}, method: {self.name} batch costs {time.time() - start:.6f} s"
+        )
+
+        pending_ids = {id(sample) for sample in pending}
+        executed_iter = iter(executed)
+        return [next(executed_iter) if id(sample) in pending_ids else sample for sample in samples]
+
+    def _execute_single(self, sample: Dict[str, Any]) -> Dict[str, Any]:
+        # sample已在call_samples中读取文件，复用已加载的内容
+        with self.reuse_loaded_file():
+            try:
+                sample = self.execute(sample)
+            except Exception as e:
+                self._handle_failed_sample(sample, e)
+                return sample
+        return self._handle_success_sample(sample)
+
+    def _handle_failed_sample(self, sample: Dict[str, Any], excp: BaseException):
+        # 算子执行失败，记录文件执行信息到数据库，并更该文件执行结果状态
+        self.create_failure_sample(sample, self.name, excp)
+        logger.error(
+            f"Ops named {self.name} map failed, Error Info: \n"
+            f"{str(get_exception_info(excp))}"
+        )
+        sample["execute_status"] = FAILED_STATUS
+        sample[self.filesize_key] = "0"
+        sample[self.filetype_key] = ""
+        sample["execute_result"] = False
+        TaskInfoPersistence().update_task_result(sample)
+
+    def _handle_success_sample(self, sample: Dict[str, Any]) -> Dict[str, Any]:
+        sample["execute_status"] = SUCCESS_STATUS
         # 加载文件成功执行信息到数据库
         if self.is_last_op:
             # 文件无内容会被过滤
@@ -264,6 +375,12 @@ class Mapper(BaseOp):
             "This is in Mapper Class, plese re-define this method in Sub-classes"
         )
 
+    def execute_batch(self, batch: pd.DataFrame) -> pd.DataFrame:
+        """批量执行函数（support_batch为True的子类实现），入参中的文件已完成读取"""
+        raise NotImplementedError(
+            "This is in Mapper Class, plese re-define this method in Sub-classes"
+        )
+
 
 class Slicer(BaseOp):
     def __init__(self, *args, **kwargs):
@@ -356,6 +473,7 @@ class Slicer(BaseOp):
         )
         with open(save_path, "wb") as f:
             f.write(file_sample)
+        record_written_path(sample[self.export_path_key], save_path)
 
         os.chmod(save_path, 0o640)
         try:
@@ -368,6 +486,9 @@ class Slicer(BaseOp):
 
 
 class Filter(BaseOp):
+    # 实现了execute_batch的算子置为True，RayDataset会通过map_batches批量调度该算子
+    support_batch = False
+
     def __init__(self, *args, **kwargs):
         super(Filter, self).__init__(*args, **kwargs)
 
@@ -377,15 +498,63 @@ class Filter(BaseOp):
             return sample
 
         self.fill_sample_params(sample, **kwargs)
-        execute_status = FAILED_STATUS
         try:
             sample = self.execute(sample)
-            execute_status = SUCCESS_STATUS
         except Exception as e:
             # 如果filter算子过滤失败, 不保留文件， 并记录文件执行信息到数据库
             self.create_failure_sample(sample, self.name, e)
             return False
-        sample["execute_status"] = execute_status
+        return self._handle_success_sample(sample)
+
+    def call_batch(self, batch: pa.Table, **kwargs) -> pa.Table:
+        """批量执行入口，由RayDataset通过map_batches调用"""
+        return samples_to_table(self.call_samples(batch.to_pylist(), **kwargs), batch)
+
+    def call_samples(self, samples: List[Dict[str, Any]], **kwargs) -> List[Dict[str, Any]]:
+        """对一批sample执行算子，返回保留的sample，支持批处理的算子调用execute_batch，否则逐条执行"""
+        if not self.support_batch:
+            return [sample for sample in samples if self(sample, **kwargs)]
+
+        kept = []
+        pending = []
+        for sample in samples:
+            # 该算子前已有算子执行该文件失败
+            if sample.get(Fields.result) is False:
+                kept.append(sample)
+                continue
+            self.fill_sample_params(sample, **kwargs)
+            try:
+                self.read_file_first(sample)
+            except Exception as e:
+                self.create_failure_sample(sample, self.name, e)
+                continue
+            pending.append(sample)
+
+        if not pending:
+            return kept
+
+        start = time.time()
+        try:
+            # 使用object类型构造，避免None被转换为NaN
+            result = self.execute_batch(pd.DataFrame(pending, dtype=object))
+            executed = result.to_dict("records")
+        except Exception as e:
+            # 批量执行失败时逐条执行，仅将出错的文件过滤
+            logger.warning(
+                f"Ops named {self.name} batch execute failed, fallback to single sample mode. Error: {e}"
+            )
+            # sample已读取文件，复用已加载的内容
+            with self.reuse_loaded_file():
+                kept.extend([sample for sample in pending if self(sample, **kwargs)])
+        else:
+            kept.extend(sample for sample in executed if self._handle_success_sample(sample))
+        logger.info(
+            f"batch size: {len(pending)}, method: {self.name} batch costs {time.time() - start:.6f} s"
+        )
+        return kept
+
+    def _handle_success_sample(self, sample: Dict[str, Any]) -> bool:
+        sample["execute_status"] = SUCCESS_STATUS
 
         # 文件无内容会被过滤
         if sample[self.text_key] == "" and sample[self.data_key] == b"":
@@ -406,6 +575,12 @@ class Filter(BaseOp):
             "This is in Filter Class, plese re-define this method in Sub-classes"
         )
 
+    def execute_batch(self, batch: pd.DataFrame) -> pd.DataFrame:
+        """批量执行函数（support_batch为True的子类实现），入参中的文件已完成读取，被过滤的文件需置空内容"""
+        raise NotImplementedError(
+            "This is in Filter Class, plese re-define this method in Sub-classes"
+        )
+
 
 class LLM(Mapper):
     def __init__(self, *args, **kwargs):
@@ -453,6 +628,8 @@ class LLM(Mapper):
             target_file_type = "jsonl"
         save_path = self.get_save_path(sample, target_file_type)
         self.save_json_file(object_list, save_path)
+        if object_list:
+            record_written_path(sample[self.export_path_key], save_path)
 
     def get_save_path(self, sample: Dict[str, Any], target_type) -> str:
         export_path = os.path.abspath(sample[self.export_path_key])
@@ -648,6 +825,7 @@ class FileExporter(BaseOp):
                 counter += 1
                 new_filename = f"{stem}_{counter}{suffix}"
                 current_path = parent_dir / new_filename
+        record_written_path(sample[self.export_path_key], str(current_path))
         os.chmod(parent_dir, 0o770)
         os.chmod(current_path, 0o640)
         return str(current_path)
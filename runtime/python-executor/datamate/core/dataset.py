@@ -14,9 +14,11 @@ from enum import Enum
 from loguru import logger
 from ray import data as rd
 
+from datamate.common.utils.parse_cache import ParseCache
 from datamate.core.base_op import Filter, Mapper, Slicer
 from datamate.core.constant import Fields
-from datamate.core.base_op import OPERATORS, BaseOp
+from datamate.core.base_op import OPERATORS, BaseOp, samples_to_table
+from datamate.sql_manager.persistence_buffer import PersistenceBuffer
 
 from core.base_op import Filter as RELATIVE_Filter, Mapper as RELATIVE_Mapper, Slicer as RELATIVE_Slicer
 
@@ -84,6 +86,70 @@ def preprocess_dataset(dataset: rd.Dataset, cfg) -> rd.Dataset:
     return dataset
 
 
+def finish_batch():
+    """
+    批次结果返回前将本actor缓冲的执行结果落库，阶段完成即意味着结果均已写入数据库；
+    同时上报本进程新增的解析缓存指标，由driver在任务结束后汇总输出
+    """
+    PersistenceBuffer.flush_instance()
+    ParseCache.report_instance_metrics()
+
+
+class BatchOpWrapper:
+    """
+    批处理算子包装类，将map_batches的批数据交给算子的call_batch处理；
+    不支持批处理的Mapper/Filter由call_batch逐条执行
+    """
+
+    def __init__(self, operators_cls, **init_kwargs):
+        self.op = operators_cls(**init_kwargs)
+
+    def __call__(self, batch: pa.Table, **kwargs) -> pa.Table:
+        try:
+            return self.op.call_batch(batch, **kwargs)
+        finally:
+            finish_batch()
+
+
+class SlicerOpWrapper:
+    """
+    Slicer算子包装类，逐条切分批内的sample并展开为多行
+    """
+
+    def __init__(self, operators_cls, **init_kwargs):
+        self.op = operators_cls(**init_kwargs)
+
+    def __call__(self, batch: pa.Table, **kwargs) -> pa.Table:
+        try:
+            samples = []
+            for sample in batch.to_pylist():
+                samples.extend(self.op(sample, **kwargs))
+            return samples_to_table(samples, batch)
+        finally:
+            finish_batch()
+
+
+class FusedOpWrapper:
+    """
+    融合算子包装类，在同一个actor中依次执行多个Mapper/Filter算子，避免算子间的序列化开销
+    """
+
+    def __init__(self, operators_cls_list, init_kwargs_list):
+        self.ops = [operators_cls(**init_kwargs)
+                    for operators_cls, init_kwargs in zip(operators_cls_list, init_kwargs_list)]
+
+    def __call__(self, batch: pa.Table, **kwargs) -> pa.Table:
+        try:
+            samples = batch.to_pylist()
+            for op in self.ops:
+                if not samples:
+                    break
+                samples = op.call_samples(samples, **kwargs)
+            return samples_to_table(samples, batch)
+        finally:
+            finish_batch()
+
+
 class RayDataset(BasicDataset):
 
     def __init__(self,
@@ -92,6 +158,7 @@ class RayDataset(BasicDataset):
         self.onnx_ops_name = ["OnnxImg2TextFormatter", "OnnxImageContentFilter"]
         self.npu_ops_name = ["Img2TextFormatter", "ImageContentFilter"]
         self.data = preprocess_dataset(dataset, cfg)
+        self.operators = []
 
     def process(self,
                 cfg_process,
@@ -120,10 +187,81 @@ class RayDataset(BasicDataset):
             init_kwargs["instance_id"] = kwargs.get("instance_id", str(uuid.uuid4()))
             init_kwargs_list.append(init_kwargs)
 
-        for cls_id, operators_cls in enumerate(operators_cls_list):
-            self._run_single_op(operators_cls, init_kwargs_list[cls_id], **kwargs)
+        self.operators.extend(zip(operators_cls_list, init_kwargs_list))
+        stages = self.plan_stages(operators_cls_list, init_kwargs_list)
+        for stage in stages:
+            if len(stage) > 1:
+                self._run_fused_ops([operators_cls_list[i] for i in stage],
+                                    [init_kwargs_list[i] for i in stage], **kwargs)
+            else:
+                self._run_single_op(operators_cls_list[stage[0]], init_kwargs_list[stage[0]], **kwargs)
         return self
 
+    def release_ops(self, instance_id):
+        """
+        任务结束后调用各算子的release_task释放任务级资源
+        :param instance_id: 任务实例ID，算子未配置uuid时作为任务唯一标识
+        """
+        for operators_cls, init_kwargs in self.operators:
+            release = getattr(operators_cls, "release_task", None)
+            if release is None:
+                continue
+            try:
+                release(init_kwargs.get("uuid") or instance_id)
+            except Exception as e:
+                logger.warning(f"Release task resources of op {init_kwargs.get('op_name')} failed: {e}")
+
+    @staticmethod
+    def get_op_resources(init_kwargs):
+        """
+        获取算子的资源配置
+        :param init_kwargs: 算子初始化参数
+        :return: (resources, cpu, memory)
+        """
+        resources = {}
+
+        if init_kwargs.get("npu", 0) > 0:
+            resources["npu"] = init_kwargs.get("npu")
+
+        if init_kwargs.get("arch", "arm").startswith("x86"):
+            resources["arch"] = "x86"
+
+        cpu = init_kwargs.get("cpu", 0.05)
+        memory = init_kwargs.get("memory", None)
+        return resources, cpu, memory
+
+    def plan_stages(self, operators_cls_list, init_kwargs_list):
+        """
+        将资源配置相同的相邻Mapper/Filter算子融合为同一个执行阶段, Slicer算子单独成为一个阶段。
+        默认关闭，设置环境变量ENABLE_OP_FUSION=true后开启
+        :param operators_cls_list: 算子类列表
+        :param init_kwargs_list: 算子初始化参数列表
+        :return: 执行阶段列表，每个阶段为算子下标列表
+        """
+        enable_fusion = os.getenv("ENABLE_OP_FUSION", "false").lower() == "true"
+        stages = []
+        last_key = None
+        for index, operators_cls in enumerate(operators_cls_list):
+            fusible = enable_fusion and isinstance(operators_cls, type) and issubclass(
+                operators_cls, (Mapper, Filter, RELATIVE_Mapper, RELATIVE_Filter))
+            key = None
+            if fusible:
+                resources, cpu, memory = self.get_op_resources(init_kwargs_list[index])
+                key = (tuple(sorted(resources.items())), cpu, memory)
+            if key is not None and key == last_key:
+                stages[-1].append(index)
+            else:
+                stages.append([index])
+            last_key = key
+
+        for stage_id, stage in enumerate(stages):
+            op_names = [init_kwargs_list[i].get("op_name") for i in stage]
+            if len(stage) > 1:
+                logger.info(f"Stage {stage_id}: fused ops {op_names}")
+            else:
+                logger.info(f"Stage {stage_id}: single op {op_names}")
+        return stages
+
     def load_ops_module(self, op_name):
         '''
         加载算子模块
@@ -159,55 +297,81 @@ class RayDataset(BasicDataset):
             res = None
         return res
 
-    def _run_single_op(self, operators_cls, init_kwargs, **kwargs):
+    def _run_fused_ops(self, operators_cls_list, init_kwargs_list, **kwargs):
         max_actor_nums = os.getenv("MAX_ACTOR_NUMS", "20")
+        batch_size = self.get_fused_batch_size(init_kwargs_list)
+        resources, cpu, memory = self.get_op_resources(init_kwargs_list[0])
 
-        resources = {}
-
-        if init_kwargs.get("npu", 0) > 0:
-            resources["npu"] = init_kwargs.get("npu")
+        kwargs.update({"ext_params": {}, "failed_reason": {}, "target_type": None})
+        try:
+            self.data = self.data.map_batches(FusedOpWrapper,
+                                              fn_constructor_args=(operators_cls_list, init_kwargs_list),
+                                              fn_kwargs=kwargs,
+                                              batch_size=batch_size,
+                                              batch_format="pyarrow",
+                                              resources=resources,
+                                              num_cpus=cpu,
+                                              memory=memory,
+                                              compute=rd.ActorPoolStrategy(min_size=1,
+                                                                           max_size=int(max_actor_nums)))
+        except Exception as e:
+            logger.error(e)
+            raise Exception("Error! Ops Details:") from e
 
-        if init_kwargs.get("arch", "arm").startswith("x86"):
-            resources["arch"] = "x86"
+    @staticmethod
+    def get_fused_batch_size(init_kwargs_list):
+        """
+        融合阶段的批大小：取各算子batch_size参数的最小值，均未配置时使用OP_BATCH_SIZE
+        :param init_kwargs_list: 算子初始化参数列表
+        :return: 批大小
+        """
+        batch_sizes = [int(init_kwargs["batch_size"]) for init_kwargs in init_kwargs_list
+                       if init_kwargs.get("batch_size")]
+        return min(batch_sizes) if batch_sizes else int(os.getenv("OP_BATCH_SIZE", "64"))
+
+    @staticmethod
+    def get_batch_size(operators_cls, init_kwargs):
+        """
+        单算子阶段的批大小：支持批处理的算子使用batch_size参数，未配置时使用OP_BATCH_SIZE；
+        其余算子每批一条，保持逐条调度的并行度与失败重试粒度
+        :param operators_cls: 算子类
+        :param init_kwargs: 算子初始化参数
+        :return: 批大小
+        """
+        if not getattr(operators_cls, "support_batch", False):
+            return 1
+        return int(init_kwargs.get("batch_size") or os.getenv("OP_BATCH_SIZE", "64"))
 
-        cpu = init_kwargs.get("cpu", 0.05)
-        memory = init_kwargs.get("memory", None)
+    def _run_single_op(self, operators_cls, init_kwargs, **kwargs):
+        max_actor_nums = os.getenv("MAX_ACTOR_NUMS", "20")
+        resources, cpu, memory = self.get_op_resources(init_kwargs)
 
         kwargs.update({"ext_params": {}, "failed_reason": {}, "target_type": None})
+        # 所有算子均通过map_batches调度，包装类在每个批次返回前刷新写缓冲；未声明support_batch的算子每批一条
+        if issubclass(operators_cls, (Mapper, Filter, RELATIVE_Mapper, RELATIVE_Filter)):
+            wrapper_cls = BatchOpWrapper
+            if operators_cls.support_batch:
+                logger.info(f"Ops {operators_cls.__name__} runs in batch mode")
+        elif issubclass(operators_cls, (Slicer, RELATIVE_Slicer)):
+            wrapper_cls = SlicerOpWrapper
+        else:
+            logger.error(
+                'Ray executor only support Filter, Mapper and Slicer OPs for now')
+            raise NotImplementedError
+
+        batch_size = self.get_batch_size(operators_cls, init_kwargs)
         try:
-            if issubclass(operators_cls, (Mapper, RELATIVE_Mapper)):
-                self.data = self.data.map(operators_cls,
-                                          fn_constructor_kwargs=init_kwargs,
-                                          fn_kwargs=kwargs,
-                                          resources=resources,
-                                          num_cpus=cpu,
-                                          memory=memory,
-                                          compute=rd.ActorPoolStrategy(min_size=1,
-                                                                       max_size=int(max_actor_nums)))
-
-            elif issubclass(operators_cls, (Slicer, RELATIVE_Slicer)):
-                self.data = self.data.flat_map(operators_cls,
-                                               fn_constructor_kwargs=init_kwargs,
-                                               fn_kwargs=kwargs,
-                                               resources=resources,
-                                               num_cpus=cpu,
-                                               memory=memory,
-                                               compute=rd.ActorPoolStrategy(min_size=1,
-                                                                            max_size=int(max_actor_nums)))
-
-            elif issubclass(operators_cls, (Filter, RELATIVE_Filter)):
-                self.data = self.data.filter(operators_cls,
-                                             fn_constructor_kwargs=init_kwargs,
-                                             fn_kwargs=kwargs,
-                                             resources=resources,
-                                             num_cpus=cpu,
-                                             memory=memory,
-                                             compute=rd.ActorPoolStrategy(min_size=1,
-                                                                          max_size=int(max_actor_nums)))
-            else:
-                logger.error(
-                    'Ray executor only support Filter, Mapper and Slicer OPs for now')
-                raise NotImplementedError
+            self.data = self.data.map_batches(wrapper_cls,
+                                              fn_constructor_args=(operators_cls,),
+                                              fn_constructor_kwargs=init_kwargs,
+                                              fn_kwargs=kwargs,
+                                              batch_size=batch_size,
+                                              batch_format="pyarrow",
+                                              resources=resources,
+                                              num_cpus=cpu,
+                                              memory=memory,
+                                              compute=rd.ActorPoolStrategy(min_size=1,
+                                                                           max_size=int(max_actor_nums)))
         except Exception as e:
             logger.error(e)
             raise Exception("Error! Ops Details:") from e
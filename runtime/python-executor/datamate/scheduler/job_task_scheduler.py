@@ -1,5 +1,6 @@
 import asyncio
 import os
+import time
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 
@@ -10,6 +11,139 @@ from .scheduler import Task, TaskStatus, TaskResult, TaskScheduler
 # Default Ray dashboard address
 RAY_DASHBOARD_ADDRESS = os.getenv("RAY_DASHBOARD_ADDRESS", "http://datamate-raycluster-head-svc:8265")
 
+# Job 状态轮询间隔（秒）：有新日志时使用最小间隔，日志无变化时逐步加倍直到最大间隔
+RAY_JOB_POLL_MIN_INTERVAL = float(os.getenv("RAY_JOB_POLL_MIN_INTERVAL", "2"))
+RAY_JOB_POLL_MAX_INTERVAL = float(os.getenv("RAY_JOB_POLL_MAX_INTERVAL", "10"))
+# 日志写入缓冲：累计超过该字节数或距上次写入超过该秒数时落盘
+RAY_JOB_LOG_FLUSH_BYTES = int(os.getenv("RAY_JOB_LOG_FLUSH_BYTES", str(64 * 1024)))
+RAY_JOB_LOG_FLUSH_INTERVAL = float(os.getenv("RAY_JOB_LOG_FLUSH_INTERVAL", "1"))
+# 日志流连续失败达到该次数后回退为全量拉取
+RAY_JOB_LOG_TAIL_RETRIES = int(os.getenv("RAY_JOB_LOG_TAIL_RETRIES", "3"))
+
+
+class RayJobLogFollower:
+    """增量跟随 Ray Job 日志并追加写入本地文件
+
+    通过 tail_job_logs 流式接收新增日志，只缓冲未落盘的部分，内存占用与日志总量无关。
+    流在 Job 结束前断开时（如空闲的代理或 websocket 超时）重新打开，并跳过已接收的字符数；
+    流式接口持续不可用时回退为 get_job_logs 全量拉取。Job 结束时若流未完整读完，再全量拉取补齐一次。
+    """
+
+    def __init__(self, client, job_id: str, log_path: str):
+        self.client = client
+        self.job_id = job_id
+        self.log_path = log_path
+        self.last_activity = time.monotonic()
+        self._consumed = 0  # 已接收的日志字符数
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+        self._streaming_failed = False
+        self._stream_complete = False  # Job 结束后流正常读完，无需补齐
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> "RayJobLogFollower":
+        self._task = asyncio.create_task(self._follow())
+        return self
+
+    async def _follow(self):
+        failures = 0
+        while not self._stopping:
+            # 重新打开的流从头输出日志，跳过已接收的部分
+            skip = self._consumed
+            try:
+                async for chunk in self.client.tail_job_logs(self.job_id):
+                    if skip:
+                        dropped = min(skip, len(chunk))
+                        chunk, skip = chunk[dropped:], skip - dropped
+                    self._append(chunk)
+                    if (
+                        self._buffered >= RAY_JOB_LOG_FLUSH_BYTES
+                        or time.monotonic() - self._last_flush >= RAY_JOB_LOG_FLUSH_INTERVAL
+                    ):
+                        await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                if failures >= RAY_JOB_LOG_TAIL_RETRIES:
+                    logger.warning(f"Failed to tail logs for job {self.job_id}, falling back to polling: {e}")
+                    self._streaming_failed = True
+                    return
+                logger.warning(
+                    f"Failed to tail logs for job {self.job_id}, reconnecting "
+                    f"({failures}/{RAY_JOB_LOG_TAIL_RETRIES}): {e}"
+                )
+            else:
+                failures = 0
+                if await self._job_finished():
+                    self._stream_complete = True
+                    return
+                logger.debug(f"Log stream for job {self.job_id} ended before the job finished, reconnecting")
+            await asyncio.sleep(RAY_JOB_POLL_MIN_INTERVAL)
+
+    async def _job_finished(self) -> bool:
+        try:
+            status = await asyncio.to_thread(self.client.get_job_status, self.job_id)
+        except Exception as e:
+            logger.warning(f"Failed to get status of job {self.job_id}: {e}")
+            return False
+        return status in ("SUCCEEDED", "FAILED", "STOPPED")
+
+    def _append(self, chunk: str):
+        if not chunk:
+            return
+        self._buffer.append(chunk)
+        self._buffered += len(chunk)
+        self._consumed += len(chunk)
+        self.last_activity = time.monotonic()
+
+    async def _fetch_all(self):
+        """全量拉取日志，按已接收的字符数截取新增部分"""
+        try:
+            logs = await asyncio.to_thread(self.client.get_job_logs, self.job_id)
+            log_content = logs if isinstance(logs, str) else str(logs or "")
+            if len(log_content) > self._consumed:
+                self._append(log_content[self._consumed:])
+        except Exception as e:
+            logger.warning(f"Failed to fetch logs for job {self.job_id}: {e}")
+
+    async def poll(self):
+        """定期调用：流式跟随不可用时回退拉取，并将缓冲的日志落盘"""
+        if self._streaming_failed:
+            await self._fetch_all()
+        await self.flush()
+
+    async def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        data = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffered = 0
+        await asyncio.to_thread(self._write, data)
+
+    def _write(self, data: str):
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(data)
+
+    async def close(self, timeout: float = 5.0):
+        """Job 结束后等待流式跟随读完剩余日志，未读完时全量拉取补齐一次，再写入全部缓冲"""
+        self._stopping = True
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), timeout=timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+            finally:
+                if not self._task.done():
+                    self._task.cancel()
+                    await asyncio.gather(self._task, return_exceptions=True)
+        if not self._stream_complete:
+            await self._fetch_all()
+        await self.flush()
+
 
 class RayJobTask(Task):
     """Ray Job 任务包装类"""
@@ -31,6 +165,7 @@ class RayJobTask(Task):
         self.timeout = timeout
         self.job_id: Optional[str] = None
         self._client = None
+        self._log_follower: Optional[RayJobLogFollower] = None
 
     def _get_client(self):
         """延迟初始化 JobSubmissionClient"""
@@ -69,18 +204,19 @@ class RayJobTask(Task):
             )
             logger.info(f"Submitted Ray Job: {self.job_id} for task {self.task_id}")
 
-            # 轮询 Job 状态
-            poll_interval = 2  # 2 秒轮询一次
-            elapsed_time = 0
-            last_log_position = 0  # 记录已写入的日志位置
+            # 增量跟随日志，与状态轮询并行
+            self._log_follower = RayJobLogFollower(client, self.job_id, self.log_path).start()
+
+            # 轮询 Job 状态：日志有新增时按最小间隔轮询，无新增时逐步退避
+            poll_interval = RAY_JOB_POLL_MIN_INTERVAL
+            start_time = time.monotonic()
             connection_failure_count = 0  # 连接失败计数器
             max_connection_failures = 5  # 最大连接失败次数阈值
 
             # 任务无进展超时：如果 job 一直是 RUNNING 但日志/进度没有任何变化，
             # 说明 workers 可能已全部丢失，判定为失败
             stall_timeout = int(os.getenv("RAY_JOB_STALL_TIMEOUT", "3600"))  # 默认 120 秒
-            last_log_size = 0
-            last_active_time = datetime.now()
+            last_seen_activity = self._log_follower.last_activity
 
             while True:
                 if self._cancelled:
@@ -92,30 +228,30 @@ class RayJobTask(Task):
                     break
 
                 try:
-                    info = client.get_job_info(self.job_id)
+                    info = await asyncio.to_thread(client.get_job_info, self.job_id)
                     job_status = info.status
 
                     # 连接成功，重置失败计数器
                     connection_failure_count = 0
 
-                    # 获取并写入日志
-                    await self._fetch_and_write_logs(client, last_log_position)
-                    current_log_size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
-                    last_log_position = current_log_size
+                    # 写入已接收的日志
+                    await self._log_follower.poll()
 
                     # 检测任务是否停滞（workers 全部丢失但 head 仍返回 RUNNING）
-                    if current_log_size > last_log_size:
-                        last_active_time = datetime.now()
-                        last_log_size = current_log_size
-                    elif (datetime.now() - last_active_time).total_seconds() > stall_timeout:
-                        logger.error(
-                            f"Ray Job {self.job_id} stalled for {stall_timeout}s "
-                            f"(no log progress), marking as FAILED"
-                        )
-                        self._stop_job(client)
-                        self.status = TaskStatus.FAILED
-                        self.error = f"Job stalled: no progress for {stall_timeout} seconds (workers may be lost)"
-                        break
+                    if self._log_follower.last_activity > last_seen_activity:
+                        last_seen_activity = self._log_follower.last_activity
+                        poll_interval = RAY_JOB_POLL_MIN_INTERVAL
+                    else:
+                        poll_interval = min(poll_interval * 2, RAY_JOB_POLL_MAX_INTERVAL)
+                        if time.monotonic() - last_seen_activity > stall_timeout:
+                            logger.error(
+                                f"Ray Job {self.job_id} stalled for {stall_timeout}s "
+                                f"(no log progress), marking as FAILED"
+                            )
+                            self._stop_job(client)
+                            self.status = TaskStatus.FAILED
+                            self.error = f"Job stalled: no progress for {stall_timeout} seconds (workers may be lost)"
+                            break
 
                     if job_status == "SUCCEEDED":
                         self.status = TaskStatus.COMPLETED
@@ -136,7 +272,7 @@ class RayJobTask(Task):
                         break
 
                     # 检查超时
-                    if self.timeout and elapsed_time >= self.timeout:
+                    if self.timeout and time.monotonic() - start_time >= self.timeout:
                         logger.warning(
                             f"Ray Job {self.job_id} timed out after {self.timeout} seconds"
                         )
@@ -148,6 +284,7 @@ class RayJobTask(Task):
                 except (ConnectionError, ConnectionRefusedError, ConnectionResetError, OSError) as e:
                     # 连接类异常：Ray 集群可能已下线
                     connection_failure_count += 1
+                    poll_interval = RAY_JOB_POLL_MIN_INTERVAL
                     logger.error(
                         f"Connection to Ray cluster failed (attempt {connection_failure_count}/{max_connection_failures}): {e}"
                     )
@@ -163,7 +300,6 @@ class RayJobTask(Task):
                     logger.warning(f"Error checking job status: {e}")
 
                 await asyncio.sleep(poll_interval)
-                elapsed_time += poll_interval
 
         except asyncio.CancelledError:
             logger.info(f"Task {self.task_id} received CancelledError")
@@ -179,24 +315,13 @@ class RayJobTask(Task):
             logger.error(f"RayJobTask(id: {self.task_id}) run failed. Cause: {e}")
 
         finally:
+            if self._log_follower is not None:
+                try:
+                    await self._log_follower.close()
+                except Exception as e:
+                    logger.warning(f"Failed to flush logs for job {self.job_id}: {e}")
             self.completed_at = datetime.now()
 
-    async def _fetch_and_write_logs(self, client, last_position: int = 0):
-        """获取 Ray Job 日志并追加写入日志文件"""
-        try:
-            logs = client.get_job_logs(self.job_id)
-            if logs:
-                log_content = logs if isinstance(logs, str) else str(logs)
-                # 只追加新日志
-                if len(log_content) > last_position:
-                    new_logs = log_content[last_position:]
-                    with open(self.log_path, "a", encoding="utf-8") as f:
-                        f.write(new_logs)
-                        if not new_logs.endswith("\n"):
-                            f.write("\n")
-        except Exception as e:
-            logger.warning(f"Failed to fetch logs for job {self.job_id}: {e}")
-
     def _stop_job(self, client):
         """停止 Ray Job"""
         if self.job_id:
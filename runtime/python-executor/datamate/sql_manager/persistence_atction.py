@@ -11,6 +11,7 @@ from typing import Dict, Any
 from loguru import logger
 from sqlalchemy import text
 
+from datamate.sql_manager.persistence_buffer import PersistenceBuffer
 from datamate.sql_manager.sql_manager import SQLManager
 
 
@@ -53,7 +54,7 @@ class TaskInfoPersistence:
             "status": status,
             "result": failed_reason
         }
-        self.insert_result(result_data, str(self.sql_dict.get("insert_clean_result_sql")))
+        PersistenceBuffer.get_instance().add(str(self.sql_dict.get("insert_clean_result_sql")), result_data)
 
     def update_file_result(self, sample, file_id):
         file_size = str(sample.get("fileSize"))
@@ -76,15 +77,22 @@ class TaskInfoPersistence:
             "created_at": create_time,
             "updated_at": create_time
         }
-        self.insert_result(file_data, str(self.sql_dict.get("insert_dataset_file_sql")))
+        PersistenceBuffer.get_instance().add(str(self.sql_dict.get("insert_dataset_file_sql")), file_data)
 
-    def query_existing_files(self, dataset_id: str):
-        result = None
+    def query_existing_files(self, dataset_id: str, page_size: int = 10000):
+        """按file_path做键集分页，逐页返回数据集中已有的文件路径"""
         query_sql = str(self.sql_dict.get("query_dataset_files_sql"))
-        with SQLManager.create_connect() as conn:
-            execute_result = conn.execute(text(query_sql), {"dataset_id": dataset_id})
-            result = execute_result.fetchall()
-        return result
+        last_path = ""
+        while True:
+            with SQLManager.create_connect() as conn:
+                rows = conn.execute(text(query_sql), {"dataset_id": dataset_id, "last_path": last_path,
+                                                      "limit": page_size}).fetchall()
+            if not rows:
+                return
+            yield [row[0] for row in rows]
+            if len(rows) < page_size:
+                return
+            last_path = rows[-1][0]
 
     def batch_insert_files(self, samples):
         insert_sql = str(self.sql_dict.get("insert_dataset_file_sql"))
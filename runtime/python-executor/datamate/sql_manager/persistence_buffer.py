@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+import atexit
+import os
+import threading
+import time
+from collections import defaultdict
+from threading import Lock
+from typing import Any, Dict, List
+
+from loguru import logger
+from sqlalchemy import text
+
+from datamate.sql_manager.sql_manager import SQLManager
+
+
+class PersistenceBuffer:
+    """
+    进程级写缓冲（write-behind）。
+
+    每个Ray actor进程持有一个实例，按SQL语句累积待插入的行，
+    在行数达到PERSIST_BATCH_SIZE或距上次刷新超过PERSIST_FLUSH_INTERVAL秒时批量写入数据库。
+    RayDataset的算子包装类在每个批次返回前调用flush_instance，保证阶段结束时本actor的行均已落库；
+    进程退出（atexit）时的刷新仅作兜底。
+    """
+    _instance = None
+    _instance_lock = Lock()
+
+    def __init__(self, batch_size: int = None, flush_interval: float = None):
+        self.batch_size = batch_size or int(os.getenv("PERSIST_BATCH_SIZE", "200"))
+        self.flush_interval = flush_interval or float(os.getenv("PERSIST_FLUSH_INTERVAL", "5"))
+        self.max_retries = 20
+        self.retry_delay = 1
+        self._rows: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._pending = 0
+        # _lock只保护待写入的行，数据库写入与重试等待在_flush_lock内进行，不阻塞add
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._last_flush = time.time()
+        self.metrics = {
+            "rows_flushed": 0,
+            "rows_failed": 0,
+            "flush_count": 0,
+            "flush_latency": 0.0,
+            "retries": 0,
+        }
+        self._stop_event = threading.Event()
+        self._timer = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._timer.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def get_instance(cls) -> "PersistenceBuffer":
+        if cls._instance is not None:
+            return cls._instance
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def flush_instance(cls):
+        """刷新当前进程的缓冲（未创建时不做任何操作）"""
+        if cls._instance is not None:
+            cls._instance.flush()
+
+    def add(self, sql: str, row: Dict[str, Any]):
+        with self._lock:
+            self._rows[sql].append(row)
+            self._pending += 1
+            need_flush = (self._pending >= self.batch_size
+                          or time.time() - self._last_flush >= self.flush_interval)
+        if need_flush:
+            # 已有刷新在进行时不等待，剩余的行由下一次刷新写入
+            self.flush(wait=False)
+
+    def flush(self, wait: bool = True):
+        """
+        将缓冲的行写入数据库。wait为True时等待进行中的刷新完成，返回时调用前加入的行均已写入
+        """
+        if not self._flush_lock.acquire(blocking=wait):
+            return
+        try:
+            with self._lock:
+                rows, self._rows = self._rows, defaultdict(list)
+                pending, self._pending = self._pending, 0
+                self._last_flush = time.time()
+            if not pending:
+                return
+
+            start = time.time()
+            for sql, sql_rows in rows.items():
+                self._execute_many(sql, sql_rows)
+            self.metrics["flush_count"] += 1
+            self.metrics["flush_latency"] += time.time() - start
+        finally:
+            self._flush_lock.release()
+        logger.debug(f"Persistence buffer flushed, metrics: {self.metrics}")
+
+    def close(self):
+        self._stop_event.set()
+        atexit.unregister(self.close)
+        try:
+            self.flush()
+        finally:
+            metrics = self.metrics
+            avg_latency = metrics["flush_latency"] / metrics["flush_count"] if metrics["flush_count"] else 0
+            logger.info(
+                f"Persistence buffer closed, rows flushed: {metrics['rows_flushed']}, "
+                f"rows failed: {metrics['rows_failed']}, flush count: {metrics['flush_count']}, "
+                f"avg flush latency: {avg_latency:.6f} s, retries: {metrics['retries']}"
+            )
+
+    def _flush_periodically(self):
+        while not self._stop_event.wait(self.flush_interval):
+            if time.time() - self._last_flush < self.flush_interval:
+                continue
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Persistence buffer periodic flush failed: {e}")
+
+    def _execute_many(self, sql: str, rows: List[Dict[str, Any]]):
+        retries = 0
+        while retries <= self.max_retries:
+            try:
+                with SQLManager.create_connect() as conn:
+                    conn.execute(text(sql), rows)
+                self.metrics["rows_flushed"] += len(rows)
+                return
+            except Exception as e:
+                if "database is locked" in str(e) or "locking protocol" in str(e):
+                    retries += 1
+                    self.metrics["retries"] += 1
+                    time.sleep(self.retry_delay)
+                    continue
+                logger.error(f"batch insert failed, fallback to single row insert: {e}")
+                break
+        self._execute_each(sql, rows)
+
+    def _execute_each(self, sql: str, rows: List[Dict[str, Any]]):
+        # 批量写入失败时逐行写入，避免一行异常数据导致整批数据丢失
+        for row in rows:
+            try:
+                with SQLManager.create_connect() as conn:
+                    conn.execute(text(sql), row)
+                self.metrics["rows_flushed"] += 1
+            except Exception as e:
+                self.metrics["rows_failed"] += 1
+                logger.error("database execute failed: {}", str(e))
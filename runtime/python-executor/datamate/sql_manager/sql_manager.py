@@ -45,7 +45,8 @@ class SQLManager:
                 pool_size=5,       # 显式指定池大小
                 max_overflow=15,   # 显式指定溢出
                 pool_timeout=30,
-                pool_recycle=1800  # 10分钟回收连接
+                pool_recycle=1800,  # 10分钟回收连接
+                executemany_mode="values_plus_batch"  # 批量写入时合并为多行INSERT，减少round-trip
             )
             logger.info("Database Engine initialized successfully.")
             return cls._engine
@@ -5,7 +5,6 @@ from json import loads as jloads
 from typing import Dict, Optional
 from urllib.parse import urljoin
 
-import ray
 import requests
 import yaml
 from jsonargparse import ArgumentParser
@@ -92,63 +91,65 @@ class DataJuicerExecutor(RayExecutor):
         return batch
 
     def run(self):
-        # 1. 加载数据集
-        logger.info('Loading dataset with Ray...')
+        # 元数据解码文件在处理结束后删除
+        with self.meta_file() as meta_path:
+            # 1. 加载数据集
+            logger.info('Loading dataset with Ray...')
 
-        if self.meta:
-            file_content = base64.b64decode(self.meta)
-            lines = file_content.splitlines()
-            dataset = ray.data.from_items([jloads(line) for line in lines])
-        else:
-            dataset = self.load_dataset()
-
-        logger.info('Read data...')
-        dataset = dataset.map(FileExporter().convert_to_dj, num_cpus=0.05)
-
-        # 保存原始数据文件ID集合，用于后续过滤数据检测
-        original_file_ids = set(dataset.unique("fileId"))
-
-        # 写入数据集文件
-        with open(self.dataset_path, "w", encoding="utf-8") as f:
-            for batch_df in dataset.iter_batches(batch_format="pandas", batch_size=2048):
-                batch_df.to_json(f, orient="records", lines=True, force_ascii=False)
-
-        logger.info('Processing data...')
-        tstart = time.time()
-        try:
-            dj_config = self.client.init_config(self.dataset_path, self.export_path, self.cfg.process)
-            result_path = self.client.execute_config(dj_config)
-
-            processed_dataset = self.load_dj_dataset(result_path)
-            processed_dataset = processed_dataset.map_batches(self.add_column, num_cpus=0.05)
-            processed_dataset = processed_dataset.map(FileExporter().save_file_and_db, num_cpus=0.05)
-
-            processed_dataset = processed_dataset.materialize()
-
-            # 特殊处理：识别被过滤的数据
-            if processed_dataset.count() == 0:
-                processed_file_ids = set()
+            if meta_path:
+                dataset = self.load_dataset(meta_path, jloads)
             else:
-                processed_file_ids = set(processed_dataset.unique("fileId"))
-            filtered_file_ids = original_file_ids - processed_file_ids
-
-            if filtered_file_ids:
-                logger.info(f"Found {len(filtered_file_ids)} filtered files, updating task result only")
-                for sample_dict in dataset.iter_batches(batch_format="pandas", batch_size=2048):
-                    for _, row in sample_dict.iterrows():
-                        if str(row.get("fileId", "")) in filtered_file_ids:
-                            row["fileSize"] = "0"
-                            row["fileType"] = ""
-                            row["execute_status"] = SUCCESS_STATUS
-                            row[Fields.instance_id] = self.cfg.instance_id
-                            TaskInfoPersistence().update_task_result(row)
-
-            self.scan_files()
-        except Exception as e:
-            logger.error(f"An unexpected error occurred.", e)
-            raise e
-        tend = time.time()
-        logger.info(f'All Ops are done in {tend - tstart:.3f}s.')
+                dataset = self.load_dataset()
+
+            logger.info('Read data...')
+            dataset = dataset.map(FileExporter().convert_to_dj, num_cpus=0.05)
+
+            # 保存原始数据文件ID集合，用于后续过滤数据检测
+            original_file_ids = set(dataset.unique("fileId"))
+
+            # 写入数据集文件
+            with open(self.dataset_path, "w", encoding="utf-8") as f:
+                for batch_df in dataset.iter_batches(batch_format="pandas", batch_size=2048):
+                    batch_df.to_json(f, orient="records", lines=True, force_ascii=False)
+
+            logger.info('Processing data...')
+            tstart = time.time()
+            try:
+                dj_config = self.client.init_config(self.dataset_path, self.export_path, self.cfg.process)
+                result_path = self.client.execute_config(dj_config)
+
+                processed_dataset = self.load_dj_dataset(result_path)
+                processed_dataset = processed_dataset.map_batches(self.add_column, num_cpus=0.05)
+                processed_dataset = processed_dataset.map_batches(FileExporter.save_batch_and_db,
+                                                                batch_format="pyarrow", num_cpus=0.05)
+
+                processed_dataset = processed_dataset.materialize()
+
+                # 特殊处理：识别被过滤的数据
+                if processed_dataset.count() == 0:
+                    processed_file_ids = set()
+                else:
+                    processed_file_ids = set(processed_dataset.unique("fileId"))
+                filtered_file_ids = original_file_ids - processed_file_ids
+
+                if filtered_file_ids:
+                    logger.info(f"Found {len(filtered_file_ids)} filtered files, updating task result only")
+                    for sample_dict in dataset.iter_batches(batch_format="pandas", batch_size=2048):
+                        for _, row in sample_dict.iterrows():
+                            if str(row.get("fileId", "")) in filtered_file_ids:
+                                row["fileSize"] = "0"
+                                row["fileType"] = ""
+                                row["execute_status"] = SUCCESS_STATUS
+                                row[Fields.instance_id] = self.cfg.instance_id
+                                TaskInfoPersistence().update_task_result(row)
+
+                # data-juicer自行写出结果文件，不经过写出清单，需全量扫描
+                self.scan_files(incremental=False)
+            except Exception as e:
+                logger.error(f"An unexpected error occurred.", e)
+                raise e
+            tend = time.time()
+            logger.info(f'All Ops are done in {tend - tstart:.3f}s.')
 
 
 if __name__ == '__main__':
@@ -4,11 +4,11 @@ import base64
 import json
 import time
 
-import ray
 import yaml
 from jsonargparse import ArgumentParser
 from loguru import logger
 
+from datamate.common.utils.parse_cache import ParseCache
 from datamate.core.dataset import RayDataset
 from datamate.wrappers.executor import RayExecutor
 
@@ -26,27 +26,32 @@ class DataMateExecutor(RayExecutor):
         super().__init__(cfg, meta)
 
     def run(self):
-        # 1. 加载数据集
-        logger.info('Loading dataset with Ray...')
-
-        if self.meta:
-            file_content = base64.b64decode(self.meta)
-            lines = file_content.splitlines()
-            dataset = ray.data.from_items([json.loads(line) for line in lines])
-        else:
-            dataset = self.load_dataset()
-        dataset = RayDataset(dataset, self.cfg)
-
-        # 3. 处理数据
-        logger.info('Processing data...')
-        tstart = time.time()
-        dataset.process(self.cfg.process, **getattr(self.cfg, 'kwargs', {}))
-        tend = time.time()
-        logger.info(f'All Ops are done in {tend - tstart:.3f}s.')
-
-        dataset.data.materialize()
-
-        self.scan_files()
+        # 元数据解码文件在处理结束后删除
+        with self.meta_file() as meta_path:
+            # 1. 加载数据集
+            logger.info('Loading dataset with Ray...')
+
+            if meta_path:
+                dataset = self.load_dataset(meta_path, json.loads)
+            else:
+                dataset = self.load_dataset()
+            dataset = RayDataset(dataset, self.cfg)
+
+            # 3. 处理数据
+            logger.info('Processing data...')
+            tstart = time.time()
+            ParseCache.start_metrics_collector()
+            try:
+                dataset.process(self.cfg.process, **getattr(self.cfg, 'kwargs', {}))
+                tend = time.time()
+                logger.info(f'All Ops are done in {tend - tstart:.3f}s.')
+
+                dataset.data.materialize()
+            finally:
+                dataset.release_ops(self.cfg.instance_id)
+                ParseCache.log_collected_metrics()
+
+            self.scan_files()
 
 if __name__ == '__main__':
 
@@ -1,17 +1,22 @@
+import base64
+import functools
 import json
 import os
 import shutil
 import time
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Dict
 
 from datamate.common.utils.file_scanner import FileScanner
+import pyarrow as pa
 import ray
 from jsonargparse import dict_to_namespace
 from loguru import logger
 
 from datamate.common.utils import check_valid_path
 from datamate.sql_manager.persistence_atction import TaskInfoPersistence
+from datamate.sql_manager.persistence_buffer import PersistenceBuffer
 
 
 class RayExecutor:
@@ -37,6 +42,10 @@ class RayExecutor:
         ray.init()
 
     def load_meta(self, line):
+        return self.parse_meta(line, self.cfg.dataset_id)
+
+    @staticmethod
+    def parse_meta(line, dataset_id):
         meta = json.loads(line)
         if meta.get("fileId"):
             meta["sourceFileId"] = meta.get("fileId")
@@ -54,52 +63,172 @@ class RayExecutor:
             meta["extraFilePath"] = None
         if not meta.get("extraFileType"):
             meta["extraFileType"] = None
-        meta["dataset_id"] = self.cfg.dataset_id
+        meta["dataset_id"] = dataset_id
         return meta
 
     def load_dj_meta(self, line):
+        return self.parse_dj_meta(line, self.cfg.dataset_id)
+
+    @staticmethod
+    def _pop_dj_media_path(meta):
+        """取出data-juicer结果中的媒体文件路径，并从meta中移除对应字段"""
+        for key in ("images", "audios", "videos"):
+            if meta.get(key):
+                if isinstance(meta[key], list):
+                    return meta.pop(key)[0]
+                return ""
+        return ""
+
+    @staticmethod
+    def _dj_target_file_name(meta, filepath):
+        return f"{Path(meta['fileName']).stem}{Path(filepath).suffix}"
+
+    @classmethod
+    def parse_dj_meta(cls, line, dataset_id):
+        """解析data-juicer结果行，媒体文件已由move_dj_media_files移动到数据集目录，此处不产生文件副作用"""
         meta = json.loads(line)
-        filepath = ""
-        file = ""
-        if meta.get("images"):
-            if isinstance(meta["images"], list):
-                filepath = meta["images"][0]
-                file = Path(filepath)
-                del meta["images"]
-        elif meta.get("audios"):
-            if isinstance(meta["audios"], list):
-                filepath = meta["audios"][0]
-                file = Path(filepath)
-                del meta["audios"]
-        elif meta.get("videos"):
-            if isinstance(meta["videos"], list):
-                filepath = meta["videos"][0]
-                file = Path(filepath)
-                del meta["videos"]
-        if filepath and file:
-            filename = f"{Path(meta['fileName']).stem}{file.suffix}"
+        filepath = cls._pop_dj_media_path(meta)
+        if filepath:
+            filename = cls._dj_target_file_name(meta, filepath)
             meta["fileName"] = filename
-            meta["filePath"] = f"/dataset/{self.cfg.dataset_id}/{filename}"
-            meta["fileType"] = file.suffix[1:]
-            meta["fileSize"] = file.stat().st_size
-            os.makedirs(f"/dataset/{self.cfg.dataset_id}", exist_ok=True)
-            shutil.move(filepath, f"/dataset/{self.cfg.dataset_id}/{filename}")
+            meta["filePath"] = f"/dataset/{dataset_id}/{filename}"
+            meta["fileType"] = Path(filepath).suffix[1:]
+            meta["fileSize"] = Path(meta["filePath"]).stat().st_size
         return {k: v for k, v in meta.items() if not (isinstance(k, str) and k.startswith('_'))}
 
+    @classmethod
+    def move_dj_media_files(cls, jsonl_file_path, dataset_id):
+        """在driver上将data-juicer生成的媒体文件一次性移动到数据集目录"""
+        target_dir = f"/dataset/{dataset_id}"
+        with open(jsonl_file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                meta = json.loads(line)
+                filepath = cls._pop_dj_media_path(meta)
+                if not filepath or not os.path.exists(filepath):
+                    continue
+                os.makedirs(target_dir, exist_ok=True)
+                shutil.move(filepath, os.path.join(target_dir, cls._dj_target_file_name(meta, filepath)))
+
+    @staticmethod
+    def parse_lines(batch: pa.Table, parse_fn=None, schema: pa.Schema = None, str_columns=()) -> pa.Table:
+        """将read_text读出的一批jsonl行解析为元数据表，所有数据块使用read_jsonl扫描得到的统一表结构"""
+        rows = []
+        for line in batch.column("text").to_pylist():
+            if not line.strip():
+                continue
+            row = parse_fn(line)
+            for key in str_columns:
+                if row.get(key) is not None:
+                    row[key] = str(row[key])
+            rows.append({name: row.get(name) for name in schema.names})
+        return pa.Table.from_pylist(rows, schema=schema)
+
+    @staticmethod
+    def scan_schema(jsonl_file_path, parse_fn):
+        """
+        在driver上逐行扫描jsonl，合并各行推断出的字段类型，得到所有数据块统一的表结构。
+        同一字段出现无法合并的类型时按字符串处理，返回(表结构, 需转为字符串的字段)
+        """
+        field_types = {}
+        seen = set()
+        with open(jsonl_file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                for key, value in parse_fn(line).items():
+                    types = field_types.setdefault(key, [])
+                    if value is None:
+                        continue
+                    # 标量按python类型只推断一次，嵌套类型的结构可能不同，逐个推断
+                    marker = None if isinstance(value, (dict, list)) else (key, type(value))
+                    if marker in seen:
+                        continue
+                    if marker is not None:
+                        seen.add(marker)
+                    try:
+                        value_type = pa.scalar(value).type
+                    except (pa.ArrowInvalid, pa.ArrowTypeError):
+                        value_type = pa.string()
+                    if value_type not in types:
+                        types.append(value_type)
+
+        fields = []
+        str_columns = []
+        for key, types in field_types.items():
+            value_type = pa.null()
+            for candidate in types:
+                try:
+                    value_type = pa.unify_schemas([pa.schema([(key, value_type)]), pa.schema([(key, candidate)])],
+                                                  promote_options="permissive").field(key).type
+                except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                    value_type = pa.string()
+                    str_columns.append(key)
+                    break
+            fields.append(pa.field(key, value_type))
+        return pa.schema(fields), str_columns
+
+    @classmethod
+    def read_jsonl(cls, jsonl_file_path, parse_fn):
+        """
+        流式读取jsonl文件：由Ray按块并行读取，并以批处理方式解析，driver内存占用与数据集大小无关
+        """
+        schema, str_columns = cls.scan_schema(jsonl_file_path, parse_fn)
+        dataset = ray.data.read_text(jsonl_file_path, drop_empty_lines=True)
+        return dataset.map_batches(cls.parse_lines,
+                                   fn_kwargs={"parse_fn": parse_fn, "schema": schema, "str_columns": str_columns},
+                                   batch_format="pyarrow",
+                                   num_cpus=0.05)
+
+    def dump_meta(self, meta, chunk_size=4 * 1024 * 1024):
+        """
+        将base64编码的元数据分块解码写入/flow/{instance_id}下的jsonl文件，避免一次性解码整个元数据。
+        /flow为各节点共享目录，Ray读取任务可在任意节点读取该文件
+        """
+        meta_path = f"/flow/{self.cfg.instance_id}/meta.jsonl"
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        if isinstance(meta, bytes):
+            meta = meta.decode("ascii")
+        meta = "".join(meta.split())
+        # base64每4个字符解码为3个字节，分块大小需为4的整数倍
+        chunk_size -= chunk_size % 4
+        with open(meta_path, "wb") as f:
+            for offset in range(0, len(meta), chunk_size):
+                f.write(base64.b64decode(meta[offset:offset + chunk_size]))
+        return meta_path
+
+    @contextmanager
+    def meta_file(self):
+        """存在base64元数据时解码为jsonl文件，任务结束后删除；无元数据时返回None"""
+        if not self.meta:
+            yield None
+            return
+        meta_path = self.dump_meta(self.meta)
+        try:
+            yield meta_path
+        finally:
+            try:
+                os.remove(meta_path)
+            except OSError as e:
+                logger.warning(f"Failed to remove meta file {meta_path}: {e}")
+
     def run(self):
         pass
 
-    def load_dataset(self, jsonl_file_path = None):
+    def load_dataset(self, jsonl_file_path = None, parse_fn = None, prepare_fn = None):
         retry = 0
         dataset = None
         if jsonl_file_path is None:
             jsonl_file_path = self.cfg.dataset_path
+        if parse_fn is None:
+            parse_fn = functools.partial(self.parse_meta, dataset_id=self.cfg.dataset_id)
         while True:
             if check_valid_path(jsonl_file_path):
-                with open(jsonl_file_path, "r", encoding='utf-8') as meta:
-                    lines = meta.readlines()
-                    dataset = ray.data.from_items([self.load_meta(line) for line in lines])
-                    break
+                if prepare_fn is not None:
+                    prepare_fn(jsonl_file_path)
+                dataset = self.read_jsonl(jsonl_file_path, parse_fn)
+                break
             if retry < 5:
                 retry += 1
                 time.sleep(retry)
@@ -111,30 +240,22 @@ class RayExecutor:
         return dataset
 
     def load_dj_dataset(self, jsonl_file_path = None):
-        retry = 0
-        dataset = None
         if jsonl_file_path is None:
             jsonl_file_path = self.cfg.dataset_path
-        while True:
-            if check_valid_path(jsonl_file_path):
-                with open(jsonl_file_path, "r", encoding='utf-8') as meta:
-                    lines = meta.readlines()
-                    dataset = ray.data.from_items([self.load_dj_meta(line) for line in lines])
-                    break
-            if retry < 5:
-                retry += 1
-                time.sleep(retry)
-                continue
-            else:
-                logger.error(f"can not load dataset from dataset_path")
-                raise RuntimeError(f"Load dataset Failed!, dataset_path: {self.cfg.dataset_path}.")
-
-        return dataset
+        move_files = functools.partial(self.move_dj_media_files, dataset_id=self.cfg.dataset_id)
+        return self.load_dataset(jsonl_file_path,
+                                 functools.partial(self.parse_dj_meta, dataset_id=self.cfg.dataset_id),
+                                 prepare_fn=move_files)
 
     def update_db(self, status):
+        PersistenceBuffer.flush_instance()
         task_info = TaskInfoPersistence()
         task_info.update_result(self.cfg.dataset_id, self.cfg.instance_id, status)
 
-    def scan_files(self):
+    def scan_files(self, incremental=True):
+        # 扫描前确认执行结果均已落库：worker的缓冲在各批次返回前已写入，这里写入driver自身的缓冲
+        PersistenceBuffer.flush_instance()
+        # FILE_SCAN_MODE=full时强制全量扫描导出目录
+        incremental = incremental and os.getenv("FILE_SCAN_MODE", "incremental") != "full"
         scanner = FileScanner(self.cfg.dataset_id)
-        scanner.scan_and_process(self.cfg.export_path)
+        scanner.scan_and_process(self.cfg.export_path, incremental=incremental)
@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# datamate/core/dataset.py 以 core.base_op 的形式导入算子基类，与运行环境一致将 datamate 目录加入 sys.path
+for path in (ROOT, ROOT / "datamate"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import importlib.util
+import random
+from pathlib import Path
+
+BENCHMARK_PATH = Path(__file__).resolve().parents[1] / "benchmarks" / "aho_corasick_benchmark.py"
+
+
+def _trie_search_and_count():
+    # 基准脚本中保留了原前缀树实现，作为统计结果的对照
+    spec = importlib.util.spec_from_file_location("aho_corasick_benchmark", BENCHMARK_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.trie_search_and_count
+
+
+def test_search_and_count_matches_trie_counting(tmp_path) -> None:
+    from datamate.common.utils.aho_corasick import AhoCorasic, add_fail_pointer, build_trie
+
+    rng = random.Random(0)
+    alphabet = "abcdefgh*-"
+    # 词表足够大，使状态数超过2000，覆盖 state * CHAR_LIMIT 超出int32范围的情况
+    words = {"".join(rng.choice("abcdefgh") for _ in range(rng.randint(1, 6))) for _ in range(2500)}
+    symbols = {"*", "-"}
+    root = add_fail_pointer(build_trie(list(words)))
+    trie_search_and_count = _trie_search_and_count()
+
+    built = AhoCorasic(words, str(tmp_path))
+    loaded = AhoCorasic(words, str(tmp_path))
+    for _ in range(200):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+        expected = trie_search_and_count(root, text, symbols)
+        assert built.search_and_count(text, symbols) == expected
+        assert loaded.search_and_count(text, symbols) == expected
+
+
+def test_search_skips_special_symbols(tmp_path) -> None:
+    from datamate.common.utils.aho_corasick import AhoCorasic
+
+    automaton = AhoCorasic({"敏感", "感词", "敏感词"}, str(tmp_path))
+
+    assert sorted(automaton.search("这是敏*感词文本", {"*"})) == ["感词", "敏*感", "敏*感词"]
+    assert automaton.search("无匹配", {"*"}) == []
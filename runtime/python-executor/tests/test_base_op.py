@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import importlib.util
+from pathlib import Path
+
+import pyarrow as pa
+
+OPS_MAPPER_DIR = Path(__file__).resolve().parents[2] / "ops" / "mapper"
+
+
+def _load_op(op_dir: str, class_name: str):
+    # 直接按文件加载算子，避免 ops.mapper 包导入全部算子的依赖
+    spec = importlib.util.spec_from_file_location(f"{op_dir}_process", OPS_MAPPER_DIR / op_dir / "process.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, class_name)
+
+
+def _make_batch_mapper(fail_batch: bool = False):
+    from datamate.core.base_op import Mapper
+
+    class UpperMapper(Mapper):
+        support_batch = True
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.read_count = 0
+
+        def read_file(self, sample):
+            self.read_count += 1
+            sample[self.text_key] = sample[self.filepath_key]
+            return sample
+
+        def execute(self, sample):
+            self.read_file_first(sample)
+            sample[self.text_key] = sample[self.text_key].upper()
+            return sample
+
+        def execute_batch(self, batch):
+            if fail_batch:
+                raise RuntimeError("batch failed")
+            batch[self.text_key] = batch[self.text_key].str.upper()
+            return batch
+
+    return UpperMapper(is_first_op=True)
+
+
+def _samples():
+    return [
+        {"filePath": "a.txt", "fileName": "a.txt", "text": "", "data": b""},
+        {"filePath": "b.txt", "fileName": "b.txt", "text": "", "data": b""},
+    ]
+
+
+def test_call_batch_runs_execute_batch_on_loaded_files() -> None:
+    op = _make_batch_mapper()
+
+    result = op.call_batch(pa.Table.from_pylist(_samples())).to_pylist()
+
+    assert [sample["text"] for sample in result] == ["A.TXT", "B.TXT"]
+    assert all(sample["execute_status"] == "COMPLETED" for sample in result)
+    assert op.read_count == 2
+
+
+def test_call_samples_fallback_reuses_loaded_text() -> None:
+    op = _make_batch_mapper(fail_batch=True)
+
+    result = op.call_samples(_samples())
+
+    assert [sample["text"] for sample in result] == ["A.TXT", "B.TXT"]
+    # 批量失败后逐条执行，不再重复读取文件
+    assert op.read_count == 2
+    assert op._file_loaded is False
+
+
+def test_call_samples_skips_samples_failed_by_previous_ops() -> None:
+    op = _make_batch_mapper()
+    samples = _samples()
+    samples[0]["execute_result"] = False
+
+    result = op.call_samples(samples)
+
+    assert result[0]["text"] == ""
+    assert result[1]["text"] == "B.TXT"
+    assert op.read_count == 1
+
+
+def test_vectorized_mappers_match_single_sample_results() -> None:
+    import pandas as pd
+
+    texts = [
+        "  你好 ，  世界　 \n\n\t 第二行  text \t\n \n  end  ",
+        "a\x01b\x7fc\u00a0d \r\n  e\u2008f \x0b\n",
+        "",
+        "\n\n  只有 空白 \n",
+    ]
+    for op_dir, class_name, func_name in [
+        ("extra_space_cleaner", "ExtraSpaceCleaner", "_clean_extra_space"),
+        ("unicode_space_cleaner", "UnicodeSpaceCleaner", "_clean_unicode_space"),
+        ("invisible_characters_cleaner", "InvisibleCharactersCleaner", "_invisible_characters_filter"),
+    ]:
+        op = _load_op(op_dir, class_name)()
+        expected = [getattr(op, func_name)(text) for text in texts]
+
+        batch = op.execute_batch(pd.DataFrame({"text": texts}, dtype=object))
+
+        assert batch["text"].tolist() == expected, class_name
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+
+def _ops():
+    from datamate.core.base_op import Filter, Mapper, Slicer
+
+    class MapperA(Mapper):
+        pass
+
+    class MapperB(Mapper):
+        pass
+
+    class FilterC(Filter):
+        pass
+
+    class SlicerD(Slicer):
+        pass
+
+    return MapperA, MapperB, FilterC, SlicerD
+
+
+def _plan(monkeypatch, fusion: str, operators_cls_list, init_kwargs_list):
+    from datamate.core.dataset import RayDataset
+
+    monkeypatch.setenv("ENABLE_OP_FUSION", fusion)
+    return RayDataset.__new__(RayDataset).plan_stages(operators_cls_list, init_kwargs_list)
+
+
+def test_plan_stages_keeps_ops_separate_by_default(monkeypatch) -> None:
+    mapper_a, mapper_b, filter_c, _ = _ops()
+    monkeypatch.delenv("ENABLE_OP_FUSION", raising=False)
+    from datamate.core.dataset import RayDataset
+
+    stages = RayDataset.__new__(RayDataset).plan_stages([mapper_a, mapper_b, filter_c], [{}, {}, {}])
+
+    assert stages == [[0], [1], [2]]
+
+
+def test_plan_stages_fuses_adjacent_ops_with_same_resources(monkeypatch) -> None:
+    mapper_a, mapper_b, filter_c, slicer_d = _ops()
+    init_kwargs_list = [{}, {}, {}, {}, {}, {"cpu": 1}, {"cpu": 1}]
+
+    stages = _plan(
+        monkeypatch,
+        "true",
+        [mapper_a, filter_c, slicer_d, mapper_b, mapper_a, mapper_b, filter_c],
+        init_kwargs_list,
+    )
+
+    # Slicer单独成为一个阶段，资源配置不同的算子不融合
+    assert stages == [[0, 1], [2], [3, 4], [5, 6]]
+
+
+def test_fused_batch_size_uses_smallest_op_batch_size(monkeypatch) -> None:
+    from datamate.core.dataset import RayDataset
+
+    monkeypatch.setenv("OP_BATCH_SIZE", "32")
+
+    assert RayDataset.get_fused_batch_size([{}, {"batch_size": 16}, {"batch_size": "8"}]) == 8
+    assert RayDataset.get_fused_batch_size([{}, {}]) == 32
+
+
+
+def test_single_op_batch_size_only_batches_opted_in_ops(monkeypatch) -> None:
+    from datamate.core.base_op import Mapper, Slicer
+    from datamate.core.dataset import RayDataset
+
+    class BatchMapper(Mapper):
+        support_batch = True
+
+    monkeypatch.setenv("OP_BATCH_SIZE", "32")
+
+    assert RayDataset.get_batch_size(BatchMapper, {}) == 32
+    assert RayDataset.get_batch_size(BatchMapper, {"batch_size": "8"}) == 8
+    # 未声明support_batch的算子仍逐条调度
+    assert RayDataset.get_batch_size(Mapper, {"batch_size": 8}) == 1
+    assert RayDataset.get_batch_size(Slicer, {}) == 1
+
+def test_release_ops_uses_op_uuid_or_instance_id() -> None:
+    from datamate.core.base_op import Mapper
+    from datamate.core.dataset import RayDataset
+
+    released = []
+
+    class ReleasingMapper(Mapper):
+        @classmethod
+        def release_task(cls, task_uuid: str):
+            released.append(task_uuid)
+
+    class FailingMapper(Mapper):
+        @classmethod
+        def release_task(cls, task_uuid: str):
+            raise RuntimeError("db unavailable")
+
+    dataset = RayDataset.__new__(RayDataset)
+    dataset.operators = [
+        (ReleasingMapper, {"op_name": "ReleasingMapper"}),
+        (FailingMapper, {"op_name": "FailingMapper"}),
+        (ReleasingMapper, {"op_name": "ReleasingMapper", "uuid": "op-uuid"}),
+    ]
+
+    # 单个算子释放失败不影响其它算子
+    dataset.release_ops("instance-1")
+
+    assert released == ["instance-1", "op-uuid"]
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+
+def test_record_written_path_appends_to_process_manifest(tmp_path) -> None:
+    from datamate.common.utils.file_scanner import FileScanner, record_written_path
+
+    record_written_path(str(tmp_path), "/export/a.txt")
+    record_written_path(str(tmp_path), "/export/b.txt")
+
+    assert FileScanner.read_manifest(str(tmp_path)) == {"/export/a.txt", "/export/b.txt"}
+
+
+def test_read_manifest_returns_none_without_manifest(tmp_path) -> None:
+    from datamate.common.utils.file_scanner import FileScanner
+
+    assert FileScanner.read_manifest(str(tmp_path)) is None
+
+
+def test_llm_save_sample_records_output_in_manifest(tmp_path) -> None:
+    from datamate.common.utils.file_scanner import FileScanner
+    from datamate.core.base_op import LLM
+
+    op = LLM(LLMBody={"messages": [{"content": "你好"}]})
+    sample = {op.export_path_key: str(tmp_path), op.filename_key: "doc.txt", op.fileid_key: "f1"}
+
+    op.save_sample([{"q": "a"}], sample)
+    # 没有输出时不写文件，也不记录
+    op.save_sample([], {**sample, op.fileid_key: "f2"})
+
+    assert FileScanner.read_manifest(str(tmp_path)) == {str(tmp_path / "f1.jsonl")}
@@ -0,0 +1,51 @@
+import asyncio
+
+
+class _FakeJobClient:
+    """每次打开日志流都从头输出当前日志，读完即断开，模拟空闲代理关闭连接"""
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.visible = 1
+        self.status = "RUNNING"
+        self.tail_calls = 0
+        self.fetch_calls = 0
+
+    async def tail_job_logs(self, job_id):
+        self.tail_calls += 1
+        for part in self.parts[:self.visible]:
+            yield part
+        if self.visible < len(self.parts):
+            self.visible += 1
+        else:
+            self.status = "SUCCEEDED"
+
+    def get_job_status(self, job_id):
+        return self.status
+
+    def get_job_logs(self, job_id):
+        self.fetch_calls += 1
+        return "".join(self.parts)
+
+
+def test_log_follower_reopens_tail_without_full_fetch(tmp_path, monkeypatch) -> None:
+    from datamate.scheduler import job_task_scheduler
+
+    monkeypatch.setattr(job_task_scheduler, "RAY_JOB_POLL_MIN_INTERVAL", 0)
+    client = _FakeJobClient(["a\n", "bb\n", "ccc\n"])
+    log_path = tmp_path / "output.log"
+
+    async def run():
+        follower = job_task_scheduler.RayJobLogFollower(client, "job", str(log_path)).start()
+        for _ in range(100):
+            await follower.poll()
+            if follower._task.done():
+                break
+            await asyncio.sleep(0)
+        await follower.close()
+
+    asyncio.run(run())
+
+    assert log_path.read_text(encoding="utf-8") == "a\nbb\nccc\n"
+    assert client.tail_calls == 3
+    assert client.fetch_calls == 0
@@ -0,0 +1,35 @@
+import os
+
+
+def _fill(cache_dir, names, size: int) -> None:
+    for index, name in enumerate(names):
+        path = cache_dir / f"{name}.txt"
+        path.write_bytes(b"x" * size)
+        os.utime(path, (1000 + index, 1000 + index))
+
+
+def test_parse_cache_evicts_shared_directory_on_start(tmp_path) -> None:
+    from datamate.common.utils.parse_cache import ParseCache
+
+    # 其他进程留下的缓存已超过上限，新进程创建缓存时即按目录总大小淘汰最久未访问的文件
+    _fill(tmp_path, ["a", "b", "c", "d"], 100)
+
+    cache = ParseCache(cache_dir=str(tmp_path), max_bytes=300)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["c.txt", "d.txt"]
+    assert cache.metrics["evictions"] == 2
+
+
+def test_parse_cache_checks_directory_size_after_interval(tmp_path, monkeypatch) -> None:
+    from datamate.common.utils.parse_cache import ParseCache
+
+    monkeypatch.setenv("FILE_PARSE_CACHE_EVICT_INTERVAL", "0")
+    cache = ParseCache(cache_dir=str(tmp_path), max_bytes=10000)
+    # 本进程写入量很小，但目录已被其他进程写满
+    _fill(tmp_path, ["a", "b"], 6000)
+
+    text = cache.get_text(str(tmp_path / "b.txt"), "txt", lambda path: "parsed")
+
+    assert text == "parsed"
+    assert not (tmp_path / "a.txt").exists()
+    assert (tmp_path / "b.txt").exists()
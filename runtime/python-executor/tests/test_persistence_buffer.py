@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import threading
+
+
+def _make_buffer(monkeypatch, batch_size: int = 100):
+    from datamate.sql_manager.persistence_buffer import PersistenceBuffer
+
+    written = []
+    buffer = PersistenceBuffer(batch_size=batch_size, flush_interval=3600)
+    monkeypatch.setattr(buffer, "_execute_many", lambda sql, rows: written.append((sql, list(rows))))
+    return buffer, written
+
+
+def test_flush_writes_buffered_rows_grouped_by_sql(monkeypatch) -> None:
+    buffer, written = _make_buffer(monkeypatch)
+
+    buffer.add("insert a", {"id": 1})
+    buffer.add("insert b", {"id": 2})
+    buffer.add("insert a", {"id": 3})
+    assert written == []
+
+    buffer.flush()
+
+    assert sorted(written) == [("insert a", [{"id": 1}, {"id": 3}]), ("insert b", [{"id": 2}])]
+    buffer.flush()
+    assert len(written) == 2
+    buffer.close()
+
+
+def test_add_does_not_wait_for_running_flush(monkeypatch) -> None:
+    buffer, written = _make_buffer(monkeypatch, batch_size=1)
+    buffer._flush_lock.acquire()
+    try:
+        # 达到批量阈值时若已有刷新在进行，add不阻塞，行保留在缓冲中
+        done = threading.Event()
+        threading.Thread(target=lambda: (buffer.add("insert a", {"id": 1}), done.set())).start()
+        assert done.wait(5)
+        assert written == []
+    finally:
+        buffer._flush_lock.release()
+
+    buffer.flush()
+    assert written == [("insert a", [{"id": 1}])]
+    buffer.close()
@@ -114,9 +114,14 @@ COMMENT ON COLUMN t_dm_dataset_files.updated_at IS '更新时间';
 
 -- 创建索引
 CREATE INDEX IF NOT EXISTS idx_dm_dataset ON t_dm_dataset_files(dataset_id);
+-- 同一数据集内文件路径唯一，执行器重复扫描导出目录时按该索引跳过已存在的文件
+CREATE UNIQUE INDEX IF NOT EXISTS uk_dm_file_dataset_path ON t_dm_dataset_files(dataset_id, file_path);
 CREATE INDEX IF NOT EXISTS idx_dm_file_type ON t_dm_dataset_files(file_type);
 CREATE INDEX IF NOT EXISTS idx_dm_file_status ON t_dm_dataset_files(status);
 CREATE INDEX IF NOT EXISTS idx_dm_upload_time ON t_dm_dataset_files(upload_time);
+-- 配比任务按数据集/状态/标签时间过滤，按标签做 jsonpath 匹配
+CREATE INDEX IF NOT EXISTS idx_dm_file_dataset_status_tags_time ON t_dm_dataset_files(dataset_id, status, tags_updated_at);
+CREATE INDEX IF NOT EXISTS idx_dm_file_tags ON t_dm_dataset_files USING GIN (tags jsonb_path_ops);
 
 -- 外键约束
 ALTER TABLE t_dm_dataset_files
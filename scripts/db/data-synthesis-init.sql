@@ -118,6 +118,7 @@ CREATE INDEX IF NOT EXISTS idx_synth_file_instances_source_file ON t_data_synthe
 
 CREATE INDEX IF NOT EXISTS idx_synth_chunk_instances_file ON t_data_synthesis_chunk_instances(synthesis_file_instance_id);
 CREATE INDEX IF NOT EXISTS idx_synth_chunk_instances_index ON t_data_synthesis_chunk_instances(chunk_index);
+CREATE INDEX IF NOT EXISTS idx_synth_chunk_instances_file_index ON t_data_synthesis_chunk_instances(synthesis_file_instance_id, chunk_index);
 
 CREATE INDEX IF NOT EXISTS idx_synth_data_file ON t_data_synthesis_data(synthesis_file_instance_id);
 CREATE INDEX IF NOT EXISTS idx_synth_data_chunk ON t_data_synthesis_data(chunk_instance_id);